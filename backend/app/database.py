@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -13,10 +16,67 @@ engine = create_engine(
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de lectura (opcional)
+replica_engine = None
+ReplicaSessionLocal = None
+
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        settings.DATABASE_REPLICA_URL,
+        pool_pre_ping=True,
+        echo=settings.ENVIRONMENT == "development"
+    )
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
 # Base class for models
 Base = declarative_base()
 
 
+# Retraso de la réplica en segundos. Si ya reprodujo todo lo recibido
+# se considera al día aunque la primaria lleve tiempo sin escribir.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_estado_replica = {"verificado_en": float("-inf"), "disponible": False}
+_estado_replica_lock = threading.Lock()
+
+
+def replica_disponible() -> bool:
+    """
+    Indica si la réplica está configurada y con un retraso aceptable.
+    El resultado se cachea REPLICA_LAG_CHECK_INTERVAL segundos para no
+    consultar el lag en cada request.
+    """
+    if replica_engine is None:
+        return False
+
+    ahora = time.monotonic()
+    with _estado_replica_lock:
+        if ahora - _estado_replica["verificado_en"] < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return _estado_replica["disponible"]
+        # Marcar antes de consultar para que un solo request haga la verificación
+        _estado_replica["verificado_en"] = ahora
+
+    disponible = False
+    try:
+        with replica_engine.connect() as conn:
+            lag = conn.execute(REPLICA_LAG_SQL).scalar()
+        disponible = lag is not None and float(lag) <= settings.REPLICA_MAX_LAG_SECONDS
+        if not disponible:
+            print(f"⚠️ Réplica con retraso de {lag}s, leyendo de la primaria")
+    except Exception as e:
+        print(f"⚠️ Réplica no disponible, leyendo de la primaria: {e}")
+
+    with _estado_replica_lock:
+        _estado_replica["disponible"] = disponible
+    return disponible
+
+
 # Dependency for FastAPI
 def get_db():
     """
@@ -28,3 +88,24 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def new_read_session():
+    """Sesión de solo lectura: réplica si está configurada y al día, si no la primaria"""
+    if replica_disponible():
+        return ReplicaSessionLocal()
+    return SessionLocal()
+
+
+def get_read_db():
+    """
+    Dependency para endpoints de solo lectura (listados, logs, estadísticas).
+    Usa la réplica si está configurada y al día; si no, la primaria.
+    No usar en endpoints que escriben ni donde se necesite leer lo recién escrito.
+    Uso en endpoints: db: Session = Depends(get_read_db)
+    """
+    db = new_read_session()
+    try:
+        yield db
+    finally:
+        db.close()
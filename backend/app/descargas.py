@@ -0,0 +1,176 @@
+"""
+Descarga de archivos guardados por contenido (adjuntos).
+
+- ETag fuerte = hash del contenido: un If-None-Match que coincide responde
+  304 sin tocar el disco. Como el contenido de un adjunto nunca cambia,
+  además se marca como immutable para que el navegador no vuelva a pedirlo.
+- Range de un solo rango (bytes=a-b, a-, -n) con If-Range, para descargas
+  parciales y reanudables. Varios rangos se responden con el archivo completo.
+- Sin copias en Python cuando se puede: si DESCARGAS_ACCEL_REDIRECT está
+  configurado la transferencia la hace el proxy (nginx X-Accel-Redirect,
+  con sendfile); si el servidor ASGI ofrece la extensión zerocopy se le
+  pasa el descriptor; si no, se envía en bloques sin cargar el archivo.
+"""
+import os
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, Request, Response
+
+from app.config import settings
+from app.services.archivos_service import ruta_absoluta
+
+TAMANO_BLOQUE = 256 * 1024
+
+_PATRON_RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _content_disposition(nombre: str) -> str:
+    ascii_seguro = nombre.encode("ascii", "ignore").decode().replace('"', "") or "archivo"
+    return f"attachment; filename=\"{ascii_seguro}\"; filename*=UTF-8''{quote(nombre)}"
+
+
+def _etag_coincide(encabezado: Optional[str], etag: str) -> bool:
+    if not encabezado:
+        return False
+    if encabezado.strip() == "*":
+        return True
+    # Comparación débil para If-None-Match (RFC 9110): se ignora el prefijo W/
+    etiquetas = [e.strip().removeprefix("W/") for e in encabezado.split(",")]
+    return etag in etiquetas
+
+
+def _parsear_rango(encabezado: str, tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    (inicio, fin inclusive) del rango pedido. None si no se entiende o son
+    varios rangos (se ignora y va el archivo completo). Lanza ValueError si
+    el rango no es satisfacible.
+    """
+    match = _PATRON_RANGO.match(encabezado.strip())
+    if not match:
+        return None
+    desde, hasta = match.groups()
+    if not desde and not hasta:
+        return None
+    if not desde:
+        # Sufijo: los últimos n bytes
+        n = int(hasta)
+        if n == 0 or tamano == 0:
+            raise ValueError("rango vacío")
+        return max(tamano - n, 0), tamano - 1
+    inicio = int(desde)
+    fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        raise ValueError("rango fuera del archivo")
+    return inicio, fin
+
+
+class _ArchivoResponse(Response):
+    """Envía [inicio, inicio + largo) del archivo sin leerlo entero"""
+
+    def __init__(self, ruta: str, inicio: int, largo: int, solo_encabezados: bool, **kwargs):
+        super().__init__(**kwargs)
+        self.ruta = ruta
+        self.inicio = inicio
+        self.largo = largo
+        self.solo_encabezados = solo_encabezados
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.solo_encabezados or self.largo == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.ruta, "rb") as archivo:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": archivo,
+                    "offset": self.inicio,
+                    "count": self.largo,
+                    "more_body": False,
+                })
+            return
+
+        restante = self.largo
+        async with await anyio.open_file(self.ruta, "rb") as archivo:
+            await archivo.seek(self.inicio)
+            while restante > 0:
+                bloque = await archivo.read(min(TAMANO_BLOQUE, restante))
+                if not bloque:
+                    break
+                restante -= len(bloque)
+                await send({"type": "http.response.body", "body": bloque, "more_body": restante > 0})
+        if restante > 0:
+            # El archivo quedó más corto que lo esperado: cerrar la respuesta
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def respuesta_archivo(
+    request: Request,
+    ruta: str,
+    hash_hex: str,
+    tamano: int,
+    tipo_mime: Optional[str],
+    nombre: str
+) -> Response:
+    """
+    Respuesta para descargar un archivo guardado por contenido.
+    `ruta` es relativa a UPLOAD_DIR.
+    """
+    etag = f'"{hash_hex}"'
+    encabezados = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": _content_disposition(nombre),
+    }
+
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": encabezados["Cache-Control"]})
+
+    tipo_mime = tipo_mime or "application/octet-stream"
+
+    if settings.DESCARGAS_ACCEL_REDIRECT:
+        # nginx resuelve Range y envía con sendfile desde su location interna
+        encabezados["X-Accel-Redirect"] = settings.DESCARGAS_ACCEL_REDIRECT.rstrip("/") + "/" + ruta
+        return Response(headers=encabezados, media_type=tipo_mime)
+
+    ruta_disco = ruta_absoluta(ruta)
+    if not os.path.exists(ruta_disco):
+        raise HTTPException(status_code=404, detail="Archivo no disponible")
+
+    inicio, largo, status_code = 0, tamano, 200
+    rango = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # Con If-Range, el rango solo vale si el cliente tiene esta misma versión
+    if rango and (not if_range or if_range.strip() == etag):
+        try:
+            limites = _parsear_rango(rango, tamano)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{tamano}", "ETag": etag}
+            )
+        if limites:
+            inicio, fin = limites
+            largo = fin - inicio + 1
+            status_code = 206
+            encabezados["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+
+    encabezados["Content-Length"] = str(largo)
+    return _ArchivoResponse(
+        ruta_disco,
+        inicio,
+        largo,
+        solo_encabezados=request.method == "HEAD",
+        status_code=status_code,
+        headers=encabezados,
+        media_type=tipo_mime,
+    )
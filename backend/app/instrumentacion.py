@@ -0,0 +1,171 @@
+"""
+Conteo de consultas SQL por request y por job del scheduler.
+
+Los eventos de SQLAlchemy (para todos los engines: primaria y réplica)
+suman cada sentencia a la medición activa del contexto. La medición viaja
+en un ContextVar, así que también cuenta lo que corre en el threadpool
+(dependencias sync) del mismo request.
+
+- Cada respuesta HTTP lleva X-DB-Queries y X-DB-Time-Ms.
+- Las sentencias más lentas que SQL_LENTA_MS se registran con parámetros.
+- La misma sentencia ejecutada SQL_REPETICIONES_AVISO veces o más en un
+  request o job se informa como posible N+1.
+- @presupuesto_consultas(n) fija un máximo por endpoint: con
+  ENVIRONMENT=test excederlo es un AssertionError (el test falla); en los
+  demás entornos se registra un aviso.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.metrics import DB_CONSULTAS
+
+HEADER_CONSULTAS = "X-DB-Queries"
+HEADER_TIEMPO = "X-DB-Time-Ms"
+
+LARGO_MAXIMO_LOG = 500
+
+
+class MedicionSQL:
+    """Consultas y tiempo de base acumulados de un request o job"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.sentencias: Counter = Counter()
+
+    def registrar(self, sentencia: str, duracion: float) -> None:
+        self.consultas += 1
+        self.tiempo += duracion
+        self.sentencias[sentencia] += 1
+
+    def avisar_repetidas(self) -> None:
+        for sentencia, veces in self.sentencias.most_common(3):
+            if veces < settings.SQL_REPETICIONES_AVISO:
+                break
+            print(f"⚠️ Posible N+1 en {self.nombre}: {veces} ejecuciones de {_recortar(sentencia)}")
+
+
+_medicion: ContextVar[Optional[MedicionSQL]] = ContextVar("medicion_sql", default=None)
+
+
+def _recortar(texto: str) -> str:
+    texto = " ".join(texto.split())
+    return texto if len(texto) <= LARGO_MAXIMO_LOG else texto[:LARGO_MAXIMO_LOG] + "…"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info["inicio_consulta"].pop()
+
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.registrar(statement, duracion)
+
+    if duracion * 1000 >= settings.SQL_LENTA_MS:
+        origen = f" ({medicion.nombre})" if medicion else ""
+        print(
+            f"🐢 Consulta lenta{origen}: {duracion * 1000:.0f} ms\n"
+            f"   {_recortar(statement)}\n"
+            f"   parámetros: {_recortar(repr(parameters))}"
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _error(contexto):
+    # La sentencia falló: after_cursor_execute no corre, descartar su inicio
+    if contexto.connection is not None and contexto.connection.info.get("inicio_consulta"):
+        contexto.connection.info["inicio_consulta"].pop()
+
+
+@contextmanager
+def medir_consultas(nombre: str):
+    """Mide las consultas del bloque (un job, un script)"""
+    medicion = MedicionSQL(nombre)
+    token = _medicion.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion.reset(token)
+        medicion.avisar_repetidas()
+
+
+def medir_job(func):
+    """Decorador para jobs del scheduler: mide y registra sus consultas"""
+    @wraps(func)
+    def envoltura(*args, **kwargs):
+        with medir_consultas(f"job {func.__name__}") as medicion:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                print(f"🗄️ {medicion.nombre}: {medicion.consultas} consultas, {medicion.tiempo * 1000:.0f} ms")
+    return envoltura
+
+
+def presupuesto_consultas(maximo: int):
+    """
+    Máximo de consultas de un endpoint. Se aplica debajo del decorador de
+    la ruta:
+
+        @router.get(...)
+        @presupuesto_consultas(3)
+        async def endpoint(...):
+    """
+    def decorador(func):
+        func.presupuesto_consultas = maximo
+        return func
+    return decorador
+
+
+class MedicionSQLHTTP:
+    """Middleware ASGI: una medición por request HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = MedicionSQL(f"{scope['method']} {scope['path']}")
+
+        async def send_con_headers(mensaje):
+            if mensaje["type"] == "http.response.start":
+                # Lo que corra después (streaming) no llega al header
+                mensaje["headers"] = [
+                    *mensaje.get("headers", []),
+                    (HEADER_CONSULTAS.lower().encode(), str(medicion.consultas).encode()),
+                    (HEADER_TIEMPO.lower().encode(), f"{medicion.tiempo * 1000:.1f}".encode()),
+                ]
+            await send(mensaje)
+
+        token = _medicion.set(medicion)
+        try:
+            await self.app(scope, receive, send_con_headers)
+        finally:
+            _medicion.reset(token)
+
+        ruta = scope.get("route")
+        DB_CONSULTAS.labels(ruta=getattr(ruta, "path", "sin_ruta")).observe(medicion.consultas)
+        medicion.avisar_repetidas()
+
+        maximo = getattr(getattr(ruta, "endpoint", None), "presupuesto_consultas", None)
+        if maximo is not None and medicion.consultas > maximo:
+            mensaje = f"{medicion.nombre} hizo {medicion.consultas} consultas (presupuesto: {maximo})"
+            if settings.ENVIRONMENT == "test":
+                raise AssertionError(mensaje)
+            print(f"⚠️ {mensaje}")
@@ -1,11 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.config import settings
+from app.metrics import MetricasHTTP
+from app.instrumentacion import HEADER_CONSULTAS, HEADER_TIEMPO, MedicionSQLHTTP
+from app.pagination import NEXT_CURSOR_HEADER
+from app.perfilador import HEADER_PERFIL, PerfilHTTP
+from app.realtime import distribuidor_cambios
 from app.tasks.scheduler import start_scheduler, stop_scheduler
 
 # Importar routers
-from app.routes import contactos, grupos, tareas, comunicados, modelos_comunicados
+from app.routes import contactos, grupos, tareas, comunicados, modelos_comunicados, tiempo_real, adjuntos, supresiones, debug
 
 app = FastAPI(
     title="Sistema de Recordatorios",
@@ -13,6 +19,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Perfilado bajo demanda (dentro de CORS: la respuesta 403 lleva sus headers)
+app.add_middleware(PerfilHTTP)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -20,8 +29,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, HEADER_CONSULTAS, HEADER_TIEMPO, HEADER_PERFIL],
 )
 
+# Consultas SQL por request
+app.add_middleware(MedicionSQLHTTP)
+
+# Latencia por ruta (se agrega última: envuelve también a CORS)
+app.add_middleware(MetricasHTTP)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -37,6 +53,9 @@ async def startup_event():
     
     # Iniciar scheduler
     start_scheduler()
+    
+    # Escuchar cambios de la base para los WebSockets
+    distribuidor_cambios.iniciar()
 
 
 @app.on_event("shutdown")
@@ -44,6 +63,7 @@ async def shutdown_event():
     """Ejecutar al cerrar la aplicación"""
     print("\n🛑 Cerrando Sistema de Recordatorios...")
     stop_scheduler()
+    distribuidor_cambios.detener()
 
 
 @app.get("/")
@@ -71,12 +91,22 @@ async def health():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas en formato Prometheus"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Incluir routers
 app.include_router(contactos.router, prefix="/api/contactos", tags=["Contactos"])
 app.include_router(grupos.router, prefix="/api/grupos", tags=["Grupos"])
 app.include_router(tareas.router, prefix="/api/tareas", tags=["Tareas"])
-app.include_router(comunicados.router, prefix="/api/comunicados", tags=["Comunicados"])
+app.include_router(comunicados.router, prefix="/api/comunicados", tags=["Comunicados"])
 app.include_router(modelos_comunicados.router, prefix="/api/modelos-comunicados", tags=["Modelos Comunicados"])
+app.include_router(adjuntos.router, prefix="/api", tags=["Adjuntos"])
+app.include_router(supresiones.router, prefix="/api/supresiones", tags=["Supresiones"])
+app.include_router(debug.router, prefix="/api/debug", tags=["Debug"])
+app.include_router(tiempo_real.router, prefix="/ws", tags=["Tiempo real"])
 
 
 
@@ -0,0 +1,95 @@
+"""
+Métricas Prometheus (expuestas en /metrics).
+
+- envio_latencia_segundos: cuánto tarda el provider en cada envío, por canal
+- entregas_total: entregas por canal y resultado (exitoso, fallido, suprimido)
+- scheduler_retraso_segundos: cuánto después de lo previsto arrancó cada job
+  del scheduler (y el último comunicado programado)
+- cola_envio: comunicados vencidos sin enviar y entregas pendientes del envío
+  en curso
+- http_request_duracion_segundos: latencia por ruta (plantilla, no la URL
+  concreta, para no multiplicar las series)
+- db_consultas_por_request: consultas SQL por request y ruta (ver
+  instrumentacion.py)
+
+Los valores son por proceso; Prometheus los agrega por instancia.
+"""
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Los providers externos pueden tardar segundos; el simulado, microsegundos
+BUCKETS_ENVIO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+ENVIO_LATENCIA = Histogram(
+    "envio_latencia_segundos",
+    "Duración de la llamada al provider por envío",
+    ["canal", "provider"],
+    buckets=BUCKETS_ENVIO,
+)
+
+ENTREGAS = Counter(
+    "entregas_total",
+    "Entregas procesadas por canal y resultado",
+    ["canal", "resultado"],
+)
+
+SCHEDULER_RETRASO = Gauge(
+    "scheduler_retraso_segundos",
+    "Diferencia entre la hora prevista y la de ejecución",
+    ["job"],
+)
+
+COLA_ENVIO = Gauge(
+    "cola_envio",
+    "Elementos esperando ser enviados",
+    ["cola"],  # comunicados_vencidos, entregas_pendientes
+)
+
+HTTP_DURACION = Histogram(
+    "http_request_duracion_segundos",
+    "Duración de los requests HTTP por ruta",
+    ["metodo", "ruta", "codigo"],
+)
+
+DB_CONSULTAS = Histogram(
+    "db_consultas_por_request",
+    "Consultas SQL ejecutadas por request",
+    ["ruta"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+
+
+class MetricasHTTP:
+    """
+    Middleware ASGI que mide cada request HTTP hasta el último byte de la
+    respuesta. No envuelve el cuerpo (a diferencia de BaseHTTPMiddleware),
+    así las descargas en streaming no pasan por acá.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        codigo = [500]
+
+        async def send_con_codigo(mensaje):
+            if mensaje["type"] == "http.response.start":
+                codigo[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_con_codigo)
+        finally:
+            # FastAPI deja la ruta que atendió el request en el scope
+            ruta = scope.get("route")
+            HTTP_DURACION.labels(
+                metodo=scope["method"],
+                ruta=getattr(ruta, "path", "sin_ruta"),
+                codigo=str(codigo[0]),
+            ).observe(time.perf_counter() - inicio)
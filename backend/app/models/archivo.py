@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, TIMESTAMP, Integer, BigInteger
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class Archivo(Base):
+    """
+    Contenido de un adjunto, guardado una sola vez por hash (SHA-256)
+    aunque lo referencien muchas tareas o comunicados.
+    """
+    __tablename__ = "archivos"
+    
+    hash = Column(String(64), primary_key=True)  # sha256 en hexadecimal
+    tamano = Column(BigInteger, nullable=False)
+    tipo_mime = Column(String(255), nullable=True)
+    # Mantenido por triggers sobre tarea_adjuntos y comunicado_adjuntos
+    referencias = Column(Integer, nullable=False, default=0)
+    creado_en = Column(TIMESTAMP(timezone=True), server_default=func.now())
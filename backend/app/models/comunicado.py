@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, TIMESTAMP, ARRAY, Text, ForeignKey, Date, Time, Integer
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, TIMESTAMP, ARRAY, Text, ForeignKey, Date, Time, Integer, Computed, Boolean
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 
@@ -21,11 +21,23 @@ class Comunicado(Base):
     variables_disponibles = Column(ARRAY(Text), default=["{{nombre}}", "{{email}}", "{{whatsapp}}"])
     creado_en = Column(TIMESTAMP(timezone=True), server_default=func.now())
     creado_por = Column(String(255), nullable=True)
+    perfilar = Column(Boolean, nullable=False, default=False)  # perfilar cada envío (app/perfilador.py)
+    fecha_actualizacion = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Texto completo (título con más peso que contenido), ver schema.sql
+    documento = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('espanol_sin_acentos', coalesce(titulo, '')), 'A') || "
+            "setweight(to_tsvector('espanol_sin_acentos', coalesce(contenido, '')), 'B')",
+            persisted=True
+        )
+    ))
     
     # Relationships
     adjuntos = relationship("ComunicadoAdjunto", back_populates="comunicado", cascade="all, delete-orphan")
     destinatarios = relationship("ComunicadoDestinatario", back_populates="comunicado", cascade="all, delete-orphan")
     logs = relationship("ComunicadoLog", back_populates="comunicado", cascade="all, delete-orphan")
+    contadores = relationship("ComunicadoContador", back_populates="comunicado", cascade="all, delete-orphan")
 
 
 class ComunicadoAdjunto(Base):
@@ -34,7 +46,8 @@ class ComunicadoAdjunto(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     comunicado_id = Column(UUID(as_uuid=True), ForeignKey("comunicados.id", ondelete="CASCADE"), nullable=False)
     nombre_archivo = Column(String(255), nullable=False)
-    ruta_archivo = Column(String(500), nullable=False)
+    ruta_archivo = Column(String(500), nullable=False)  # relativa a UPLOAD_DIR
+    archivo_hash = Column(String(64), ForeignKey("archivos.hash"), nullable=True)
     fecha_agregado = Column(TIMESTAMP(timezone=True), server_default=func.now())
     
     # Relationships
@@ -57,3 +70,23 @@ class ComunicadoDestinatario(Base):
     comunicado = relationship("Comunicado", back_populates="destinatarios")
     contacto = relationship("Contacto", back_populates="comunicado_destinatarios")
     grupo = relationship("Grupo", back_populates="comunicado_destinatarios")
+
+
+class ComunicadoContador(Base):
+    """
+    Contadores de entregas por comunicado y canal, actualizados de a uno
+    a medida que se completa cada envío (ver contadores_service)
+    """
+    __tablename__ = "comunicado_contadores"
+    
+    comunicado_id = Column(UUID(as_uuid=True), ForeignKey("comunicados.id", ondelete="CASCADE"), primary_key=True)
+    canal = Column(String(20), primary_key=True)  # whatsapp, email
+    total = Column(Integer, nullable=False, default=0)
+    enviados = Column(Integer, nullable=False, default=0)
+    errores = Column(Integer, nullable=False, default=0)
+    pendientes = Column(Integer, nullable=False, default=0)
+    reintentos = Column(Integer, nullable=False, default=0)
+    actualizado_en = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Relationships
+    comunicado = relationship("Comunicado", back_populates="contadores")
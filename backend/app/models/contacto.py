@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, TIMESTAMP, ARRAY, Text, ForeignKey, Table
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, TIMESTAMP, Text, ForeignKey, Table, Computed
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -18,6 +18,18 @@ class Contacto(Base):
     estado = Column(String(20), default="activo")
     etiquetas = Column(ARRAY(Text), default=[])
     notas = Column(Text, nullable=True)
+    fecha_actualizacion = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Columna generada en BD para búsqueda por trigramas (ver schema.sql)
+    busqueda = Column(
+        Text,
+        Computed(
+            "normalizar_texto(nombre) || ' ' || normalizar_texto(email) || ' ' || coalesce(whatsapp, '')",
+            persisted=True
+        )
+    )
+    # Identidad normalizada (E.164 / minúsculas), con índice único (ver schema.sql)
+    whatsapp_normalizado = Column(Text, Computed("normalizar_telefono(whatsapp)", persisted=True))
+    email_normalizado = Column(Text, Computed("normalizar_email(email)", persisted=True))
     
     # Relationships
     grupo_miembros = relationship("GrupoMiembro", back_populates="contacto", cascade="all, delete-orphan")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, TIMESTAMP, Text, ForeignKey, Integer
+from sqlalchemy import Column, String, TIMESTAMP, Text, ForeignKey, Integer, BigInteger
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -23,3 +23,13 @@ class ComunicadoLog(Base):
     # Relationships
     comunicado = relationship("Comunicado", back_populates="logs")
     contacto = relationship("Contacto", back_populates="comunicados_log")
+
+
+class Eliminacion(Base):
+    """Registro de filas borradas (tombstone) para la sincronización incremental"""
+    __tablename__ = "eliminaciones"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    recurso = Column(String(50), nullable=False)  # tareas, contactos, comunicados
+    registro_id = Column(UUID(as_uuid=True), nullable=False)
+    fecha = Column(TIMESTAMP(timezone=True), server_default=func.now())
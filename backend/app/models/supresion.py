@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, TIMESTAMP, Text, Boolean, BigInteger, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class Supresion(Base):
+    """
+    Dirección a la que no se envía por un canal: baja voluntaria, rebote
+    permanente o número inválido. Se desactiva en lugar de borrarse, así la
+    lista en memoria de cada proceso se entera al refrescar.
+    """
+    __tablename__ = "supresiones"
+    __table_args__ = (UniqueConstraint("canal", "direccion"),)
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    canal = Column(String(20), nullable=False)  # whatsapp, email
+    # Normalizada igual que contactos.whatsapp_normalizado / email_normalizado
+    direccion = Column(String(255), nullable=False)
+    motivo = Column(String(20), nullable=False)  # baja, rebote, invalido
+    detalle = Column(Text, nullable=True)
+    activa = Column(Boolean, nullable=False, default=True)
+    fecha_creacion = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, TIMESTAMP, ARRAY, Text, ForeignKey, Date, Time, Integer
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, TIMESTAMP, Text, ForeignKey, Date, Time, Integer, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 
@@ -23,10 +23,23 @@ class Tarea(Base):
     fecha_creacion_record = Column(TIMESTAMP(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     fecha_completacion = Column(TIMESTAMP(timezone=True), nullable=True)
+    # Entradas del historial desde el último snapshot (ver historial_service)
+    cambios_sin_snapshot = Column(Integer, nullable=False, default=0)
+    # Texto completo (título con más peso que descripción), ver schema.sql.
+    # Diferida: solo se usa en filtros de búsqueda, no hace falta traerla
+    documento = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('espanol_sin_acentos', coalesce(titulo, '')), 'A') || "
+            "setweight(to_tsvector('espanol_sin_acentos', coalesce(descripcion, '')), 'B')",
+            persisted=True
+        )
+    ))
     
     # Relationships
     adjuntos = relationship("TareaAdjunto", back_populates="tarea", cascade="all, delete-orphan")
     logs = relationship("TareaLog", back_populates="tarea", cascade="all, delete-orphan")
+    snapshots = relationship("TareaSnapshot", back_populates="tarea", cascade="all, delete-orphan")
 
 
 class TareaAdjunto(Base):
@@ -35,7 +48,8 @@ class TareaAdjunto(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tarea_id = Column(UUID(as_uuid=True), ForeignKey("tareas.id", ondelete="CASCADE"), nullable=False)
     nombre_archivo = Column(String(255), nullable=False)
-    ruta_archivo = Column(String(500), nullable=False)
+    ruta_archivo = Column(String(500), nullable=False)  # relativa a UPLOAD_DIR
+    archivo_hash = Column(String(64), ForeignKey("archivos.hash"), nullable=True)
     fecha_agregado = Column(TIMESTAMP(timezone=True), server_default=func.now())
     
     # Relationships
@@ -55,3 +69,16 @@ class TareaLog(Base):
     
     # Relationships
     tarea = relationship("Tarea", back_populates="logs")
+
+
+class TareaSnapshot(Base):
+    __tablename__ = "tareas_snapshots"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tarea_id = Column(UUID(as_uuid=True), ForeignKey("tareas.id", ondelete="CASCADE"), nullable=False)
+    log_id = Column(UUID(as_uuid=True), nullable=False)  # última entrada de tareas_log incluida
+    fecha = Column(TIMESTAMP(timezone=True), server_default=func.now())  # = fecha_cambio de esa entrada
+    datos = Column(JSONB, nullable=False)
+    
+    # Relationships
+    tarea = relationship("Tarea", back_populates="snapshots")
@@ -0,0 +1,156 @@
+"""
+Paginación por cursor (keyset).
+
+En lugar de OFFSET, cada página filtra por la clave de orden de la última
+fila devuelta, así que el costo de una página no depende de su profundidad
+siempre que exista un índice sobre las columnas de orden.
+
+El cursor es opaco para el cliente: JSON con los valores de la clave de
+orden, codificado en base64 url-safe. El cursor de la página siguiente se
+devuelve en el header X-Next-Cursor (ausente en la última página), así el
+cuerpo de las respuestas sigue siendo la misma lista de siempre.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, List, Optional, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_, false, true
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """
+    Columna de orden. Las columnas nullable ascendentes llevan nulls_last;
+    las descendentes sin nulls_last dejan los nulos primero (como Postgres).
+    """
+    column: Any
+    desc: bool = False
+    nulls_last: bool = False
+
+    @property
+    def nulls_first(self) -> bool:
+        return self.desc and not self.nulls_last
+
+    def order_by(self):
+        expr = self.column.desc() if self.desc else self.column.asc()
+        if self.nulls_last:
+            expr = expr.nullslast()
+        return expr
+
+
+def _serializar(valor: Any) -> Any:
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, UUID):
+        return str(valor)
+    return valor
+
+
+def _deserializar(valor: Any, column: Any) -> Any:
+    if valor is None:
+        return None
+    tipo = column.type.python_type
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    if tipo is time:
+        return time.fromisoformat(valor)
+    if tipo is UUID:
+        return UUID(valor)
+    return valor
+
+
+def encode_cursor(valores: Sequence[Any]) -> str:
+    raw = json.dumps([_serializar(v) for v in valores], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(valores, list) or len(valores) != len(keys):
+            raise ValueError("cantidad de valores incorrecta")
+        return [_deserializar(v, k.column) for v, k in zip(valores, keys)]
+    except (ValueError, TypeError, LookupError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _despues(key: SortKey, valor: Any):
+    """Condición 'la fila va estrictamente después de valor' para una columna"""
+    if valor is None:
+        # Nulos primero: después vienen todos los no nulos. Al final: nada
+        return key.column.is_not(None) if key.nulls_first else false()
+    if key.desc:
+        if key.nulls_last:
+            return or_(key.column < valor, key.column.is_(None))
+        return key.column < valor
+    if key.nulls_last:
+        return or_(key.column > valor, key.column.is_(None))
+    return key.column > valor
+
+
+def _igual(key: SortKey, valor: Any):
+    if valor is None:
+        return key.column.is_(None)
+    return key.column == valor
+
+
+def keyset_filter(keys: Sequence[SortKey], valores: Sequence[Any]):
+    """
+    Expande (k1, k2, ...) > (v1, v2, ...) respetando la dirección y los
+    nulos de cada columna. La primera columna también se acota por sí sola
+    para que el planner pueda arrancar el recorrido del índice en v1.
+    """
+    condiciones = []
+    for i, key in enumerate(keys):
+        prefijo = [_igual(keys[j], valores[j]) for j in range(i)]
+        condiciones.append(and_(*prefijo, _despues(key, valores[i])))
+
+    primera, v1 = keys[0], valores[0]
+    if v1 is None:
+        # Con los nulos primero, desde ahí sigue toda la tabla
+        cota = true() if primera.nulls_first else primera.column.is_(None)
+    elif primera.desc:
+        cota = primera.column <= v1
+        if primera.nulls_last:
+            cota = or_(cota, primera.column.is_(None))
+    elif primera.nulls_last:
+        cota = or_(primera.column >= v1, primera.column.is_(None))
+    else:
+        cota = primera.column >= v1
+
+    return and_(cota, or_(*condiciones))
+
+
+def paginate(
+    query,
+    keys: Sequence[SortKey],
+    cursor: Optional[str],
+    limit: int,
+    response: Response
+) -> list:
+    """
+    Aplica orden, filtro por cursor y límite a un query ORM.
+    Devuelve las filas de la página y deja el cursor siguiente en el header.
+    """
+    if cursor:
+        query = query.filter(keyset_filter(keys, decode_cursor(cursor, keys)))
+
+    rows = query.order_by(*[k.order_by() for k in keys]).limit(limit + 1).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        ultima = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            [getattr(ultima, k.column.key) for k in keys]
+        )
+
+    return rows
@@ -0,0 +1,177 @@
+"""
+Perfilado bajo demanda de requests y envíos de comunicados.
+
+Apagado salvo que PERFIL_ADMIN_TOKEN tenga valor. Con el token:
+
+- Un request se perfila con el header `X-Perfilar: 1` (o `?perfilar=1`) y
+  el token en `X-Admin-Token` (o `?admin_token=`). La respuesta trae en
+  `X-Perfil` la URL del perfil.
+- Un comunicado con `perfilar = true` perfila cada envío (send_comunicado).
+
+El perfil es por muestreo: un hilo aparte lee la pila del hilo perfilado
+cada PERFIL_INTERVALO_MS (sys._current_frames), sin tocar el código que
+corre. Los requests async se ejecutan en el hilo del event loop, así que
+su perfil incluye lo que otros requests hagan en ese hilo al mismo tiempo.
+
+Los perfiles se guardan en PERFILES_DIR en formato "folded" (una pila por
+línea, frames separados por ';' y la cantidad de muestras al final), que
+leen flamegraph.pl, speedscope e inferno. Se descargan desde
+/api/debug/perfiles (ver routes/debug.py).
+"""
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+
+import anyio
+from starlette.responses import JSONResponse
+
+from app.config import settings
+
+HEADER_PERFILAR = "X-Perfilar"
+HEADER_TOKEN = "X-Admin-Token"
+HEADER_PERFIL = "X-Perfil"
+
+EXTENSION = ".folded"
+NOMBRE_PERFIL = re.compile(r"^[\w.-]+\.folded$")
+CARACTERES_INVALIDOS = re.compile(r"[^\w.-]+")
+
+URL_PERFILES = "/api/debug/perfiles"
+
+
+def perfilado_habilitado() -> bool:
+    return bool(settings.PERFIL_ADMIN_TOKEN)
+
+
+def token_valido(token: Optional[str]) -> bool:
+    """Compara en tiempo constante; sin token configurado nada es válido"""
+    if not perfilado_habilitado() or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.PERFIL_ADMIN_TOKEN.encode())
+
+
+def directorio_perfiles() -> Path:
+    return Path(settings.PERFILES_DIR)
+
+
+def _frame(codigo) -> str:
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class Perfilador:
+    """Muestrea la pila de un hilo hasta que se lo detiene (o PERFIL_MAXIMO_SEGUNDOS)"""
+
+    def __init__(self, nombre: str, hilo_id: int):
+        # Microsegundos y pid: dos perfiles del mismo segundo (o de dos
+        # workers) no se pisan
+        marca = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}"
+        self.archivo = f"{marca}-{CARACTERES_INVALIDOS.sub('_', nombre).strip('_')}{EXTENSION}"
+        self.hilo_id = hilo_id
+        self.muestras: Counter = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name=f"perfilador-{nombre}", daemon=True)
+
+    def _muestrear(self) -> None:
+        intervalo = settings.PERFIL_INTERVALO_MS / 1000
+        limite = time.monotonic() + settings.PERFIL_MAXIMO_SEGUNDOS
+        while not self._detener.wait(intervalo) and time.monotonic() < limite:
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is None:
+                return
+            pila = []
+            while frame is not None:
+                pila.append(_frame(frame.f_code))
+                frame = frame.f_back
+            self.muestras[";".join(reversed(pila))] += 1
+
+    def iniciar(self) -> None:
+        self._hilo.start()
+
+    def detener(self) -> Path:
+        """
+        Termina el muestreo y guarda el perfil. Devuelve la ruta del archivo.
+        Bloquea (join y escritura): desde código async, usar detener_async.
+        """
+        self._detener.set()
+        self._hilo.join()
+
+        directorio = directorio_perfiles()
+        directorio.mkdir(parents=True, exist_ok=True)
+        ruta = directorio / self.archivo
+        with open(ruta, "w", encoding="utf-8") as f:
+            for pila, cantidad in self.muestras.most_common():
+                f.write(f"{pila} {cantidad}\n")
+
+        print(f"🔬 Perfil guardado: {ruta} ({sum(self.muestras.values())} muestras)")
+        return ruta
+
+    async def detener_async(self) -> Path:
+        """detener en un hilo del threadpool, sin frenar el event loop"""
+        return await anyio.to_thread.run_sync(self.detener)
+
+
+@asynccontextmanager
+async def perfilar(nombre: str, hilo_id: Optional[int] = None):
+    """Perfila el bloque async (por defecto, el hilo de su event loop)"""
+    perfilador = Perfilador(nombre, hilo_id or threading.get_ident())
+    perfilador.iniciar()
+    try:
+        yield perfilador
+    finally:
+        await perfilador.detener_async()
+
+
+class PerfilHTTP:
+    """
+    Middleware ASGI: perfila los requests que lo piden con el token de
+    administración. Sin PERFIL_ADMIN_TOKEN solo cuesta una comparación.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.PERFIL_ADMIN_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        pedido = headers.get(HEADER_PERFILAR.lower().encode())
+        token = headers.get(HEADER_TOKEN.lower().encode())
+        if pedido is None and b"perfilar=" in scope["query_string"]:
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            pedido = query.get("perfilar", [""])[0].encode()
+            token = token or query.get("admin_token", [""])[0].encode()
+
+        if pedido not in (b"1", b"true"):
+            await self.app(scope, receive, send)
+            return
+
+        if not token_valido(token.decode("latin-1") if token else None):
+            respuesta = JSONResponse({"detail": "Token de administración inválido"}, status_code=403)
+            await respuesta(scope, receive, send)
+            return
+
+        perfilador = Perfilador(f"{scope['method']}-{scope['path']}", threading.get_ident())
+
+        async def send_con_perfil(mensaje):
+            if mensaje["type"] == "http.response.start":
+                mensaje["headers"] = [
+                    *mensaje.get("headers", []),
+                    (HEADER_PERFIL.lower().encode(), f"{URL_PERFILES}/{perfilador.archivo}".encode()),
+                ]
+            await send(mensaje)
+
+        perfilador.iniciar()
+        try:
+            await self.app(scope, receive, send_con_perfil)
+        finally:
+            await perfilador.detener_async()
@@ -0,0 +1,153 @@
+"""
+Eventos de cambios en tiempo real.
+
+Los triggers de la base (ver schema.sql) hacen pg_notify('cambios', ...) en
+cada escritura sobre tareas, comunicados y entregas. Un único hilo por
+proceso mantiene una conexión dedicada con LISTEN y pasa los eventos al
+event loop, donde se agrupan durante REALTIME_AGRUPAR_SEGUNDOS (un envío
+masivo genera un evento por entrega; los repetidos se juntan en uno) y se
+reparten a las conexiones WebSocket abiertas.
+
+Así cada pestaña tiene una sola conexión y ninguna consulta periódica: la
+carga sobre la base es la misma con 1 o con 100 clientes.
+"""
+import asyncio
+import json
+import select
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from app.database import engine
+from app.config import settings
+
+CANAL_NOTIFY = "cambios"
+
+# Si un cliente no consume sus mensajes se descartan y se le pide recargar
+MAX_PENDIENTES_POR_CLIENTE = 100
+
+
+class Suscripcion:
+    """Cola de mensajes de un cliente WebSocket, con filtro opcional de recursos"""
+
+    def __init__(self, recursos: Optional[Set[str]] = None):
+        self.recursos = recursos
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDIENTES_POR_CLIENTE)
+
+    def entregar(self, eventos: list) -> None:
+        if self.recursos:
+            eventos = [e for e in eventos if e.get("recurso") in self.recursos]
+        if not eventos:
+            return
+        try:
+            self.cola.put_nowait({"eventos": eventos})
+        except asyncio.QueueFull:
+            # Cliente lento: se vacía la cola y se le indica que recargue
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait({"resync": True})
+
+
+class DistribuidorCambios:
+    """Recibe eventos desde el hilo LISTEN y los reparte a las suscripciones"""
+
+    def __init__(self):
+        self.suscripciones: Set[Suscripcion] = set()
+        self._pendientes: Dict[Tuple, Dict[str, Any]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tarea_envio: Optional[asyncio.Task] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+
+    # --- suscripciones (event loop) ---
+
+    def suscribir(self, recursos: Optional[Set[str]] = None) -> Suscripcion:
+        suscripcion = Suscripcion(recursos)
+        self.suscripciones.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion) -> None:
+        self.suscripciones.discard(suscripcion)
+
+    # --- ciclo de vida ---
+
+    def iniciar(self) -> None:
+        if not settings.REALTIME_ENABLED:
+            print("⚠️ Eventos en tiempo real deshabilitados en configuración")
+            return
+        self._loop = asyncio.get_running_loop()
+        self._detener.clear()
+        self._tarea_envio = self._loop.create_task(self._enviar_periodicamente())
+        self._hilo = threading.Thread(target=self._escuchar, name="listen-cambios", daemon=True)
+        self._hilo.start()
+        print("✅ Escuchando cambios (LISTEN cambios)")
+
+    def detener(self) -> None:
+        self._detener.set()
+        if self._tarea_envio:
+            self._tarea_envio.cancel()
+
+    # --- hilo LISTEN ---
+
+    def _escuchar(self) -> None:
+        """Conexión dedicada con LISTEN; se reconecta si se corta"""
+        espera = 1
+        while not self._detener.is_set():
+            conexion = None
+            try:
+                # Conexión fuera del pool: queda tomada mientras dure el LISTEN
+                conexion = engine.raw_connection()
+                conexion.detach()
+                pg = conexion.driver_connection
+                pg.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with pg.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL_NOTIFY}")
+                espera = 1
+
+                while not self._detener.is_set():
+                    if select.select([pg], [], [], 5) == ([], [], []):
+                        continue
+                    pg.poll()
+                    while pg.notifies:
+                        notificacion = pg.notifies.pop(0)
+                        self._recibir(notificacion.payload)
+            except Exception as e:
+                print(f"❌ Error escuchando cambios: {e}")
+                self._detener.wait(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if conexion is not None:
+                    try:
+                        conexion.close()
+                    except Exception:
+                        pass
+
+    def _recibir(self, payload: str) -> None:
+        try:
+            evento = json.loads(payload)
+        except ValueError:
+            return
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._acumular, evento)
+
+    # --- agrupado y envío (event loop) ---
+
+    def _acumular(self, evento: Dict[str, Any]) -> None:
+        # Eventos repetidos sobre la misma fila (o las entregas de un mismo
+        # comunicado) dentro de la ventana se envían una sola vez
+        clave = (evento.get("recurso"), evento.get("comunicado_id") or evento.get("id"))
+        self._pendientes[clave] = evento
+
+    async def _enviar_periodicamente(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REALTIME_AGRUPAR_SEGUNDOS)
+            if not self._pendientes:
+                continue
+            eventos = list(self._pendientes.values())
+            self._pendientes.clear()
+            for suscripcion in list(self.suscripciones):
+                suscripcion.entregar(eventos)
+
+
+distribuidor_cambios = DistribuidorCambios()
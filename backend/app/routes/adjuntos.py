@@ -0,0 +1,248 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from typing import Callable, List, Optional
+from uuid import UUID
+import mimetypes
+import os
+
+from app.database import get_db, get_read_db
+from app.descargas import respuesta_archivo
+from app.models.archivo import Archivo
+from app.models.tarea import Tarea, TareaAdjunto
+from app.models.comunicado import Comunicado, ComunicadoAdjunto
+from app.schemas.tarea import TareaAdjuntoResponse
+from app.schemas.comunicado import ComunicadoAdjuntoResponse
+from app.services.archivos_service import guardar_objeto, recibir_stream, registrar_archivo
+
+router = APIRouter()
+
+
+def _nombre_seguro(nombre: str) -> str:
+    nombre = os.path.basename(nombre.replace("\\", "/")).strip()
+    if not nombre:
+        raise HTTPException(status_code=400, detail="Nombre de archivo inválido")
+    return nombre[:255]
+
+
+def _tipo_mime(request: Request, nombre: str) -> Optional[str]:
+    tipo = request.headers.get("content-type", "").split(";")[0].strip()
+    if not tipo or tipo == "application/octet-stream":
+        tipo = mimetypes.guess_type(nombre)[0] or tipo
+    return tipo or None
+
+
+async def _subir(request: Request, nombre: str, db: Session, crear_adjunto: Callable):
+    """
+    Recibe el cuerpo del request en streaming, registra el contenido y guarda
+    el adjunto que arma crear_adjunto(ruta, hash). El archivo pasa a su ruta
+    definitiva recién después del commit; si eso falla, el adjunto se borra
+    en una segunda transacción (el trigger descuenta la referencia y la
+    purga de huérfanos se lleva la fila de archivos).
+    """
+    hash_hex, tamano, ruta_tmp = await recibir_stream(request.stream())
+    try:
+        ruta = registrar_archivo(db, hash_hex, tamano, _tipo_mime(request, nombre))
+        adjunto = crear_adjunto(ruta, hash_hex)
+        db.add(adjunto)
+        db.commit()
+        try:
+            await guardar_objeto(hash_hex, ruta_tmp)
+        except OSError as e:
+            print(f"❌ No se pudo guardar el archivo {hash_hex}: {e}")
+            db.delete(adjunto)
+            db.commit()
+            raise HTTPException(status_code=500, detail="No se pudo guardar el archivo")
+        return adjunto
+    finally:
+        if os.path.exists(ruta_tmp):
+            os.unlink(ruta_tmp)
+
+
+def _con_archivo(query, modelo):
+    """Agrega tamaño y tipo del archivo a cada adjunto (un solo JOIN)"""
+    filas = query.outerjoin(Archivo, Archivo.hash == modelo.archivo_hash).add_columns(
+        Archivo.tamano, Archivo.tipo_mime
+    ).order_by(modelo.fecha_agregado, modelo.id).all()
+    return [
+        {
+            **{c.key: getattr(adjunto, c.key) for c in modelo.__table__.columns},
+            "tamano": tamano,
+            "tipo_mime": tipo_mime
+        }
+        for adjunto, tamano, tipo_mime in filas
+    ]
+
+
+def _descargar(request: Request, query, modelo):
+    """Descarga del adjunto con ETag (hash del contenido) y Range"""
+    fila = query.join(Archivo, Archivo.hash == modelo.archivo_hash).add_columns(
+        Archivo.tamano, Archivo.tipo_mime
+    ).first()
+    if not fila:
+        raise HTTPException(status_code=404, detail="Adjunto no encontrado")
+    
+    adjunto, tamano, tipo_mime = fila
+    return respuesta_archivo(
+        request,
+        adjunto.ruta_archivo,
+        adjunto.archivo_hash,
+        tamano,
+        tipo_mime,
+        adjunto.nombre_archivo
+    )
+
+
+# ============================================
+# ADJUNTOS DE TAREAS
+# ============================================
+
+@router.post("/tareas/{tarea_id}/adjuntos", response_model=TareaAdjuntoResponse, status_code=201)
+async def upload_adjunto_tarea(
+    tarea_id: UUID,
+    request: Request,
+    nombre: str = Query(..., description="Nombre original del archivo"),
+    db: Session = Depends(get_db)
+):
+    """
+    Subir un adjunto. El cuerpo del request es el archivo tal cual
+    (no multipart) y se procesa en streaming; Content-Type indica el tipo.
+    """
+    nombre = _nombre_seguro(nombre)
+    if not db.query(Tarea.id).filter(Tarea.id == tarea_id).first():
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
+    
+    adjunto = await _subir(request, nombre, db, lambda ruta, hash_hex: TareaAdjunto(
+        tarea_id=tarea_id,
+        nombre_archivo=nombre,
+        ruta_archivo=ruta,
+        archivo_hash=hash_hex
+    ))
+    
+    query = db.query(TareaAdjunto).filter(TareaAdjunto.id == adjunto.id)
+    return _con_archivo(query, TareaAdjunto)[0]
+
+
+@router.get("/tareas/{tarea_id}/adjuntos", response_model=List[TareaAdjuntoResponse])
+async def list_adjuntos_tarea(
+    tarea_id: UUID,
+    db: Session = Depends(get_read_db)
+):
+    """Listar adjuntos de una tarea"""
+    query = db.query(TareaAdjunto).filter(TareaAdjunto.tarea_id == tarea_id)
+    return _con_archivo(query, TareaAdjunto)
+
+
+@router.api_route("/tareas/{tarea_id}/adjuntos/{adjunto_id}/descarga", methods=["GET", "HEAD"])
+async def download_adjunto_tarea(
+    tarea_id: UUID,
+    adjunto_id: UUID,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Descargar un adjunto. Soporta Range (descargas parciales/reanudables)
+    e If-None-Match: el ETag es el hash del contenido, una descarga
+    repetida responde 304.
+    """
+    query = db.query(TareaAdjunto).filter(
+        TareaAdjunto.id == adjunto_id,
+        TareaAdjunto.tarea_id == tarea_id
+    )
+    return _descargar(request, query, TareaAdjunto)
+
+
+@router.delete("/tareas/{tarea_id}/adjuntos/{adjunto_id}", status_code=204)
+async def delete_adjunto_tarea(
+    tarea_id: UUID,
+    adjunto_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """Quitar un adjunto (el archivo se borra cuando nadie más lo usa)"""
+    adjunto = db.query(TareaAdjunto).filter(
+        TareaAdjunto.id == adjunto_id,
+        TareaAdjunto.tarea_id == tarea_id
+    ).first()
+    if not adjunto:
+        raise HTTPException(status_code=404, detail="Adjunto no encontrado")
+    
+    db.delete(adjunto)
+    db.commit()
+    return None
+
+
+# ============================================
+# ADJUNTOS DE COMUNICADOS
+# ============================================
+
+@router.post("/comunicados/{comunicado_id}/adjuntos", response_model=ComunicadoAdjuntoResponse, status_code=201)
+async def upload_adjunto_comunicado(
+    comunicado_id: UUID,
+    request: Request,
+    nombre: str = Query(..., description="Nombre original del archivo"),
+    db: Session = Depends(get_db)
+):
+    """
+    Subir un adjunto. El cuerpo del request es el archivo tal cual
+    (no multipart) y se procesa en streaming; Content-Type indica el tipo.
+    """
+    nombre = _nombre_seguro(nombre)
+    if not db.query(Comunicado.id).filter(Comunicado.id == comunicado_id).first():
+        raise HTTPException(status_code=404, detail="Comunicado no encontrado")
+    
+    adjunto = await _subir(request, nombre, db, lambda ruta, hash_hex: ComunicadoAdjunto(
+        comunicado_id=comunicado_id,
+        nombre_archivo=nombre,
+        ruta_archivo=ruta,
+        archivo_hash=hash_hex
+    ))
+    
+    query = db.query(ComunicadoAdjunto).filter(ComunicadoAdjunto.id == adjunto.id)
+    return _con_archivo(query, ComunicadoAdjunto)[0]
+
+
+@router.get("/comunicados/{comunicado_id}/adjuntos", response_model=List[ComunicadoAdjuntoResponse])
+async def list_adjuntos_comunicado(
+    comunicado_id: UUID,
+    db: Session = Depends(get_read_db)
+):
+    """Listar adjuntos de un comunicado"""
+    query = db.query(ComunicadoAdjunto).filter(ComunicadoAdjunto.comunicado_id == comunicado_id)
+    return _con_archivo(query, ComunicadoAdjunto)
+
+
+@router.api_route("/comunicados/{comunicado_id}/adjuntos/{adjunto_id}/descarga", methods=["GET", "HEAD"])
+async def download_adjunto_comunicado(
+    comunicado_id: UUID,
+    adjunto_id: UUID,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Descargar un adjunto. Soporta Range (descargas parciales/reanudables)
+    e If-None-Match: el ETag es el hash del contenido, una descarga
+    repetida responde 304.
+    """
+    query = db.query(ComunicadoAdjunto).filter(
+        ComunicadoAdjunto.id == adjunto_id,
+        ComunicadoAdjunto.comunicado_id == comunicado_id
+    )
+    return _descargar(request, query, ComunicadoAdjunto)
+
+
+@router.delete("/comunicados/{comunicado_id}/adjuntos/{adjunto_id}", status_code=204)
+async def delete_adjunto_comunicado(
+    comunicado_id: UUID,
+    adjunto_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """Quitar un adjunto (el archivo se borra cuando nadie más lo usa)"""
+    adjunto = db.query(ComunicadoAdjunto).filter(
+        ComunicadoAdjunto.id == adjunto_id,
+        ComunicadoAdjunto.comunicado_id == comunicado_id
+    ).first()
+    if not adjunto:
+        raise HTTPException(status_code=404, detail="Adjunto no encontrado")
+    
+    db.delete(adjunto)
+    db.commit()
+    return None
@@ -1,56 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date, time as datetime_time
 from uuid import UUID
+import json
 
-from app.database import get_db
+from app.database import get_db, get_read_db, new_read_session
+from app.instrumentacion import presupuesto_consultas
 from app.models.comunicado import Comunicado, ComunicadoDestinatario
-from app.models.contacto import Contacto, Grupo, GrupoMiembro
+from app.models.contacto import Contacto, Grupo
 from app.models.log import ComunicadoLog
+from app.pagination import SortKey, paginate
 from app.schemas.comunicado import (
     ComunicadoCreate,
     ComunicadoUpdate,
     ComunicadoResponse,
+    ComunicadoCambios,
+    ComunicadoBusqueda,
     VistaPreviaResponse,
     VistaPreviaItem,
     ProgramarEnvio,
     EstadisticasEnvio,
+    EstadisticasCanal,
     ComunicadoLogResponse
 )
-from app.services.envio_service import replace_variables, send_comunicado
+from app.services.envio_service import send_comunicado
+from app.services.audiencia_service import (
+    canales_de,
+    contar_audiencia,
+    destinatarios_inexistentes,
+    insertar_destinatarios,
+    muestra_audiencia
+)
+from app.services.plantillas_service import compilar_plantilla
+from app.services.contadores_service import leer_contadores
+from app.services.sync_service import obtener_cambios
+from app.services.busqueda_service import buscar_texto
 
 router = APIRouter()
 
+# Orden estable para paginar por cursor
+ORDEN_COMUNICADOS = [SortKey(Comunicado.creado_en, desc=True), SortKey(Comunicado.id, desc=True)]
+ORDEN_DESTINATARIOS = [SortKey(ComunicadoDestinatario.id)]
+ORDEN_LOG = [SortKey(ComunicadoLog.fecha_envio, desc=True), SortKey(ComunicadoLog.id, desc=True)]
+
 
 @router.post("/", response_model=ComunicadoResponse, status_code=201)
 async def create_comunicado(
     comunicado: ComunicadoCreate,
     db: Session = Depends(get_db)
 ):
-    """Crear un nuevo comunicado (borrador)"""
+    """Crear un nuevo comunicado (borrador) con sus destinatarios en una sola transacción"""
+    # Sin repetidos, respetando el orden recibido
+    contacto_ids = list(dict.fromkeys(comunicado.destinatarios_contactos))
+    grupo_ids = list(dict.fromkeys(comunicado.destinatarios_grupos))
+    
+    # Validar que existan todos (una consulta)
+    contactos_faltantes, grupos_faltantes = destinatarios_inexistentes(db, contacto_ids, grupo_ids)
+    if contactos_faltantes or grupos_faltantes:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "mensaje": "Hay destinatarios que no existen",
+                "contactos": [str(id_) for id_ in contactos_faltantes],
+                "grupos": [str(id_) for id_ in grupos_faltantes]
+            }
+        )
+    
     # Crear comunicado
     comunicado_data = comunicado.model_dump(exclude={'destinatarios_contactos', 'destinatarios_grupos'})
     db_comunicado = Comunicado(**comunicado_data)
     db.add(db_comunicado)
-    db.commit()
-    db.refresh(db_comunicado)
+    db.flush()
     
-    # Agregar destinatarios (contactos individuales)
-    for contacto_id in comunicado.destinatarios_contactos:
-        destinatario = ComunicadoDestinatario(
-            comunicado_id=db_comunicado.id,
-            contacto_id=contacto_id
-        )
-        db.add(destinatario)
-    
-    # Agregar destinatarios (grupos)
-    for grupo_id in comunicado.destinatarios_grupos:
-        destinatario = ComunicadoDestinatario(
-            comunicado_id=db_comunicado.id,
-            grupo_id=grupo_id
-        )
-        db.add(destinatario)
+    # Agregar destinatarios (contactos y grupos) en un INSERT multi-fila
+    insertar_destinatarios(db, db_comunicado.id, contacto_ids, grupo_ids)
     
     db.commit()
     db.refresh(db_comunicado)
@@ -60,11 +87,12 @@ async def create_comunicado(
 
 @router.get("/", response_model=List[ComunicadoResponse])
 async def list_comunicados(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
     limit: int = Query(100, ge=1, le=500),
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
     tipo: Optional[str] = Query(None, description="Filtrar por tipo"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Listar comunicados con filtros"""
     query = db.query(Comunicado)
@@ -75,10 +103,47 @@ async def list_comunicados(
     if tipo:
         query = query.filter(Comunicado.tipo == tipo)
     
-    query = query.order_by(Comunicado.creado_en.desc())
+    return paginate(query, ORDEN_COMUNICADOS, cursor, limit, response)
+
+
+@router.get("/changes", response_model=ComunicadoCambios)
+async def get_cambios_comunicados(
+    since: Optional[str] = Query(None, description="Cursor devuelto por la llamada anterior (vacío = desde el principio)"),
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_read_db)
+):
+    """Comunicados creados, modificados o eliminados desde el cursor (seguir mientras hay_mas)"""
+    return obtener_cambios(db, Comunicado, "comunicados", since, limit)
+
+
+@router.get("/buscar", response_model=List[ComunicadoBusqueda])
+async def buscar_comunicados(
+    q: str = Query(..., min_length=1, description="Texto a buscar (admite \"frase exacta\", or, -excluir)"),
+    limit: int = Query(20, ge=1, le=100),
+    estado: Optional[str] = Query(None),
+    tipo: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """Búsqueda de texto completo en título y contenido, ordenada por relevancia"""
+    filtros = []
+    if estado:
+        filtros.append(Comunicado.estado == estado)
+    if tipo:
+        filtros.append(Comunicado.tipo == tipo)
+    
+    filas = buscar_texto(db, Comunicado, [Comunicado.titulo, Comunicado.contenido], q, filtros, limit)
     
-    comunicados = query.offset(skip).limit(limit).all()
-    return comunicados
+    result = []
+    for comunicado, rank, titulo_resaltado, contenido_resaltado in filas:
+        comunicado_dict = ComunicadoResponse.model_validate(comunicado).model_dump()
+        comunicado_dict.update(
+            rank=rank,
+            titulo_resaltado=titulo_resaltado,
+            contenido_resaltado=contenido_resaltado
+        )
+        result.append(ComunicadoBusqueda(**comunicado_dict))
+    
+    return result
 
 
 @router.get("/{comunicado_id}", response_model=ComunicadoResponse)
@@ -145,65 +210,58 @@ async def delete_comunicado(
 # ============================================
 
 @router.post("/{comunicado_id}/vista-previa", response_model=VistaPreviaResponse)
+@presupuesto_consultas(3)
 async def preview_comunicado(
     comunicado_id: UUID,
+    muestra: int = Query(3, ge=1, le=50, description="Cantidad de mensajes de ejemplo"),
+    muestreo: str = Query(
+        "aleatorio",
+        pattern="^(aleatorio|estratificado)$",
+        description="estratificado: toma contactos de cada destinatario (contacto o grupo) por turnos"
+    ),
     db: Session = Depends(get_db)
 ):
-    """Generar vista previa del comunicado con variables reemplazadas"""
+    """
+    Generar vista previa del comunicado con variables reemplazadas.
+    
+    Cuenta la audiencia real (contactos activos, sin duplicados entre
+    grupos) por canal en una sola consulta y renderiza una muestra.
+    """
     comunicado = db.query(Comunicado).filter(Comunicado.id == comunicado_id).first()
     if not comunicado:
         raise HTTPException(status_code=404, detail="Comunicado no encontrado")
     
-    # Obtener destinatarios
-    destinatarios = db.query(ComunicadoDestinatario).filter(
-        ComunicadoDestinatario.comunicado_id == comunicado_id
-    ).all()
-    
-    # Expandir contactos (incluir grupos)
-    contactos_preview = []
-    for dest in destinatarios[:3]:  # Máximo 3 para preview
-        if dest.contacto_id:
-            contacto = db.query(Contacto).filter(Contacto.id == dest.contacto_id).first()
-            if contacto:
-                contactos_preview.append(contacto)
-        elif dest.grupo_id:
-            # Tomar primer miembro del grupo
-            miembro = db.query(GrupoMiembro).filter(
-                GrupoMiembro.grupo_id == dest.grupo_id
-            ).first()
-            if miembro:
-                contacto = db.query(Contacto).filter(Contacto.id == miembro.contacto_id).first()
-                if contacto:
-                    contactos_preview.append(contacto)
+    plantilla = compilar_plantilla(comunicado.contenido)
+    
+    audiencia = contar_audiencia(
+        db, comunicado_id, canales_de(comunicado.tipo), plantilla.variables
+    )
+    
+    contactos_preview = muestra_audiencia(
+        db, comunicado_id, muestra, estratificada=muestreo == "estratificado"
+    )
     
     # Generar previews
-    previews = []
-    for contacto in contactos_preview[:4]:  # Máximo 4 previews
-        mensaje_final = replace_variables(comunicado.contenido, contacto)
-        previews.append(VistaPreviaItem(
+    previews = [
+        VistaPreviaItem(
             contacto_nombre=contacto.nombre,
             contacto_email=contacto.email,
             contacto_whatsapp=contacto.whatsapp,
-            mensaje_final=mensaje_final
-        ))
-    
-    # Contar total de destinatarios
-    total = 0
-    for dest in destinatarios:
-        if dest.contacto_id:
-            total += 1
-        elif dest.grupo_id:
-            count = db.query(GrupoMiembro).filter(
-                GrupoMiembro.grupo_id == dest.grupo_id
-            ).count()
-            total += count
+            mensaje_final=plantilla.render(contacto)
+        )
+        for contacto in contactos_preview
+    ]
     
     return VistaPreviaResponse(
         comunicado_id=comunicado_id,
         titulo=comunicado.titulo,
         tipo=comunicado.tipo,
-        total_destinatarios=total,
-        previews=previews
+        total_destinatarios=audiencia["total"],
+        previews=previews,
+        total_por_canal=audiencia["por_canal"],
+        sin_email=audiencia["sin_email"],
+        sin_whatsapp=audiencia["sin_whatsapp"],
+        variables_faltantes=audiencia["variables_faltantes"]
     )
 
 
@@ -279,86 +337,186 @@ async def enviar_ahora(
 # ESTADO Y LOGS
 # ============================================
 
+def _query_estado_envios(
+    db: Session,
+    comunicado_id: UUID,
+    estado: Optional[str],
+    canal: Optional[str]
+):
+    """Destinatarios con los datos de su contacto o grupo en una sola consulta"""
+    query = db.query(
+        ComunicadoDestinatario.id,
+        ComunicadoDestinatario.contacto_id,
+        ComunicadoDestinatario.grupo_id,
+        ComunicadoDestinatario.estado_envio,
+        ComunicadoDestinatario.intentos_fallidos,
+        ComunicadoDestinatario.error_mensaje,
+        ComunicadoDestinatario.fecha_envio,
+        Contacto.nombre.label("contacto_nombre"),
+        Contacto.email.label("contacto_email"),
+        Contacto.whatsapp.label("contacto_whatsapp"),
+        Grupo.nombre.label("grupo_nombre")
+    ).outerjoin(
+        Contacto, Contacto.id == ComunicadoDestinatario.contacto_id
+    ).outerjoin(
+        Grupo, Grupo.id == ComunicadoDestinatario.grupo_id
+    ).filter(
+        ComunicadoDestinatario.comunicado_id == comunicado_id
+    )
+    
+    if estado:
+        query = query.filter(ComunicadoDestinatario.estado_envio == estado)
+    
+    # Canal: contactos con ese dato cargado o grupos de ese tipo
+    if canal:
+        dato_contacto = Contacto.whatsapp if canal == "whatsapp" else Contacto.email
+        query = query.filter(or_(
+            and_(dato_contacto.isnot(None), dato_contacto != ""),
+            Grupo.tipo.in_([canal, "ambos"])
+        ))
+    
+    return query
+
+
+def _fila_estado_envio(row) -> dict:
+    destinatario = None
+    if row.contacto_id and row.contacto_nombre is not None:
+        destinatario = {
+            "tipo": "contacto",
+            "nombre": row.contacto_nombre,
+            "email": row.contacto_email,
+            "whatsapp": row.contacto_whatsapp
+        }
+    elif row.grupo_id and row.grupo_nombre is not None:
+        destinatario = {
+            "tipo": "grupo",
+            "nombre": row.grupo_nombre
+        }
+    
+    return {
+        "id": row.id,
+        "destinatario": destinatario,
+        "estado_envio": row.estado_envio,
+        "intentos_fallidos": row.intentos_fallidos,
+        "error_mensaje": row.error_mensaje,
+        "fecha_envio": row.fecha_envio
+    }
+
+
+def _exportar_estado_envios_ndjson(comunicado_id: UUID, estado: Optional[str], canal: Optional[str]):
+    """
+    Genera una línea JSON por destinatario leyendo con cursor del servidor.
+    Usa su propia sesión porque se consume después de que termina el endpoint.
+    """
+    db = new_read_session()
+    try:
+        query = _query_estado_envios(db, comunicado_id, estado, canal).order_by(
+            ComunicadoDestinatario.id
+        ).yield_per(1000)
+        for row in query:
+            yield json.dumps(jsonable_encoder(_fila_estado_envio(row))) + "\n"
+    finally:
+        db.close()
+
+
 @router.get("/{comunicado_id}/estado-envios")
+@presupuesto_consultas(3)  # comunicado + página (+ lag de la réplica)
 async def get_estado_envios(
     comunicado_id: UUID,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
+    limit: int = Query(100, ge=1, le=1000),
+    estado: Optional[str] = Query(None, description="Filtrar por estado: pendiente, enviado, error, reintentos"),
+    canal: Optional[str] = Query(None, pattern="^(whatsapp|email)$", description="Filtrar por canal"),
+    formato: str = Query("json", pattern="^(json|ndjson)$", description="ndjson: exporta todos los destinatarios en streaming"),
+    db: Session = Depends(get_read_db)
 ):
-    """Ver estado de envío para cada destinatario"""
-    comunicado = db.query(Comunicado).filter(Comunicado.id == comunicado_id).first()
+    """
+    Ver estado de envío para cada destinatario.
+    
+    Paginado por cursor. Con formato=ndjson se ignoran cursor y limit y se
+    transmiten todos los destinatarios, una línea JSON por fila.
+    """
+    comunicado = db.query(Comunicado.id).filter(Comunicado.id == comunicado_id).first()
     if not comunicado:
         raise HTTPException(status_code=404, detail="Comunicado no encontrado")
     
-    destinatarios = db.query(ComunicadoDestinatario).filter(
-        ComunicadoDestinatario.comunicado_id == comunicado_id
-    ).all()
+    if formato == "ndjson":
+        return StreamingResponse(
+            _exportar_estado_envios_ndjson(comunicado_id, estado, canal),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="estado-envios-{comunicado_id}.ndjson"'}
+        )
     
-    result = []
-    for dest in destinatarios:
-        contacto_info = None
-        if dest.contacto_id:
-            contacto = db.query(Contacto).filter(Contacto.id == dest.contacto_id).first()
-            if contacto:
-                contacto_info = {
-                    "tipo": "contacto",
-                    "nombre": contacto.nombre,
-                    "email": contacto.email,
-                    "whatsapp": contacto.whatsapp
-                }
-        elif dest.grupo_id:
-            grupo = db.query(Grupo).filter(Grupo.id == dest.grupo_id).first()
-            if grupo:
-                contacto_info = {
-                    "tipo": "grupo",
-                    "nombre": grupo.nombre
-                }
-        
-        result.append({
-            "destinatario": contacto_info,
-            "estado_envio": dest.estado_envio,
-            "intentos_fallidos": dest.intentos_fallidos,
-            "error_mensaje": dest.error_mensaje,
-            "fecha_envio": dest.fecha_envio
-        })
+    query = _query_estado_envios(db, comunicado_id, estado, canal)
+    rows = paginate(query, ORDEN_DESTINATARIOS, cursor, limit, response)
     
-    return result
+    return [_fila_estado_envio(row) for row in rows]
 
 
 @router.get("/{comunicado_id}/log", response_model=List[ComunicadoLogResponse])
 async def get_log(
     comunicado_id: UUID,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener historial de envíos del comunicado"""
+    """Obtener historial de envíos del comunicado (más recientes primero, paginado)"""
     comunicado = db.query(Comunicado).filter(Comunicado.id == comunicado_id).first()
     if not comunicado:
         raise HTTPException(status_code=404, detail="Comunicado no encontrado")
     
-    logs = db.query(ComunicadoLog).filter(
-        ComunicadoLog.comunicado_id == comunicado_id
-    ).order_by(ComunicadoLog.fecha_envio.desc()).all()
+    query = db.query(ComunicadoLog).filter(ComunicadoLog.comunicado_id == comunicado_id)
     
-    return logs
+    return paginate(query, ORDEN_LOG, cursor, limit, response)
 
 
 @router.get("/{comunicado_id}/estadisticas", response_model=EstadisticasEnvio)
 async def get_estadisticas(
     comunicado_id: UUID,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener estadísticas de envío del comunicado"""
+    """
+    Obtener estadísticas de envío del comunicado.
+    
+    Lee los contadores por canal que el envío mantiene al día, así que el
+    costo no depende del tamaño del comunicado. Si todavía no se envió,
+    cuenta los destinatarios con una sola consulta agregada.
+    """
     comunicado = db.query(Comunicado).filter(Comunicado.id == comunicado_id).first()
     if not comunicado:
         raise HTTPException(status_code=404, detail="Comunicado no encontrado")
     
-    destinatarios = db.query(ComunicadoDestinatario).filter(
-        ComunicadoDestinatario.comunicado_id == comunicado_id
-    ).all()
+    contadores = leer_contadores(db, comunicado_id)
+    
+    por_canal = {
+        c.canal: EstadisticasCanal(
+            total=c.total,
+            enviados=c.enviados,
+            errores=c.errores,
+            pendientes=c.pendientes,
+            reintentos=c.reintentos
+        )
+        for c in contadores
+    }
     
-    total = len(destinatarios)
-    enviados = sum(1 for d in destinatarios if d.estado_envio == "enviado")
-    errores = sum(1 for d in destinatarios if d.estado_envio == "error")
-    pendientes = sum(1 for d in destinatarios if d.estado_envio == "pendiente")
+    if por_canal:
+        total = sum(c.total for c in por_canal.values())
+        enviados = sum(c.enviados for c in por_canal.values())
+        errores = sum(c.errores for c in por_canal.values())
+        pendientes = sum(c.pendientes for c in por_canal.values())
+        reintentos = sum(c.reintentos for c in por_canal.values())
+    else:
+        row = db.query(
+            func.count().label("total"),
+            func.count().filter(ComunicadoDestinatario.estado_envio == "enviado").label("enviados"),
+            func.count().filter(ComunicadoDestinatario.estado_envio == "error").label("errores"),
+            func.count().filter(ComunicadoDestinatario.estado_envio == "pendiente").label("pendientes"),
+            func.count().filter(ComunicadoDestinatario.estado_envio == "reintentos").label("reintentos")
+        ).filter(ComunicadoDestinatario.comunicado_id == comunicado_id).one()
+        total, enviados, errores = row.total, row.enviados, row.errores
+        pendientes, reintentos = row.pendientes, row.reintentos
     
     porcentaje_exito = (enviados / total * 100) if total > 0 else 0
     
@@ -369,5 +527,7 @@ async def get_estadisticas(
         enviados=enviados,
         errores=errores,
         pendientes=pendientes,
-        porcentaje_exito=round(porcentaje_exito, 2)
+        reintentos=reintentos,
+        porcentaje_exito=round(porcentaje_exito, 2),
+        por_canal=por_canal
     )
@@ -1,18 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import Text, func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.contacto import Contacto
+from app.pagination import SortKey, paginate
+from app.services.estadisticas_service import cache_estadisticas, calcular_stats_contactos
+from app.services.sync_service import obtener_cambios
+from app.services.contactos_service import buscar_duplicados, fusionar_duplicados
 from app.schemas.contacto import (
     ContactoCreate,
     ContactoUpdate,
-    ContactoResponse
+    ContactoResponse,
+    ContactoCambios,
+    ContactoDuplicados,
+    FusionContactosResponse
 )
+from app.schemas.etiqueta import EtiquetaFaceta
 
 router = APIRouter()
 
+# Orden estable para paginar por cursor (índice idx_contactos_nombre_id)
+ORDEN_CONTACTOS = [SortKey(Contacto.nombre), SortKey(Contacto.id)]
+
+
+def _invalidar_estadisticas():
+    """Un contacto cambia sus propios contadores y los miembros activos de los grupos"""
+    cache_estadisticas.invalidate("contactos")
+    cache_estadisticas.invalidate("grupos")
+
+
+def _guardar(db: Session, contacto: Contacto):
+    """
+    Commit que traduce la violación de los índices únicos de identidad
+    (email / WhatsApp normalizados) en un 409 con el contacto existente
+    """
+    # El rollback expira el objeto: los valores nuevos se leen antes
+    contacto_id, email, whatsapp = contacto.id, contacto.email, contacto.whatsapp
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if "_unico" not in str(e.orig):
+            raise
+        existente = db.query(Contacto.id).filter(
+            Contacto.id != contacto_id,
+            or_(
+                func.normalizar_email(email, type_=Text) == Contacto.email_normalizado,
+                func.normalizar_telefono(whatsapp, type_=Text) == Contacto.whatsapp_normalizado
+            )
+        ).first()
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "mensaje": "Ya existe un contacto con ese email o WhatsApp",
+                "contacto_id": str(existente.id) if existente else None
+            }
+        )
+
 
 @router.post("/", response_model=ContactoResponse, status_code=201)
 async def create_contacto(
@@ -22,42 +70,137 @@ async def create_contacto(
     """Crear un nuevo contacto"""
     db_contacto = Contacto(**contacto.model_dump())
     db.add(db_contacto)
-    db.commit()
+    _guardar(db, db_contacto)
+    _invalidar_estadisticas()
     db.refresh(db_contacto)
     return db_contacto
 
 
-@router.get("/", response_model=List[ContactoResponse])
-async def list_contactos(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500),
-    search: Optional[str] = Query(None, description="Buscar por nombre, email o whatsapp"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado: activo, inactivo"),
-    etiqueta: Optional[str] = Query(None, description="Filtrar por etiqueta"),
-    db: Session = Depends(get_db)
+def _filtrar_contactos(
+    query,
+    search: Optional[str],
+    modo: str,
+    estado: Optional[str],
+    etiquetas: List[str],
+    etiquetas_modo: str
 ):
-    """Listar contactos con filtros y búsqueda"""
-    query = db.query(Contacto)
-    
+    """Aplica los filtros comunes del listado y de las facetas"""
     # Filtro por búsqueda
     if search:
-        search_filter = f"%{search}%"
-        query = query.filter(
-            (Contacto.nombre.ilike(search_filter)) |
-            (Contacto.email.ilike(search_filter)) |
-            (Contacto.whatsapp.ilike(search_filter))
-        )
+        termino = func.normalizar_texto(search, type_=Text)
+        if modo == "contiene":
+            patron = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.filter(
+                Contacto.busqueda.like("%" + func.normalizar_texto(patron, type_=Text) + "%")
+            )
+        else:
+            query = query.filter(termino.op("<%")(Contacto.busqueda))
     
     # Filtro por estado
     if estado:
         query = query.filter(Contacto.estado == estado)
     
-    # Filtro por etiqueta
+    # Filtro por etiquetas (&& / @>, ambos servidos por el índice GIN)
+    if etiquetas:
+        if etiquetas_modo == "alguna":
+            query = query.filter(Contacto.etiquetas.overlap(etiquetas))
+        else:
+            query = query.filter(Contacto.etiquetas.contains(etiquetas))
+    
+    return query
+
+
+@router.get("/", response_model=List[ContactoResponse])
+async def list_contactos(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
+    limit: int = Query(100, ge=1, le=500),
+    search: Optional[str] = Query(None, description="Buscar por nombre, email o whatsapp (sin distinguir acentos)"),
+    modo: str = Query(
+        "contiene",
+        pattern="^(contiene|similar)$",
+        description="contiene: coincidencia parcial | similar: búsqueda difusa ordenada por similitud"
+    ),
+    estado: Optional[str] = Query(None, description="Filtrar por estado: activo, inactivo"),
+    etiqueta: Optional[str] = Query(None, description="Filtrar por etiqueta"),
+    etiquetas: List[str] = Query([], description="Filtrar por varias etiquetas"),
+    etiquetas_modo: str = Query("todas", pattern="^(todas|alguna)$", description="todas: debe tener todas | alguna: al menos una"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Listar contactos con filtros y búsqueda.
+    
+    La búsqueda usa la columna normalizada `busqueda` con índice de trigramas.
+    En modo `similar` los resultados vienen ordenados por similitud y no se
+    pagina por cursor: se devuelven los `limit` mejores.
+    """
     if etiqueta:
-        query = query.filter(Contacto.etiquetas.contains([etiqueta]))
+        etiquetas = [*etiquetas, etiqueta]
+    
+    query = _filtrar_contactos(db.query(Contacto), search, modo, estado, etiquetas, etiquetas_modo)
+    
+    if search and modo == "similar":
+        return query.order_by(
+            func.word_similarity(func.normalizar_texto(search, type_=Text), Contacto.busqueda).desc(),
+            Contacto.nombre
+        ).limit(limit).all()
+    
+    return paginate(query, ORDEN_CONTACTOS, cursor, limit, response)
+
+
+@router.get("/changes", response_model=ContactoCambios)
+async def get_cambios_contactos(
+    since: Optional[str] = Query(None, description="Cursor devuelto por la llamada anterior (vacío = desde el principio)"),
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_read_db)
+):
+    """Contactos creados, modificados o eliminados desde el cursor (seguir mientras hay_mas)"""
+    return obtener_cambios(db, Contacto, "contactos", since, limit)
+
+
+@router.get("/etiquetas/facetas", response_model=List[EtiquetaFaceta])
+async def get_facetas_etiquetas(
+    search: Optional[str] = Query(None),
+    modo: str = Query("contiene", pattern="^(contiene|similar)$"),
+    estado: Optional[str] = Query(None),
+    etiquetas: List[str] = Query([]),
+    etiquetas_modo: str = Query("todas", pattern="^(todas|alguna)$"),
+    db: Session = Depends(get_read_db)
+):
+    """Cantidad de contactos por etiqueta para los filtros actuales (una sola consulta)"""
+    etiquetas_filtradas = _filtrar_contactos(
+        db.query(func.unnest(Contacto.etiquetas).label("etiqueta")),
+        search, modo, estado, etiquetas, etiquetas_modo
+    ).subquery()
     
-    contactos = query.offset(skip).limit(limit).all()
-    return contactos
+    cantidad = func.count().label("cantidad")
+    facetas = db.query(etiquetas_filtradas.c.etiqueta, cantidad).group_by(
+        etiquetas_filtradas.c.etiqueta
+    ).order_by(cantidad.desc(), etiquetas_filtradas.c.etiqueta).all()
+    
+    return [{"etiqueta": f.etiqueta, "cantidad": f.cantidad} for f in facetas]
+
+
+@router.get("/duplicados", response_model=List[ContactoDuplicados])
+async def get_duplicados(
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """Grupos de contactos que comparten email o WhatsApp (vista previa de la fusión)"""
+    return buscar_duplicados(db, limit)
+
+
+@router.post("/duplicados/fusionar", response_model=FusionContactosResponse)
+async def post_fusionar_duplicados(
+    db: Session = Depends(get_db)
+):
+    """
+    Fusionar duplicados: queda el contacto más antiguo de cada grupo, con
+    los grupos, envíos, etiquetas y datos faltantes de los demás
+    """
+    resultado = fusionar_duplicados(db)
+    _invalidar_estadisticas()
+    return resultado
 
 
 @router.get("/{contacto_id}", response_model=ContactoResponse)
@@ -88,7 +231,8 @@ async def update_contacto(
     for field, value in update_data.items():
         setattr(contacto, field, value)
     
-    db.commit()
+    _guardar(db, contacto)
+    _invalidar_estadisticas()
     db.refresh(contacto)
     return contacto
 
@@ -105,20 +249,17 @@ async def delete_contacto(
     
     db.delete(contacto)
     db.commit()
+    _invalidar_estadisticas()
     return None
 
 
 @router.get("/stats/count")
 async def get_contactos_stats(
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener estadísticas de contactos"""
-    total = db.query(Contacto).count()
-    activos = db.query(Contacto).filter(Contacto.estado == "activo").count()
-    inactivos = db.query(Contacto).filter(Contacto.estado == "inactivo").count()
-    
-    return {
-        "total": total,
-        "activos": activos,
-        "inactivos": inactivos
-    }
+    """Obtener estadísticas de contactos (una consulta, cacheada STATS_CACHE_TTL segundos)"""
+    return cache_estadisticas.get_or_compute_db(
+        ("contactos", "stats"),
+        db,
+        calcular_stats_contactos
+    )
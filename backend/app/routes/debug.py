@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from typing import Optional
+
+from app.perfilador import NOMBRE_PERFIL, directorio_perfiles, perfilado_habilitado, token_valido
+
+router = APIRouter()
+
+
+def requiere_admin(
+    x_admin_token: Optional[str] = Header(None),
+    admin_token: Optional[str] = Query(None)
+):
+    """Token de administración en el header X-Admin-Token o en ?admin_token="""
+    if not perfilado_habilitado():
+        raise HTTPException(status_code=404, detail="Perfilado deshabilitado")
+    if not token_valido(x_admin_token or admin_token):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+
+@router.get("/perfiles", dependencies=[Depends(requiere_admin)])
+async def list_perfiles():
+    """Perfiles guardados, más recientes primero"""
+    directorio = directorio_perfiles()
+    if not directorio.is_dir():
+        return []
+
+    perfiles = sorted(
+        (ruta for ruta in directorio.iterdir() if NOMBRE_PERFIL.match(ruta.name)),
+        key=lambda ruta: ruta.name,
+        reverse=True
+    )
+    return [{"nombre": ruta.name, "tamano": ruta.stat().st_size} for ruta in perfiles]
+
+
+@router.get("/perfiles/{nombre}", dependencies=[Depends(requiere_admin)])
+async def download_perfil(nombre: str):
+    """
+    Descargar un perfil en formato folded (flamegraph.pl, speedscope,
+    inferno-flamegraph)
+    """
+    if not NOMBRE_PERFIL.match(nombre):
+        raise HTTPException(status_code=400, detail="Nombre de perfil inválido")
+
+    ruta = directorio_perfiles() / nombre
+    if not ruta.is_file():
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+
+    return FileResponse(ruta, media_type="text/plain; charset=utf-8", filename=nombre)
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.contacto import Grupo, GrupoMiembro, Contacto
+from app.pagination import SortKey, paginate
+from app.services.estadisticas_service import cache_estadisticas, calcular_stats_grupo
 from app.schemas.contacto import (
     GrupoCreate,
     GrupoUpdate,
@@ -15,6 +17,10 @@ from app.schemas.contacto import (
 
 router = APIRouter()
 
+# Orden estable para paginar por cursor
+ORDEN_GRUPOS = [SortKey(Grupo.nombre), SortKey(Grupo.id)]
+ORDEN_MIEMBROS = [SortKey(Contacto.nombre), SortKey(Contacto.id)]
+
 
 @router.post("/", response_model=GrupoResponse, status_code=201)
 async def create_grupo(
@@ -31,11 +37,12 @@ async def create_grupo(
 
 @router.get("/", response_model=List[GrupoResponse])
 async def list_grupos(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
     limit: int = Query(100, ge=1, le=500),
     tipo: Optional[str] = Query(None, description="Filtrar por tipo: email, whatsapp, ambos"),
     estado: Optional[str] = Query(None, description="Filtrar por estado: activo, inactivo"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Listar grupos con filtros"""
     query = db.query(Grupo)
@@ -46,8 +53,7 @@ async def list_grupos(
     if estado:
         query = query.filter(Grupo.estado == estado)
     
-    grupos = query.offset(skip).limit(limit).all()
-    return grupos
+    return paginate(query, ORDEN_GRUPOS, cursor, limit, response)
 
 
 @router.get("/{grupo_id}", response_model=GrupoResponse)
@@ -78,6 +84,7 @@ async def update_grupo(
         setattr(grupo, field, value)
     
     db.commit()
+    cache_estadisticas.invalidate("grupos")
     db.refresh(grupo)
     return grupo
 
@@ -94,6 +101,7 @@ async def delete_grupo(
     
     db.delete(grupo)
     db.commit()
+    cache_estadisticas.invalidate("grupos")
     return None
 
 
@@ -131,6 +139,7 @@ async def add_member(
     miembro = GrupoMiembro(grupo_id=grupo_id, contacto_id=contacto_id)
     db.add(miembro)
     db.commit()
+    cache_estadisticas.invalidate("grupos")
     
     return {
         "message": "Contacto agregado al grupo exitosamente",
@@ -156,50 +165,43 @@ async def remove_member(
     
     db.delete(miembro)
     db.commit()
+    cache_estadisticas.invalidate("grupos")
     return None
 
 
 @router.get("/{grupo_id}/miembros", response_model=List[ContactoResponse])
 async def get_members(
     grupo_id: UUID,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener todos los miembros de un grupo"""
+    """Obtener los miembros de un grupo (paginado por cursor)"""
     grupo = db.query(Grupo).filter(Grupo.id == grupo_id).first()
     if not grupo:
         raise HTTPException(status_code=404, detail="Grupo no encontrado")
     
     # Obtener miembros
-    miembros = db.query(Contacto).join(GrupoMiembro).filter(
+    query = db.query(Contacto).join(GrupoMiembro).filter(
         GrupoMiembro.grupo_id == grupo_id
-    ).all()
+    )
     
-    return miembros
+    return paginate(query, ORDEN_MIEMBROS, cursor, limit, response)
 
 
 @router.get("/{grupo_id}/stats")
 async def get_grupo_stats(
     grupo_id: UUID,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener estadísticas del grupo"""
-    grupo = db.query(Grupo).filter(Grupo.id == grupo_id).first()
-    if not grupo:
+    """Obtener estadísticas del grupo (una consulta, cacheada STATS_CACHE_TTL segundos)"""
+    stats = cache_estadisticas.get_or_compute_db(
+        ("grupos", grupo_id),
+        db,
+        lambda sesion: calcular_stats_grupo(sesion, grupo_id)
+    )
+    if stats is None:
         raise HTTPException(status_code=404, detail="Grupo no encontrado")
     
-    total_miembros = db.query(GrupoMiembro).filter(
-        GrupoMiembro.grupo_id == grupo_id
-    ).count()
-    
-    miembros_activos = db.query(GrupoMiembro).join(Contacto).filter(
-        GrupoMiembro.grupo_id == grupo_id,
-        Contacto.estado == "activo"
-    ).count()
-    
-    return {
-        "grupo_id": str(grupo_id),
-        "nombre": grupo.nombre,
-        "total_miembros": total_miembros,
-        "miembros_activos": miembros_activos,
-        "miembros_inactivos": total_miembros - miembros_activos
-    }
+    return stats
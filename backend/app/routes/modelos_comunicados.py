@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import load_only
 
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.models.contacto import Contacto
 from app.models.modelo_comunicado import ModeloComunicado
+from app.pagination import SortKey, paginate
+from app.services.plantillas_service import invalidar_modelo, plantilla_de_modelo
 
 router = APIRouter()
 
+# Orden estable para paginar por cursor (nombre es único e indexado)
+ORDEN_MODELOS = [SortKey(ModeloComunicado.nombre), SortKey(ModeloComunicado.id)]
+
 class ModeloCreate(BaseModel):
     nombre: str
     descripcion: Optional[str] = None
@@ -31,6 +38,19 @@ class ModeloResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class RenderRequest(BaseModel):
+    contacto_ids: List[UUID] = Field(..., min_length=1, max_length=1000)
+
+class MensajeRenderizado(BaseModel):
+    contacto_id: UUID
+    nombre: str
+    mensaje: str
+
+class RenderResponse(BaseModel):
+    modelo_id: UUID
+    mensajes: List[MensajeRenderizado]
+    no_encontrados: List[UUID]
+
 @router.post("/", status_code=201, response_model=ModeloResponse)
 async def create_modelo(
     modelo: ModeloCreate,
@@ -45,10 +65,11 @@ async def create_modelo(
 
 @router.get("/", response_model=List[ModeloResponse])
 async def list_modelos(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
     limit: int = Query(100, ge=1, le=500),
     tipo: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Listar todos los modelos"""
     query = db.query(ModeloComunicado)
@@ -56,8 +77,7 @@ async def list_modelos(
     if tipo:
         query = query.filter(ModeloComunicado.tipo == tipo)
     
-    modelos = query.offset(skip).limit(limit).all()
-    return modelos
+    return paginate(query, ORDEN_MODELOS, cursor, limit, response)
 
 @router.get("/{modelo_id}", response_model=ModeloResponse)
 async def get_modelo(
@@ -86,6 +106,7 @@ async def update_modelo(
         setattr(db_modelo, field, value)
     
     db.commit()
+    invalidar_modelo(modelo_id)
     db.refresh(db_modelo)
     return db_modelo
 
@@ -101,4 +122,42 @@ async def delete_modelo(
     
     db.delete(modelo)
     db.commit()
+    invalidar_modelo(modelo_id)
     return None
+
+@router.post("/{modelo_id}/render", response_model=RenderResponse)
+async def render_modelo(
+    modelo_id: UUID,
+    datos: RenderRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Renderizar un modelo para varios contactos de una vez.
+    El modelo se compila una sola vez (y queda en cache mientras no cambie)
+    y los contactos se cargan con una sola consulta.
+    """
+    modelo = db.query(ModeloComunicado).filter(ModeloComunicado.id == modelo_id).first()
+    if not modelo:
+        raise HTTPException(status_code=404, detail="Modelo no encontrado")
+    
+    plantilla = plantilla_de_modelo(modelo)
+    ids = list(dict.fromkeys(datos.contacto_ids))
+    contactos = {
+        contacto.id: contacto
+        for contacto in db.query(Contacto).options(
+            load_only(Contacto.id, Contacto.nombre, Contacto.email, Contacto.whatsapp)
+        ).filter(Contacto.id.in_(ids))
+    }
+    
+    return RenderResponse(
+        modelo_id=modelo.id,
+        mensajes=[
+            MensajeRenderizado(
+                contacto_id=contacto_id,
+                nombre=contactos[contacto_id].nombre,
+                mensaje=plantilla.render(contactos[contacto_id])
+            )
+            for contacto_id in ids if contacto_id in contactos
+        ],
+        no_encontrados=[contacto_id for contacto_id in ids if contacto_id not in contactos]
+    )
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db, get_read_db
+from app.models.supresion import Supresion
+from app.pagination import SortKey, paginate
+from app.schemas.supresion import SupresionCreate, SupresionResponse
+from app.services.supresiones_service import lista_supresion, registrar_supresion
+
+router = APIRouter()
+
+ORDEN_SUPRESIONES = [SortKey(Supresion.id, desc=True)]
+
+
+@router.get("/", response_model=List[SupresionResponse])
+async def list_supresiones(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
+    limit: int = Query(100, ge=1, le=500),
+    canal: Optional[str] = Query(None, description="Filtrar por canal: whatsapp, email"),
+    motivo: Optional[str] = Query(None, description="Filtrar por motivo: baja, rebote, invalido"),
+    activa: bool = Query(True),
+    db: Session = Depends(get_read_db)
+):
+    """Listar la lista de supresión (más recientes primero)"""
+    query = db.query(Supresion).filter(Supresion.activa == activa)
+    
+    if canal:
+        query = query.filter(Supresion.canal == canal)
+    if motivo:
+        query = query.filter(Supresion.motivo == motivo)
+    
+    return paginate(query, ORDEN_SUPRESIONES, cursor, limit, response)
+
+
+@router.post("/", response_model=SupresionResponse, status_code=201)
+async def create_supresion(
+    supresion: SupresionCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    Dejar de enviar a una dirección por un canal (baja, rebote o número
+    inválido). Si ya estaba, se reactiva con el nuevo motivo.
+    """
+    db_supresion = registrar_supresion(
+        db, supresion.canal, supresion.direccion, supresion.motivo, supresion.detalle
+    )
+    if db_supresion is None:
+        raise HTTPException(status_code=400, detail="Dirección inválida")
+    
+    db.commit()
+    # Este proceso la aplica ya; los demás en su próximo refresco
+    lista_supresion.refrescar(db)
+    return db_supresion
+
+
+@router.delete("/{supresion_id}", status_code=204)
+async def delete_supresion(
+    supresion_id: int,
+    db: Session = Depends(get_db)
+):
+    """Volver a enviar a la dirección (la fila queda inactiva, no se borra)"""
+    supresion = db.query(Supresion).filter(Supresion.id == supresion_id).first()
+    if not supresion:
+        raise HTTPException(status_code=404, detail="Supresión no encontrada")
+    
+    supresion.activa = False
+    db.commit()
+    lista_supresion.refrescar(db)
+    return None
@@ -1,22 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date
 from uuid import UUID
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.tarea import Tarea, TareaLog
+from app.pagination import SortKey, paginate
+from app.services.estadisticas_service import (
+    cache_estadisticas,
+    calcular_agenda,
+    calcular_dashboard_tareas
+)
+from app.services.sync_service import obtener_cambios
+from app.services.busqueda_service import buscar_texto
+from app.services.tareas_service import actualizar_lote
+from app.services.historial_service import (
+    registrar_creacion,
+    registrar_cambio,
+    reconstruir_version,
+    estado_en,
+    serializar_tarea,
+    tareas_cambiadas
+)
 from app.schemas.tarea import (
     TareaCreate,
     TareaUpdate,
     TareaResponse,
     TareaConUrgencia,
     TareaLogResponse,
+    TareaVersionResponse,
+    TareaCambiosResponse,
+    TareaCambios,
+    TareaBusqueda,
+    AgendaResponse,
+    TareaLoteUpdate,
+    TareaLoteResponse,
     CambioEstadoTarea
 )
+from app.schemas.etiqueta import EtiquetaFaceta
 
 router = APIRouter()
 
+# Orden estable para paginar por cursor (índice idx_tareas_orden)
+ORDEN_TAREAS = [
+    SortKey(Tarea.fecha_termino, nulls_last=True),
+    SortKey(Tarea.prioridad, desc=True),
+    SortKey(Tarea.id)
+]
+ORDEN_HISTORIAL = [SortKey(TareaLog.fecha_cambio, desc=True), SortKey(TareaLog.id, desc=True)]
+
+# Rango máximo de /agenda (una vista de mes con semanas completas entra holgada)
+MAX_DIAS_AGENDA = 92
+
 
 def calcular_urgencia(tarea: Tarea) -> dict:
     """Calcula días restantes y nivel de urgencia de una tarea"""
@@ -52,76 +89,78 @@ async def create_tarea(
     """Crear una nueva tarea"""
     db_tarea = Tarea(**tarea.model_dump())
     db.add(db_tarea)
-    db.commit()
-    db.refresh(db_tarea)
+    db.flush()
     
-    # Registrar en log
-    log = TareaLog(
-        tarea_id=db_tarea.id,
-        accion="creada",
-        datos_nuevos=tarea.model_dump(mode='json'),
-        usuario="sistema"
-    )
-    db.add(log)
+    # Registrar en log (misma transacción)
+    registrar_creacion(db, db_tarea)
     db.commit()
+    db.refresh(db_tarea)
+    cache_estadisticas.invalidate("tareas")
     
     return db_tarea
 
 
+def _filtrar_tareas(
+    query,
+    estado: Optional[str],
+    prioridad: Optional[str],
+    etiquetas: List[str],
+    etiquetas_modo: str
+):
+    """Aplica los filtros comunes de listados y facetas"""
+    if estado:
+        query = query.filter(Tarea.estado == estado)
+    
+    if prioridad:
+        query = query.filter(Tarea.prioridad == prioridad)
+    
+    # && / @>, ambos servidos por el índice GIN de etiquetas
+    if etiquetas:
+        if etiquetas_modo == "alguna":
+            query = query.filter(Tarea.etiquetas.overlap(etiquetas))
+        else:
+            query = query.filter(Tarea.etiquetas.contains(etiquetas))
+    
+    return query
+
+
 @router.get("/", response_model=List[TareaResponse])
 async def list_tareas(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
     limit: int = Query(100, ge=1, le=500),
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
     prioridad: Optional[str] = Query(None, description="Filtrar por prioridad"),
     etiqueta: Optional[str] = Query(None, description="Filtrar por etiqueta"),
-    db: Session = Depends(get_db)
+    etiquetas: List[str] = Query([], description="Filtrar por varias etiquetas"),
+    etiquetas_modo: str = Query("todas", pattern="^(todas|alguna)$", description="todas: debe tener todas | alguna: al menos una"),
+    db: Session = Depends(get_read_db)
 ):
     """Listar tareas con filtros"""
-    query = db.query(Tarea)
-    
-    if estado:
-        query = query.filter(Tarea.estado == estado)
-    
-    if prioridad:
-        query = query.filter(Tarea.prioridad == prioridad)
-    
     if etiqueta:
-        query = query.filter(Tarea.etiquetas.contains([etiqueta]))
+        etiquetas = [*etiquetas, etiqueta]
     
-    # Ordenar por prioridad y fecha
-    query = query.order_by(
-        Tarea.fecha_termino.asc().nullslast(),
-        Tarea.prioridad.desc()
-    )
+    query = _filtrar_tareas(db.query(Tarea), estado, prioridad, etiquetas, etiquetas_modo)
     
-    tareas = query.offset(skip).limit(limit).all()
-    return tareas
+    # Ordenar por fecha y prioridad
+    return paginate(query, ORDEN_TAREAS, cursor, limit, response)
 
 
 @router.get("/con-urgencia", response_model=List[TareaConUrgencia])
 async def list_tareas_con_urgencia(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
     limit: int = Query(100, ge=1, le=500),
     estado: Optional[str] = Query(None),
     prioridad: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    etiquetas: List[str] = Query([]),
+    etiquetas_modo: str = Query("todas", pattern="^(todas|alguna)$"),
+    db: Session = Depends(get_read_db)
 ):
     """Listar tareas con cálculo de urgencia"""
-    query = db.query(Tarea)
+    query = _filtrar_tareas(db.query(Tarea), estado, prioridad, etiquetas, etiquetas_modo)
     
-    if estado:
-        query = query.filter(Tarea.estado == estado)
-    
-    if prioridad:
-        query = query.filter(Tarea.prioridad == prioridad)
-    
-    query = query.order_by(
-        Tarea.fecha_termino.asc().nullslast(),
-        Tarea.prioridad.desc()
-    )
-    
-    tareas = query.offset(skip).limit(limit).all()
+    tareas = paginate(query, ORDEN_TAREAS, cursor, limit, response)
     
     # Agregar cálculo de urgencia
     result = []
@@ -134,6 +173,138 @@ async def list_tareas_con_urgencia(
     return result
 
 
+@router.get("/changes", response_model=TareaCambios)
+async def get_cambios_tareas(
+    since: Optional[str] = Query(None, description="Cursor devuelto por la llamada anterior (vacío = desde el principio)"),
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_read_db)
+):
+    """Tareas creadas, modificadas o eliminadas desde el cursor (seguir mientras hay_mas)"""
+    return obtener_cambios(db, Tarea, "tareas", since, limit)
+
+
+@router.put("/lote", response_model=TareaLoteResponse)
+async def update_tareas_lote(
+    lote: TareaLoteUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Cambiar estado, prioridad y/o etiquetas de muchas tareas a la vez
+    (un UPDATE, un INSERT de historial y un commit)
+    """
+    if lote.estado is None and lote.prioridad is None and not (lote.etiquetas_agregar or lote.etiquetas_quitar):
+        raise HTTPException(status_code=400, detail="No se indicó ningún cambio")
+    
+    actualizadas = actualizar_lote(
+        db,
+        lote.ids,
+        estado=lote.estado,
+        prioridad=lote.prioridad,
+        etiquetas_agregar=lote.etiquetas_agregar,
+        etiquetas_quitar=lote.etiquetas_quitar,
+        usuario=lote.usuario or "sistema"
+    )
+    # Armar la respuesta antes del commit: después las instancias quedan
+    # expiradas y leerlas costaría una consulta por tarea
+    ids_actualizadas = {tarea.id for tarea in actualizadas}
+    respuesta = TareaLoteResponse(
+        actualizadas=[TareaResponse.model_validate(tarea) for tarea in actualizadas],
+        sin_cambios=[id_ for id_ in lote.ids if id_ not in ids_actualizadas]
+    )
+    
+    db.commit()
+    cache_estadisticas.invalidate("tareas")
+    
+    return respuesta
+
+
+@router.get("/agenda", response_model=AgendaResponse)
+async def get_agenda(
+    desde: date = Query(..., description="Primer día (inclusive)"),
+    hasta: date = Query(..., description="Último día (inclusive)"),
+    incluir_tareas: bool = Query(True, description="false: solo las cantidades por día"),
+    estado: Optional[str] = Query(None),
+    prioridad: Optional[str] = Query(None),
+    etiquetas: List[str] = Query([]),
+    etiquetas_modo: str = Query("todas", pattern="^(todas|alguna)$"),
+    db: Session = Depends(get_read_db)
+):
+    """Agenda: tareas por fecha de término y cantidades por día, estado y prioridad"""
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="'hasta' debe ser igual o posterior a 'desde'")
+    if (hasta - desde).days > MAX_DIAS_AGENDA:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {MAX_DIAS_AGENDA} días")
+    
+    query = _filtrar_tareas(db.query(Tarea), estado, prioridad, etiquetas, etiquetas_modo)
+    return calcular_agenda(db, query, desde, hasta, incluir_tareas)
+
+
+@router.get("/buscar", response_model=List[TareaBusqueda])
+async def buscar_tareas(
+    q: str = Query(..., min_length=1, description="Texto a buscar (admite \"frase exacta\", or, -excluir)"),
+    limit: int = Query(20, ge=1, le=100),
+    estado: Optional[str] = Query(None),
+    prioridad: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """Búsqueda de texto completo en título y descripción, ordenada por relevancia"""
+    filtros = []
+    if estado:
+        filtros.append(Tarea.estado == estado)
+    if prioridad:
+        filtros.append(Tarea.prioridad == prioridad)
+    
+    filas = buscar_texto(db, Tarea, [Tarea.titulo, Tarea.descripcion], q, filtros, limit)
+    
+    result = []
+    for tarea, rank, titulo_resaltado, descripcion_resaltada in filas:
+        tarea_dict = TareaResponse.model_validate(tarea).model_dump()
+        tarea_dict.update(
+            rank=rank,
+            titulo_resaltado=titulo_resaltado,
+            descripcion_resaltada=descripcion_resaltada
+        )
+        result.append(TareaBusqueda(**tarea_dict))
+    
+    return result
+
+
+@router.get("/etiquetas/facetas", response_model=List[EtiquetaFaceta])
+async def get_facetas_etiquetas(
+    estado: Optional[str] = Query(None),
+    prioridad: Optional[str] = Query(None),
+    etiquetas: List[str] = Query([]),
+    etiquetas_modo: str = Query("todas", pattern="^(todas|alguna)$"),
+    db: Session = Depends(get_read_db)
+):
+    """Cantidad de tareas por etiqueta para los filtros actuales (una sola consulta)"""
+    etiquetas_filtradas = _filtrar_tareas(
+        db.query(func.unnest(Tarea.etiquetas).label("etiqueta")),
+        estado, prioridad, etiquetas, etiquetas_modo
+    ).subquery()
+    
+    cantidad = func.count().label("cantidad")
+    facetas = db.query(etiquetas_filtradas.c.etiqueta, cantidad).group_by(
+        etiquetas_filtradas.c.etiqueta
+    ).order_by(cantidad.desc(), etiquetas_filtradas.c.etiqueta).all()
+    
+    return [{"etiqueta": f.etiqueta, "cantidad": f.cantidad} for f in facetas]
+
+
+@router.get("/historial/cambios", response_model=List[TareaCambiosResponse])
+async def get_tareas_cambiadas(
+    desde: datetime = Query(..., description="Inicio del rango (inclusive)"),
+    hasta: datetime = Query(..., description="Fin del rango (exclusivo)"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """Tareas modificadas entre dos fechas, las de cambio más reciente primero"""
+    if hasta <= desde:
+        raise HTTPException(status_code=400, detail="'hasta' debe ser posterior a 'desde'")
+    
+    return tareas_cambiadas(db, desde, hasta, limit)
+
+
 @router.get("/{tarea_id}", response_model=TareaResponse)
 async def get_tarea(
     tarea_id: UUID,
@@ -158,27 +329,18 @@ async def update_tarea(
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     
     # Guardar datos anteriores para log
-    datos_anteriores = TareaResponse.model_validate(tarea).model_dump(mode='json')
+    anterior = serializar_tarea(tarea)
     
     # Actualizar campos
     update_data = tarea_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(tarea, field, value)
     
+    # Registrar en log solo los campos modificados (misma transacción)
+    registrar_cambio(db, tarea, "actualizada", anterior)
     db.commit()
     db.refresh(tarea)
-    
-    # Registrar en log
-    datos_nuevos = TareaResponse.model_validate(tarea).model_dump(mode='json')
-    log = TareaLog(
-        tarea_id=tarea.id,
-        accion="actualizada",
-        datos_anteriores=datos_anteriores,
-        datos_nuevos=datos_nuevos,
-        usuario="sistema"
-    )
-    db.add(log)
-    db.commit()
+    cache_estadisticas.invalidate("tareas")
     
     return tarea
 
@@ -195,6 +357,7 @@ async def delete_tarea(
     
     db.delete(tarea)
     db.commit()
+    cache_estadisticas.invalidate("tareas")
     return None
 
 
@@ -213,26 +376,18 @@ async def change_estado(
     if not tarea:
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     
-    estado_anterior = tarea.estado
+    anterior = serializar_tarea(tarea)
     tarea.estado = cambio.nuevo_estado
     
     # Si se completa, registrar fecha
     if cambio.nuevo_estado == "completada" and not tarea.fecha_completacion:
         tarea.fecha_completacion = datetime.now()
     
+    # Registrar en log (misma transacción)
+    registrar_cambio(db, tarea, "estado_cambio", anterior, usuario=cambio.usuario or "sistema")
     db.commit()
     db.refresh(tarea)
-    
-    # Registrar en log
-    log = TareaLog(
-        tarea_id=tarea.id,
-        accion="estado_cambio",
-        datos_anteriores={"estado": estado_anterior},
-        datos_nuevos={"estado": cambio.nuevo_estado},
-        usuario=cambio.usuario or "sistema"
-    )
-    db.add(log)
-    db.commit()
+    cache_estadisticas.invalidate("tareas")
     
     return tarea
 
@@ -240,18 +395,47 @@ async def change_estado(
 @router.get("/{tarea_id}/historial", response_model=List[TareaLogResponse])
 async def get_historial(
     tarea_id: UUID,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor)"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener historial de cambios de una tarea"""
+    """Obtener historial de cambios de una tarea (más recientes primero, paginado)"""
     tarea = db.query(Tarea).filter(Tarea.id == tarea_id).first()
     if not tarea:
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     
-    logs = db.query(TareaLog).filter(
-        TareaLog.tarea_id == tarea_id
-    ).order_by(TareaLog.fecha_cambio.desc()).all()
+    query = db.query(TareaLog).filter(TareaLog.tarea_id == tarea_id)
+    
+    return paginate(query, ORDEN_HISTORIAL, cursor, limit, response)
+
+
+@router.get("/{tarea_id}/historial/en", response_model=TareaVersionResponse)
+async def get_estado_en(
+    tarea_id: UUID,
+    momento: datetime = Query(..., description="Fecha y hora a consultar"),
+    db: Session = Depends(get_read_db)
+):
+    """Reconstruir la tarea tal como estaba en un momento dado (snapshot + diffs)"""
+    datos = estado_en(db, tarea_id, momento)
+    if datos is None:
+        raise HTTPException(status_code=404, detail="La tarea no tiene historial en esa fecha")
+    
+    return TareaVersionResponse(tarea_id=tarea_id, momento=momento, datos=datos)
+
+
+@router.get("/{tarea_id}/historial/{log_id}/version", response_model=TareaVersionResponse)
+async def get_version(
+    tarea_id: UUID,
+    log_id: UUID,
+    db: Session = Depends(get_read_db)
+):
+    """Reconstruir la tarea tal como quedó después de una entrada del historial"""
+    datos = reconstruir_version(db, tarea_id, log_id)
+    if datos is None:
+        raise HTTPException(status_code=404, detail="Entrada de historial no encontrada")
     
-    return logs
+    return TareaVersionResponse(tarea_id=tarea_id, log_id=log_id, datos=datos)
 
 
 # ============================================
@@ -260,49 +444,12 @@ async def get_historial(
 
 @router.get("/stats/dashboard")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Obtener estadísticas para dashboard"""
+    """Obtener estadísticas para dashboard (una consulta, cacheada STATS_CACHE_TTL segundos)"""
     hoy = date.today()
-    
-    # Tareas pendientes
-    pendientes = db.query(Tarea).filter(
-        Tarea.estado == "pendiente"
-    ).count()
-    
-    # Tareas completadas hoy
-    completadas_hoy = db.query(Tarea).filter(
-        Tarea.fecha_completacion >= datetime.combine(hoy, datetime.min.time())
-    ).count()
-    
-    # Tareas próximas a vencer (< 3 días)
-    from datetime import timedelta
-    proximas_vencer = db.query(Tarea).filter(
-        Tarea.estado.in_(["pendiente", "en_progreso"]),
-        Tarea.fecha_termino.isnot(None),
-        Tarea.fecha_termino <= hoy + timedelta(days=3)
-    ).count()
-    
-    # Tareas vencidas
-    vencidas = db.query(Tarea).filter(
-        Tarea.estado.in_(["pendiente", "en_progreso"]),
-        Tarea.fecha_termino.isnot(None),
-        Tarea.fecha_termino < hoy
-    ).count()
-    
-    # Por prioridad
-    por_prioridad = {}
-    for prioridad in ["baja", "media", "alta", "urgente"]:
-        count = db.query(Tarea).filter(
-            Tarea.prioridad == prioridad,
-            Tarea.estado.in_(["pendiente", "en_progreso"])
-        ).count()
-        por_prioridad[prioridad] = count
-    
-    return {
-        "pendientes": pendientes,
-        "completadas_hoy": completadas_hoy,
-        "proximas_vencer": proximas_vencer,
-        "vencidas": vencidas,
-        "por_prioridad": por_prioridad
-    }
+    return cache_estadisticas.get_or_compute_db(
+        ("tareas", "dashboard", hoy),
+        db,
+        lambda sesion: calcular_dashboard_tareas(sesion, hoy)
+    )
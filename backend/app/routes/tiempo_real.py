@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Query, WebSocket
+from typing import Optional
+import asyncio
+
+from app.realtime import distribuidor_cambios
+
+router = APIRouter()
+
+
+@router.websocket("/cambios")
+async def ws_cambios(
+    websocket: WebSocket,
+    recursos: Optional[str] = Query(None, description="Recursos separados por coma: tareas,comunicados,entregas")
+):
+    """
+    Eventos de cambios en tiempo real. Cada mensaje es
+    {"eventos": [{"recurso", "accion", "id", ...}]} o {"resync": true}
+    si el cliente quedó atrasado y debe recargar.
+    """
+    await websocket.accept()
+    filtro = {r.strip() for r in recursos.split(",") if r.strip()} if recursos else None
+    suscripcion = distribuidor_cambios.suscribir(filtro)
+    
+    async def enviar():
+        while True:
+            await websocket.send_json(await suscripcion.cola.get())
+    
+    envio = asyncio.create_task(enviar())
+    try:
+        # El cliente no manda nada; esperar acá detecta la desconexión
+        while True:
+            mensaje = await websocket.receive()
+            if mensaje["type"] == "websocket.disconnect":
+                break
+    finally:
+        envio.cancel()
+        distribuidor_cambios.desuscribir(suscripcion)
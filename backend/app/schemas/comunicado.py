@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date, time
 from uuid import UUID
 
@@ -15,6 +15,7 @@ class ComunicadoBase(BaseModel):
     fecha_programada: Optional[date] = None
     hora_programada: Optional[time] = None
     creado_por: Optional[str] = None
+    perfilar: bool = False
     
     @field_validator('tipo')
     @classmethod
@@ -35,6 +36,7 @@ class ComunicadoUpdate(BaseModel):
     contenido: Optional[str] = None
     fecha_programada: Optional[date] = None
     hora_programada: Optional[time] = None
+    perfilar: Optional[bool] = None
 
 
 class ComunicadoResponse(ComunicadoBase):
@@ -43,6 +45,40 @@ class ComunicadoResponse(ComunicadoBase):
     fecha_envio_real: Optional[datetime] = None
     variables_disponibles: List[str] = []
     creado_en: datetime
+    fecha_actualizacion: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class ComunicadoBusqueda(ComunicadoResponse):
+    """Resultado de búsqueda de texto completo"""
+    rank: float
+    titulo_resaltado: str  # HTML escapado, fragmentos con <mark>...</mark>
+    contenido_resaltado: str
+
+
+class ComunicadoCambios(BaseModel):
+    """Respuesta de /comunicados/changes"""
+    cambios: List[ComunicadoResponse]
+    eliminados: List[UUID]
+    cursor: str
+    hay_mas: bool
+
+
+# ============================================
+# ADJUNTO SCHEMAS
+# ============================================
+
+class ComunicadoAdjuntoResponse(BaseModel):
+    id: UUID
+    comunicado_id: UUID
+    nombre_archivo: str
+    ruta_archivo: str
+    fecha_agregado: datetime
+    archivo_hash: Optional[str] = None
+    tamano: Optional[int] = None
+    tipo_mime: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -81,8 +117,12 @@ class VistaPreviaResponse(BaseModel):
     comunicado_id: UUID
     titulo: str
     tipo: str
-    total_destinatarios: int
+    total_destinatarios: int  # contactos activos sin duplicados
     previews: List[VistaPreviaItem]
+    total_por_canal: Dict[str, int] = {}  # contactos alcanzables por cada canal del comunicado
+    sin_email: int = 0
+    sin_whatsapp: int = 0
+    variables_faltantes: Dict[str, int] = {}  # {{variable}} -> contactos sin ese dato
 
 
 # ============================================
@@ -117,11 +157,21 @@ class ComunicadoLogResponse(BaseModel):
 # ESTADÍSTICAS
 # ============================================
 
+class EstadisticasCanal(BaseModel):
+    total: int
+    enviados: int
+    errores: int
+    pendientes: int
+    reintentos: int
+
+
 class EstadisticasEnvio(BaseModel):
     comunicado_id: UUID
     titulo: str
-    total_destinatarios: int
+    total_destinatarios: int  # entregas previstas (contacto x canal) una vez iniciado el envío
     enviados: int
     errores: int
     pendientes: int
+    reintentos: int = 0
     porcentaje_exito: float
+    por_canal: Dict[str, EstadisticasCanal] = {}
@@ -9,6 +9,19 @@ import re
 # CONTACTO SCHEMAS
 # ============================================
 
+def normalizar_whatsapp(v: Optional[str]) -> Optional[str]:
+    """
+    Lleva el número a E.164 (igual que normalizar_telefono en la BD):
+    acepta espacios, guiones, puntos y paréntesis, y 00 en lugar de +
+    """
+    if v is None or v.strip() == "":
+        return v
+    v = re.sub(r'[\s\-.()]', '', v)
+    if v.startswith('00'):
+        v = '+' + v[2:]
+    return v
+
+
 class ContactoBase(BaseModel):
     nombre: str
     whatsapp: Optional[str] = None
@@ -20,6 +33,7 @@ class ContactoBase(BaseModel):
     @field_validator('whatsapp')
     @classmethod
     def validate_whatsapp(cls, v):
+        v = normalizar_whatsapp(v)
         if v is not None and v != "":
             # Formato: +5491112345678
             if not re.match(r'^\+[0-9]{10,15}$', v):
@@ -49,6 +63,7 @@ class ContactoUpdate(BaseModel):
     @field_validator('whatsapp')
     @classmethod
     def validate_whatsapp(cls, v):
+        v = normalizar_whatsapp(v)
         if v is not None and v != "":
             if not re.match(r'^\+[0-9]{10,15}$', v):
                 raise ValueError('WhatsApp debe tener formato: +código_país + número')
@@ -58,11 +73,32 @@ class ContactoUpdate(BaseModel):
 class ContactoResponse(ContactoBase):
     id: UUID
     fecha_agregado: datetime
+    fecha_actualizacion: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
 
+class ContactoDuplicados(BaseModel):
+    """Contactos que comparten email o WhatsApp normalizado"""
+    clave: str  # email, whatsapp
+    valor: str
+    contacto_ids: List[UUID]  # el primero es el que queda al fusionar
+
+
+class FusionContactosResponse(BaseModel):
+    fusionados_por_email: int
+    fusionados_por_whatsapp: int
+
+
+class ContactoCambios(BaseModel):
+    """Respuesta de /contactos/changes"""
+    cambios: List[ContactoResponse]
+    eliminados: List[UUID]
+    cursor: str
+    hay_mas: bool
+
+
 # ============================================
 # GRUPO SCHEMAS
 # ============================================
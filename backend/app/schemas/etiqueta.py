@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class EtiquetaFaceta(BaseModel):
+    """Una etiqueta y cuántos registros del listado filtrado la tienen"""
+    etiqueta: str
+    cantidad: int
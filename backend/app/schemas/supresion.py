@@ -0,0 +1,38 @@
+from pydantic import BaseModel, field_validator
+from typing import Optional
+from datetime import datetime
+
+
+class SupresionCreate(BaseModel):
+    canal: str  # whatsapp, email
+    direccion: str  # número o email; se normaliza al guardar
+    motivo: str = "baja"  # baja, rebote, invalido
+    detalle: Optional[str] = None
+    
+    @field_validator('canal')
+    @classmethod
+    def validate_canal(cls, v):
+        if v not in ['whatsapp', 'email']:
+            raise ValueError('Canal debe ser: whatsapp o email')
+        return v
+    
+    @field_validator('motivo')
+    @classmethod
+    def validate_motivo(cls, v):
+        if v not in ['baja', 'rebote', 'invalido']:
+            raise ValueError('Motivo debe ser: baja, rebote o invalido')
+        return v
+
+
+class SupresionResponse(BaseModel):
+    id: int
+    canal: str
+    direccion: str
+    motivo: str
+    detalle: Optional[str] = None
+    activa: bool
+    fecha_creacion: datetime
+    fecha_actualizacion: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
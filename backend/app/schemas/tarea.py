@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date, time
 from uuid import UUID
 
@@ -60,6 +60,28 @@ class TareaResponse(TareaBase):
         from_attributes = True
 
 
+class TareaBusqueda(TareaResponse):
+    """Resultado de búsqueda de texto completo"""
+    rank: float
+    titulo_resaltado: str  # HTML escapado, fragmentos con <mark>...</mark>
+    descripcion_resaltada: str
+
+
+class AgendaDia(BaseModel):
+    fecha: date
+    total: int
+    por_estado: Dict[str, int]
+    por_prioridad: Dict[str, int]
+
+
+class AgendaResponse(BaseModel):
+    """Tareas que vencen en un rango de fechas con cantidades por día"""
+    desde: date
+    hasta: date
+    dias: List[AgendaDia]
+    tareas: List[TareaResponse]
+
+
 class TareaConUrgencia(TareaResponse):
     """Tarea con cálculo de días restantes y urgencia"""
     dias_restantes: Optional[int] = None
@@ -81,6 +103,9 @@ class TareaAdjuntoResponse(BaseModel):
     nombre_archivo: str
     ruta_archivo: str
     fecha_agregado: datetime
+    archivo_hash: Optional[str] = None
+    tamano: Optional[int] = None
+    tipo_mime: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -103,6 +128,71 @@ class TareaLogResponse(BaseModel):
         from_attributes = True
 
 
+class TareaVersionResponse(BaseModel):
+    """Tarea reconstruida a partir del historial"""
+    tarea_id: UUID
+    log_id: Optional[UUID] = None
+    momento: Optional[datetime] = None
+    datos: dict
+
+
+class TareaCambiosResponse(BaseModel):
+    """Resumen de cambios de una tarea en un rango de fechas"""
+    tarea_id: UUID
+    titulo: str
+    cambios: int
+    primer_cambio: datetime
+    ultimo_cambio: datetime
+    acciones: List[str]
+
+
+class TareaCambios(BaseModel):
+    """Respuesta de /tareas/changes"""
+    cambios: List[TareaResponse]
+    eliminados: List[UUID]
+    cursor: str
+    hay_mas: bool
+
+
+# ============================================
+# EDICIÓN POR LOTES
+# ============================================
+
+class TareaLoteUpdate(BaseModel):
+    ids: List[UUID]
+    estado: Optional[str] = None
+    prioridad: Optional[str] = None
+    etiquetas_agregar: List[str] = []
+    etiquetas_quitar: List[str] = []
+    usuario: Optional[str] = None
+    
+    @field_validator('ids')
+    @classmethod
+    def validate_ids(cls, v):
+        if not 1 <= len(v) <= 1000:
+            raise ValueError('Se pueden editar entre 1 y 1000 tareas por lote')
+        return list(dict.fromkeys(v))
+    
+    @field_validator('prioridad')
+    @classmethod
+    def validate_prioridad(cls, v):
+        if v is not None and v not in ['baja', 'media', 'alta', 'urgente']:
+            raise ValueError('Prioridad debe ser: baja, media, alta o urgente')
+        return v
+    
+    @field_validator('estado')
+    @classmethod
+    def validate_estado(cls, v):
+        if v is not None and v not in ['pendiente', 'en_progreso', 'completada', 'cancelada']:
+            raise ValueError('Estado debe ser: pendiente, en_progreso, completada o cancelada')
+        return v
+
+
+class TareaLoteResponse(BaseModel):
+    actualizadas: List[TareaResponse]
+    sin_cambios: List[UUID]  # no existen o ya tenían esos valores
+
+
 # ============================================
 # CAMBIO DE ESTADO
 # ============================================
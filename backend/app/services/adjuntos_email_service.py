@@ -0,0 +1,69 @@
+"""
+Partes MIME de los adjuntos de un comunicado, codificadas una sola vez.
+
+Cada adjunto se lee y se pasa a base64 una vez; la parte resultante se
+agrega tal cual a cada email personalizado (el generador de email escribe
+el payload ya codificado sin volver a procesarlo). Las partes quedan en un
+LRU acotado por bytes (EMAIL_ADJUNTOS_CACHE_MB) con clave en el hash del
+contenido, así reenvíos y comunicados que comparten archivos tampoco
+vuelven a codificar.
+"""
+from email import encoders
+from email.message import Message
+from email.mime.base import MIMEBase
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.archivo import Archivo
+from app.models.comunicado import ComunicadoAdjunto
+from app.services.archivos_service import ruta_absoluta
+from app.services.cache import LRUCache
+
+
+def _peso(parte: Message) -> int:
+    return len(parte.get_payload())
+
+
+cache_partes = LRUCache(capacidad=settings.EMAIL_ADJUNTOS_CACHE_MB * 1024 * 1024, peso=_peso)
+
+
+def _codificar(ruta: str, nombre: str, tipo_mime: Optional[str]) -> Message:
+    principal, _, secundario = (tipo_mime or "application/octet-stream").partition("/")
+    parte = MIMEBase(principal, secundario or "octet-stream")
+    with open(ruta_absoluta(ruta), "rb") as archivo:
+        parte.set_payload(archivo.read())
+    encoders.encode_base64(parte)
+    parte.add_header("Content-Disposition", "attachment", filename=nombre)
+    return parte
+
+
+def partes_adjuntos(db: Session, comunicado_id: UUID) -> List[Message]:
+    """
+    Partes MIME listas para adjuntar a cada email del comunicado.
+    Las partes son compartidas: no modificarlas.
+    """
+    filas = db.query(
+        ComunicadoAdjunto.nombre_archivo,
+        ComunicadoAdjunto.ruta_archivo,
+        ComunicadoAdjunto.archivo_hash,
+        Archivo.tipo_mime
+    ).outerjoin(
+        Archivo, Archivo.hash == ComunicadoAdjunto.archivo_hash
+    ).filter(
+        ComunicadoAdjunto.comunicado_id == comunicado_id
+    ).order_by(ComunicadoAdjunto.fecha_agregado, ComunicadoAdjunto.id).all()
+
+    partes = []
+    for nombre, ruta, hash_hex, tipo_mime in filas:
+        if hash_hex is None:
+            # Adjunto sin contenido registrado: sin clave estable, no se cachea
+            partes.append(_codificar(ruta, nombre, tipo_mime))
+            continue
+        partes.append(cache_partes.get_or_compute(
+            (hash_hex, nombre, tipo_mime),
+            lambda ruta=ruta, nombre=nombre, tipo_mime=tipo_mime: _codificar(ruta, nombre, tipo_mime)
+        ))
+    return partes
@@ -0,0 +1,132 @@
+"""
+Almacenamiento de adjuntos por contenido.
+
+Cada archivo se guarda en UPLOAD_DIR/objetos/ab/cd/<sha256> y en la tabla
+archivos, una sola vez aunque lo suban muchas tareas o comunicados. Los
+triggers sobre tarea_adjuntos / comunicado_adjuntos mantienen
+archivos.referencias; purgar_archivos_huerfanos borra los que llegan a 0.
+"""
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.archivo import Archivo
+from app.config import settings
+
+
+def ruta_relativa(hash_hex: str) -> str:
+    return os.path.join("objetos", hash_hex[:2], hash_hex[2:4], hash_hex)
+
+
+def ruta_absoluta(ruta: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, ruta)
+
+
+async def recibir_stream(chunks: AsyncIterator[bytes]) -> Tuple[str, int, str]:
+    """
+    Escribe el cuerpo recibido a un archivo temporal a medida que llega,
+    calculando el SHA-256 en el mismo recorrido. Nunca tiene más de un
+    chunk en memoria. La escritura corre en un hilo (anyio) para no
+    bloquear el event loop. Devuelve (hash, tamaño, ruta temporal).
+    """
+    maximo = settings.MAX_UPLOAD_MB * 1024 * 1024
+    directorio_tmp = os.path.join(settings.UPLOAD_DIR, "tmp")
+    os.makedirs(directorio_tmp, exist_ok=True)
+
+    # En el mismo filesystem que los objetos, para moverlo con un rename
+    fd, ruta_tmp = tempfile.mkstemp(dir=directorio_tmp)
+    sha256 = hashlib.sha256()
+    tamano = 0
+    try:
+        async with anyio.wrap_file(os.fdopen(fd, "wb")) as destino:
+            async for chunk in chunks:
+                tamano += len(chunk)
+                if tamano > maximo:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"El archivo supera el máximo de {settings.MAX_UPLOAD_MB} MB"
+                    )
+                sha256.update(chunk)
+                await destino.write(chunk)
+    except BaseException:
+        os.unlink(ruta_tmp)
+        raise
+
+    if tamano == 0:
+        os.unlink(ruta_tmp)
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+
+    return sha256.hexdigest(), tamano, ruta_tmp
+
+
+def registrar_archivo(
+    db: Session,
+    hash_hex: str,
+    tamano: int,
+    tipo_mime: Optional[str]
+) -> str:
+    """
+    Da de alta el contenido (si no existía). Devuelve la ruta relativa. No
+    hace commit: el adjunto que lo referencia se inserta en la misma
+    transacción, y el archivo se mueve con guardar_objeto después del
+    commit.
+
+    El upsert bloquea la fila de archivos hasta el commit, así la purga de
+    huérfanos no puede borrarla mientras tanto; después, el adjunto ya la
+    referencia.
+    """
+    db.execute(
+        insert(Archivo).values(
+            hash=hash_hex, tamano=tamano, tipo_mime=tipo_mime, referencias=0
+        ).on_conflict_do_update(
+            index_elements=[Archivo.hash],
+            set_={"tamano": tamano}
+        )
+    )
+    return ruta_relativa(hash_hex)
+
+
+def _mover_objeto(hash_hex: str, ruta_tmp: str) -> None:
+    destino = ruta_absoluta(ruta_relativa(hash_hex))
+    if os.path.exists(destino):
+        # Contenido repetido: ya está guardado
+        os.unlink(ruta_tmp)
+    else:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(ruta_tmp, destino)
+
+
+async def guardar_objeto(hash_hex: str, ruta_tmp: str) -> None:
+    """
+    Deja el archivo temporal en su ruta definitiva. Se llama después del
+    commit que registró el archivo: si la transacción falla no queda en
+    disco un objeto sin fila que la purga nunca vería.
+    """
+    await anyio.to_thread.run_sync(_mover_objeto, hash_hex, ruta_tmp)
+
+
+def purgar_archivos_huerfanos(db: Session) -> int:
+    """
+    Borra de la tabla y del disco los archivos sin referencias. Los archivos
+    se eliminan antes del commit, con las filas todavía bloqueadas por el
+    DELETE, para no competir con una subida del mismo contenido.
+    """
+    hashes: List[str] = db.execute(
+        delete(Archivo).where(Archivo.referencias <= 0).returning(Archivo.hash)
+    ).scalars().all()
+
+    for hash_hex in hashes:
+        try:
+            os.unlink(ruta_absoluta(ruta_relativa(hash_hex)))
+        except FileNotFoundError:
+            pass
+
+    db.commit()
+    return len(hashes)
@@ -0,0 +1,216 @@
+from typing import Any, Dict, Iterable, List, Tuple
+from uuid import UUID
+import uuid
+from sqlalchemy import and_, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.contacto import Contacto, Grupo, GrupoMiembro
+from app.models.comunicado import ComunicadoDestinatario
+
+
+# Columna del contacto que necesita cada canal / variable del template
+COLUMNA_POR_CANAL = {
+    "whatsapp": Contacto.whatsapp,
+    "email": Contacto.email,
+}
+COLUMNA_POR_VARIABLE = {
+    "nombre": Contacto.nombre,
+    "email": Contacto.email,
+    "whatsapp": Contacto.whatsapp,
+}
+
+
+def canales_de(tipo: str) -> List[str]:
+    """Canales por los que sale un comunicado según su tipo"""
+    if tipo == "ambos":
+        return ["whatsapp", "email"]
+    return [tipo]
+
+
+def _tiene_dato(columna):
+    return and_(columna.isnot(None), columna != "")
+
+
+def destinatarios_inexistentes(
+    db: Session,
+    contacto_ids: List[UUID],
+    grupo_ids: List[UUID]
+) -> Tuple[List[UUID], List[UUID]]:
+    """
+    (contactos, grupos) de las listas que no existen, resuelto en una sola
+    consulta para cualquier cantidad de IDs.
+    """
+    if not contacto_ids and not grupo_ids:
+        return [], []
+
+    existentes = db.execute(union_all(
+        select(literal("contacto").label("tipo"), Contacto.id).where(Contacto.id.in_(contacto_ids)),
+        select(literal("grupo").label("tipo"), Grupo.id).where(Grupo.id.in_(grupo_ids))
+    )).all()
+
+    contactos = {id_ for tipo, id_ in existentes if tipo == "contacto"}
+    grupos = {id_ for tipo, id_ in existentes if tipo == "grupo"}
+    return (
+        [id_ for id_ in contacto_ids if id_ not in contactos],
+        [id_ for id_ in grupo_ids if id_ not in grupos]
+    )
+
+
+def insertar_destinatarios(
+    db: Session,
+    comunicado_id: UUID,
+    contacto_ids: List[UUID],
+    grupo_ids: List[UUID]
+) -> None:
+    """
+    Inserta todos los destinatarios con un INSERT multi-fila (executemany)
+    en la transacción en curso. No hace commit.
+    """
+    filas = [{"comunicado_id": comunicado_id, "contacto_id": id_} for id_ in contacto_ids]
+    filas += [{"comunicado_id": comunicado_id, "grupo_id": id_} for id_ in grupo_ids]
+    if filas:
+        db.execute(insert(ComunicadoDestinatario), filas)
+
+
+def origenes_subquery(comunicado_id: UUID):
+    """
+    (contacto_id, origen) por cada contacto alcanzado por el comunicado.
+    origen es el destinatario que lo incluye (contacto directo o grupo), así
+    que un contacto que está en dos grupos aparece dos veces.
+    """
+    directos = select(
+        ComunicadoDestinatario.contacto_id.label("contacto_id"),
+        ComunicadoDestinatario.id.label("origen")
+    ).where(
+        ComunicadoDestinatario.comunicado_id == comunicado_id,
+        ComunicadoDestinatario.contacto_id.isnot(None)
+    )
+
+    por_grupo = select(
+        GrupoMiembro.contacto_id.label("contacto_id"),
+        ComunicadoDestinatario.id.label("origen")
+    ).join(
+        GrupoMiembro, GrupoMiembro.grupo_id == ComunicadoDestinatario.grupo_id
+    ).where(
+        ComunicadoDestinatario.comunicado_id == comunicado_id
+    )
+
+    return union_all(directos, por_grupo).subquery("origenes")
+
+
+def filtro_audiencia(comunicado_id: UUID):
+    """Condición sobre Contacto: activo y alcanzado por el comunicado (sin duplicados)"""
+    origenes = origenes_subquery(comunicado_id)
+    return and_(
+        Contacto.estado == "activo",
+        Contacto.id.in_(select(origenes.c.contacto_id))
+    )
+
+
+def entregas_audiencia(db: Session, comunicado_id: UUID) -> List[Tuple[ComunicadoDestinatario, Contacto]]:
+    """
+    (destinatario, contacto) por cada contacto de la audiencia, la misma
+    que cuenta contar_audiencia: activo y una sola vez aunque lo incluyan
+    varios destinatarios (se prefiere el contacto directo, si no el primer
+    grupo). Una sola consulta.
+    """
+    origenes = origenes_subquery(comunicado_id)
+    return db.query(ComunicadoDestinatario, Contacto).select_from(origenes).join(
+        Contacto, Contacto.id == origenes.c.contacto_id
+    ).join(
+        ComunicadoDestinatario, ComunicadoDestinatario.id == origenes.c.origen
+    ).filter(
+        Contacto.estado == "activo"
+    ).distinct(Contacto.id).order_by(
+        Contacto.id,
+        ComunicadoDestinatario.contacto_id.is_(None),
+        ComunicadoDestinatario.id
+    ).all()
+
+
+def contar_audiencia(
+    db: Session,
+    comunicado_id: UUID,
+    canales: Iterable[str],
+    variables: Iterable[str]
+) -> Dict[str, Any]:
+    """
+    Tamaño exacto de la audiencia activa y deduplicada, alcanzables por canal
+    y contactos sin dato para cada variable del template, en una sola consulta.
+    """
+    canales = list(canales)
+    variables = sorted(v for v in variables if v in COLUMNA_POR_VARIABLE)
+
+    columnas = [func.count().label("total")]
+    columnas += [
+        func.count().filter(_tiene_dato(COLUMNA_POR_CANAL[canal])).label(f"canal_{canal}")
+        for canal in COLUMNA_POR_CANAL
+    ]
+    columnas += [
+        func.count().filter(~_tiene_dato(COLUMNA_POR_VARIABLE[variable])).label(f"falta_{variable}")
+        for variable in variables
+    ]
+
+    row = db.query(*columnas).select_from(Contacto).filter(filtro_audiencia(comunicado_id)).one()
+
+    return {
+        "total": row.total,
+        "por_canal": {canal: getattr(row, f"canal_{canal}") for canal in canales},
+        "sin_email": row.total - row.canal_email,
+        "sin_whatsapp": row.total - row.canal_whatsapp,
+        "variables_faltantes": {
+            "{{" + variable + "}}": getattr(row, f"falta_{variable}")
+            for variable in variables
+            if getattr(row, f"falta_{variable}")
+        }
+    }
+
+
+def muestra_audiencia(
+    db: Session,
+    comunicado_id: UUID,
+    cantidad: int,
+    estratificada: bool = False
+) -> List[Contacto]:
+    """
+    Contactos al azar de la audiencia. Estratificada toma por turnos uno
+    de cada destinatario (contacto directo o grupo) para que todos aparezcan.
+    """
+    if not estratificada:
+        # Los id son UUID v4 (aleatorios): los `cantidad` siguientes a un
+        # UUID al azar, recorriendo la clave primaria, son una muestra al
+        # azar sin ordenar toda la audiencia. Si no alcanzan, se completa
+        # desde el principio (el segundo tramo solo se lee si hace falta).
+        pivote = uuid.uuid4()
+        tramos = [
+            select(Contacto.id).where(
+                filtro_audiencia(comunicado_id), condicion
+            ).order_by(Contacto.id).limit(cantidad)
+            for condicion in (Contacto.id >= pivote, Contacto.id < pivote)
+        ]
+        elegidos = union_all(*tramos).limit(cantidad).subquery("elegidos")
+        return db.query(Contacto).filter(Contacto.id.in_(select(elegidos.c.id))).all()
+
+    origenes = origenes_subquery(comunicado_id)
+    turnos = select(
+        origenes.c.contacto_id,
+        func.row_number().over(
+            partition_by=origenes.c.origen,
+            order_by=func.random()
+        ).label("turno")
+    ).join(
+        Contacto, Contacto.id == origenes.c.contacto_id
+    ).where(
+        Contacto.estado == "activo"
+    ).subquery("turnos")
+
+    # Un contacto alcanzado por varios destinatarios cuenta una vez, en su
+    # primer turno, antes del LIMIT (si no, la muestra sale más corta)
+    turno = func.min(turnos.c.turno).label("turno")
+    elegidos = select(turnos.c.contacto_id, turno).group_by(
+        turnos.c.contacto_id
+    ).order_by(turno, func.random()).limit(cantidad).subquery("elegidos")
+
+    return db.query(Contacto).join(
+        elegidos, elegidos.c.contacto_id == Contacto.id
+    ).order_by(elegidos.c.turno, Contacto.id).all()
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from email.message import Message
+from typing import Dict, Any, List, Optional
 
 
 class WhatsAppProvider(ABC):
@@ -15,7 +16,9 @@ class WhatsAppProvider(ABC):
             message: Contenido del mensaje
             
         Returns:
-            Dict con status, message_id, y error si aplica
+            Dict con status, message_id, y error si aplica. Si el error es
+            definitivo para esa dirección, supresion indica el motivo
+            ("rebote" o "invalido") para agregarla a la lista de supresión
         """
         pass
 
@@ -24,7 +27,13 @@ class EmailProvider(ABC):
     """Interfaz abstracta para providers de Email"""
     
     @abstractmethod
-    async def send_email(self, to: str, subject: str, body: str) -> Dict[str, Any]:
+    async def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        adjuntos: Optional[List[Message]] = None
+    ) -> Dict[str, Any]:
         """
         Enviar email
         
@@ -32,8 +41,11 @@ class EmailProvider(ABC):
             to: Email del destinatario
             subject: Asunto del email
             body: Cuerpo del email
+            adjuntos: Partes MIME ya codificadas (compartidas, no modificar)
             
         Returns:
-            Dict con status, message_id, y error si aplica
+            Dict con status, message_id, y error si aplica. Si el error es
+            definitivo para esa dirección, supresion indica el motivo
+            ("rebote" o "invalido") para agregarla a la lista de supresión
         """
         pass
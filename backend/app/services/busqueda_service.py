@@ -0,0 +1,71 @@
+from typing import Any, List, Sequence
+from sqlalchemy import cast, func, literal
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session
+
+
+# Configuración de texto completo: español (stemming) + unaccent (ver schema.sql)
+CONFIGURACION = "espanol_sin_acentos"
+
+OPCIONES_RESALTADO = (
+    "StartSel=<mark>, StopSel=</mark>, "
+    "MaxWords=25, MinWords=8, MaxFragments=2, FragmentDelimiter=\" … \""
+)
+
+# El texto se escapa antes de resaltar: el resultado es HTML seguro cuya
+# única marca es <mark> ('&' primero para no escapar dos veces)
+ESCAPES_HTML = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"))
+
+
+def _config():
+    return cast(literal(CONFIGURACION), REGCONFIG)
+
+
+def consulta_texto(q: str):
+    """tsquery a partir de lo que escribe el usuario (comillas, OR, -palabra)"""
+    return func.websearch_to_tsquery(_config(), q)
+
+
+def _escapar_html(texto):
+    for caracter, entidad in ESCAPES_HTML:
+        texto = func.replace(texto, caracter, entidad)
+    return texto
+
+
+def resaltar(columna, tsquery):
+    """Fragmentos con las coincidencias entre <mark>...</mark>, texto escapado"""
+    texto = _escapar_html(func.coalesce(columna, ""))
+    return func.ts_headline(_config(), texto, tsquery, OPCIONES_RESALTADO)
+
+
+def buscar_texto(
+    db: Session,
+    modelo: Any,
+    columnas_resaltado: Sequence[Any],
+    q: str,
+    filtros: Sequence[Any],
+    limit: int
+) -> List[Any]:
+    """
+    Búsqueda de texto completo sobre `modelo.documento` (tsvector generado
+    con índice GIN). Devuelve filas (modelo, rank, resaltado por columna...)
+    ordenadas por relevancia.
+
+    El ranking se calcula en una subconsulta limitada y ts_headline, que es
+    lo caro, solo sobre esas `limit` filas.
+    """
+    tsquery = consulta_texto(q)
+    rank = func.ts_rank_cd(modelo.documento, tsquery).label("rank")
+
+    mejores = db.query(modelo.id.label("id"), rank).filter(
+        modelo.documento.op("@@")(tsquery),
+        *filtros
+    ).order_by(rank.desc(), modelo.id).limit(limit).subquery("mejores")
+
+    return db.query(
+        modelo,
+        mejores.c.rank,
+        *[resaltar(columna, tsquery) for columna in columnas_resaltado]
+    ).join(
+        mejores, mejores.c.id == modelo.id
+    ).order_by(mejores.c.rank.desc(), modelo.id).all()
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class TTLCache:
+    """
+    Cache en memoria del proceso con expiración por tiempo.
+
+    Las claves son tuplas cuyo primer elemento es el "espacio" (p.ej.
+    ("tareas", "dashboard")) para poder invalidar por prefijo cuando hay
+    escrituras. Pensado para resultados chicos y baratos de recalcular.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._items: Dict[Tuple, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple[Hashable, ...], compute: Callable[[], Any]) -> Any:
+        """Devuelve el valor cacheado o lo calcula y lo guarda"""
+        ahora = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] > ahora:
+                return item[1]
+
+        # Calcular fuera del lock: dos requests simultáneos pueden calcular
+        # el mismo valor, pero ninguno bloquea al resto
+        valor = compute()
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, valor)
+        return valor
+
+    def invalidate(self, *prefijo: Hashable) -> None:
+        """Elimina las claves que empiezan con el prefijo (todas si no se indica)"""
+        n = len(prefijo)
+        with self._lock:
+            for key in [k for k in self._items if k[:n] == prefijo]:
+                del self._items[key]
+
+
+class LRUCache:
+    """
+    Cache en memoria del proceso acotado por capacidad, que descarta lo
+    usado hace más tiempo.
+
+    `peso` indica cuánto ocupa cada valor (por defecto 1, o sea capacidad =
+    cantidad de elementos; con `len` la capacidad queda en bytes). Un valor
+    más pesado que toda la capacidad se devuelve pero no se guarda.
+    Misma interfaz que TTLCache: claves tuplas, invalidación por prefijo.
+    """
+
+    def __init__(self, capacidad: int, peso: Callable[[Any], int] = lambda valor: 1):
+        self.capacidad = capacidad
+        self.peso = peso
+        self._items: "OrderedDict[Tuple, Tuple[int, Any]]" = OrderedDict()
+        self._ocupado = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple[Hashable, ...], compute: Callable[[], Any]) -> Any:
+        """Devuelve el valor cacheado o lo calcula y lo guarda"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item[1]
+
+        valor = compute()
+        peso = self.peso(valor)
+        if peso > self.capacidad:
+            return valor
+
+        with self._lock:
+            anterior = self._items.pop(key, None)
+            if anterior is not None:
+                self._ocupado -= anterior[0]
+            self._items[key] = (peso, valor)
+            self._ocupado += peso
+            while self._ocupado > self.capacidad:
+                _, (peso_viejo, _) = self._items.popitem(last=False)
+                self._ocupado -= peso_viejo
+        return valor
+
+    def invalidate(self, *prefijo: Hashable) -> None:
+        """Elimina las claves que empiezan con el prefijo (todas si no se indica)"""
+        n = len(prefijo)
+        with self._lock:
+            for key in [k for k in self._items if k[:n] == prefijo]:
+                self._ocupado -= self._items.pop(key)[0]
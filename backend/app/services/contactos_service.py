@@ -0,0 +1,134 @@
+"""
+Contactos duplicados: misma persona cargada más de una vez.
+
+Dos contactos son la misma persona si comparten email_normalizado o
+whatsapp_normalizado (columnas generadas en la BD). Los índices únicos
+sobre esas columnas impiden duplicados nuevos; esto encuentra y fusiona
+los que ya existían, todo en SQL por conjuntos (sin comparar de a pares).
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+# Clave de identidad -> columna normalizada
+CLAVES = {
+    "email": "email_normalizado",
+    "whatsapp": "whatsapp_normalizado",
+}
+
+_SQL_DUPLICADOS = """
+    SELECT '{clave}' AS clave, {columna} AS valor,
+           array_agg(id ORDER BY fecha_agregado, id) AS contacto_ids
+    FROM contactos
+    WHERE {columna} IS NOT NULL
+    GROUP BY {columna}
+    HAVING count(*) > 1
+"""
+
+# Una pasada de fusión por clave. El más antiguo de cada grupo queda
+# (sobreviviente); los demás se vuelcan en una tabla temporal con los datos
+# que hay que conservar.
+_SQL_FUSION = [
+    """
+    CREATE TEMP TABLE fusion_contactos ON COMMIT DROP AS
+    SELECT id AS duplicado, sobreviviente, whatsapp, email, etiquetas, notas, fecha_agregado
+    FROM (
+        SELECT *, first_value(id) OVER (PARTITION BY {columna} ORDER BY fecha_agregado, id) AS sobreviviente
+        FROM contactos
+        WHERE {columna} IS NOT NULL
+    ) grupos
+    WHERE id <> sobreviviente
+    """,
+    # Grupos: el sobreviviente pasa a ser miembro donde lo era algún duplicado
+    """
+    INSERT INTO grupo_miembros (grupo_id, contacto_id, fecha_agregado)
+    SELECT gm.grupo_id, f.sobreviviente, min(gm.fecha_agregado)
+    FROM grupo_miembros gm
+    JOIN fusion_contactos f ON f.duplicado = gm.contacto_id
+    GROUP BY gm.grupo_id, f.sobreviviente
+    ON CONFLICT (grupo_id, contacto_id) DO NOTHING
+    """,
+    """
+    UPDATE comunicado_destinatarios cd SET contacto_id = f.sobreviviente
+    FROM fusion_contactos f
+    WHERE cd.contacto_id = f.duplicado
+    """,
+    # La misma persona pendiente dos veces en un comunicado: queda una
+    """
+    DELETE FROM comunicado_destinatarios cd
+    USING comunicado_destinatarios otro
+    WHERE cd.estado_envio = 'pendiente'
+      AND otro.comunicado_id = cd.comunicado_id
+      AND otro.contacto_id = cd.contacto_id
+      AND otro.id <> cd.id
+      AND (otro.estado_envio <> 'pendiente' OR otro.id < cd.id)
+      AND cd.contacto_id IN (SELECT sobreviviente FROM fusion_contactos)
+    """,
+    """
+    UPDATE comunicados_log l SET contacto_id = f.sobreviviente
+    FROM fusion_contactos f
+    WHERE l.contacto_id = f.duplicado
+    """,
+    """
+    DELETE FROM contactos c
+    USING fusion_contactos f
+    WHERE c.id = f.duplicado
+    """,
+    # El sobreviviente completa lo que le falta con los datos de los duplicados
+    """
+    UPDATE contactos c SET
+        whatsapp = coalesce(c.whatsapp, r.whatsapp),
+        email = coalesce(c.email, r.email),
+        etiquetas = ARRAY(
+            SELECT unnest(c.etiquetas)
+            UNION
+            SELECT unnest(f.etiquetas) FROM fusion_contactos f WHERE f.sobreviviente = c.id
+        ),
+        notas = nullif(concat_ws(E'\\n', c.notas, r.notas), '')
+    FROM (
+        SELECT sobreviviente,
+               (array_agg(whatsapp ORDER BY fecha_agregado, duplicado) FILTER (WHERE whatsapp IS NOT NULL))[1] AS whatsapp,
+               (array_agg(email ORDER BY fecha_agregado, duplicado) FILTER (WHERE email IS NOT NULL))[1] AS email,
+               string_agg(notas, E'\\n' ORDER BY fecha_agregado, duplicado) AS notas
+        FROM fusion_contactos
+        GROUP BY sobreviviente
+    ) r
+    WHERE c.id = r.sobreviviente
+    """,
+    "DROP TABLE fusion_contactos",
+]
+
+
+def buscar_duplicados(db: Session, limit: int) -> List[Dict[str, Any]]:
+    """Grupos de contactos con el mismo email o WhatsApp normalizado"""
+    sql = " UNION ALL ".join(
+        _SQL_DUPLICADOS.format(clave=clave, columna=columna) for clave, columna in CLAVES.items()
+    )
+    filas = db.execute(text(f"{sql} ORDER BY clave, valor LIMIT :limit"), {"limit": limit})
+    return [dict(fila._mapping) for fila in filas]
+
+
+def fusionar_duplicados(db: Session) -> Dict[str, int]:
+    """
+    Fusiona los duplicados: primero por email y después por WhatsApp, así
+    un contacto que completó su WhatsApp en la primera pasada se junta en
+    la segunda con los que tienen ese número. Grupos, destinatarios y log
+    pasan al sobreviviente. Hace commit.
+    """
+    # Sin altas ni cambios de contactos mientras tanto (las lecturas siguen)
+    db.execute(text("LOCK TABLE contactos IN SHARE ROW EXCLUSIVE MODE"))
+
+    resultado = {}
+    for clave, columna in CLAVES.items():
+        crear, *pasos = _SQL_FUSION
+        db.execute(text(crear.format(columna=columna)))
+        resultado[f"fusionados_por_{clave}"] = db.execute(
+            text("SELECT count(*) FROM fusion_contactos")
+        ).scalar()
+        for sql in pasos:
+            db.execute(text(sql))
+
+    db.commit()
+    return resultado
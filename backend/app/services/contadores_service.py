@@ -0,0 +1,66 @@
+from typing import Dict, List
+from uuid import UUID
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.comunicado import ComunicadoContador
+
+
+# Resultado de una entrega -> columna que se incrementa
+COLUMNA_POR_RESULTADO = {
+    "enviado": "enviados",
+    "error": "errores",
+    "reintentos": "reintentos",
+}
+
+
+def iniciar_contadores(db: Session, comunicado_id: UUID, entregas_por_canal: Dict[str, int]) -> None:
+    """
+    Deja los contadores de cada canal en cero con todas las entregas pendientes.
+    Si el comunicado se reenvía, se reinician.
+    """
+    for canal, cantidad in entregas_por_canal.items():
+        valores = {
+            "total": cantidad,
+            "enviados": 0,
+            "errores": 0,
+            "pendientes": cantidad,
+            "reintentos": 0,
+            "actualizado_en": func.now(),
+        }
+        stmt = insert(ComunicadoContador).values(
+            comunicado_id=comunicado_id, canal=canal, **valores
+        ).on_conflict_do_update(
+            index_elements=[ComunicadoContador.comunicado_id, ComunicadoContador.canal],
+            set_=valores
+        )
+        db.execute(stmt)
+
+
+def registrar_entrega(db: Session, comunicado_id: UUID, canal: str, resultado: str) -> None:
+    """
+    Suma una entrega completada a la columna de su resultado (enviado,
+    error o reintentos) con un UPDATE atómico (col = col + 1), sin leer la
+    fila. Queda en la transacción en curso; se hace visible con el próximo
+    commit del envío.
+    """
+    columna = COLUMNA_POR_RESULTADO[resultado]
+
+    db.execute(
+        update(ComunicadoContador).where(
+            ComunicadoContador.comunicado_id == comunicado_id,
+            ComunicadoContador.canal == canal
+        ).values({
+            columna: getattr(ComunicadoContador, columna) + 1,
+            "pendientes": func.greatest(ComunicadoContador.pendientes - 1, 0),
+            "actualizado_en": func.now(),
+        })
+    )
+
+
+def leer_contadores(db: Session, comunicado_id: UUID) -> List[ComunicadoContador]:
+    """Contadores del comunicado (una fila por canal, lectura por clave primaria)"""
+    return db.query(ComunicadoContador).filter(
+        ComunicadoContador.comunicado_id == comunicado_id
+    ).order_by(ComunicadoContador.canal).all()
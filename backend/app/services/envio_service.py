@@ -1,15 +1,24 @@
+from email.message import Message
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime
+import time
 
-from app.models.contacto import Contacto, Grupo, GrupoMiembro
+from app.models.contacto import Contacto, Grupo
 from app.models.comunicado import Comunicado, ComunicadoDestinatario
 from app.models.log import ComunicadoLog
 from app.services.base_provider import WhatsAppProvider, EmailProvider
 from app.services.simulated_provider import SimulatedWhatsAppProvider, SimulatedEmailProvider
 from app.services.gmail_provider import GmailProvider
 from app.services.twilio_provider import TwilioWhatsAppProvider
+from app.services.adjuntos_email_service import partes_adjuntos
+from app.services.audiencia_service import entregas_audiencia
+from app.services.contadores_service import iniciar_contadores, registrar_entrega
+from app.services.plantillas_service import PlantillaCompilada, compilar_plantilla
+from app.services.supresiones_service import lista_supresion, registrar_supresion
 from app.config import settings
+from app.metrics import COLA_ENVIO, ENTREGAS, ENVIO_LATENCIA
+from app.perfilador import perfilado_habilitado, perfilar
 
 
 def get_whatsapp_provider() -> WhatsAppProvider:
@@ -28,6 +37,13 @@ def get_email_provider() -> EmailProvider:
         return SimulatedEmailProvider()
 
 
+# Canal -> dirección normalizada del contacto (la que usa la lista de supresión)
+DIRECCION_POR_CANAL = {
+    "whatsapp": lambda contacto: contacto.whatsapp_normalizado,
+    "email": lambda contacto: contacto.email_normalizado,
+}
+
+
 def replace_variables(template: str, contacto: Contacto) -> str:
     """
     Reemplaza variables en el template con datos del contacto
@@ -36,25 +52,34 @@ def replace_variables(template: str, contacto: Contacto) -> str:
     - {{nombre}}
     - {{email}}
     - {{whatsapp}}
-    """
-    replacements = {
-        "{{nombre}}": contacto.nombre or "",
-        "{{email}}": contacto.email or "",
-        "{{whatsapp}}": contacto.whatsapp or "",
-    }
-    
-    result = template
-    for variable, value in replacements.items():
-        result = result.replace(variable, value)
     
-    return result
+    Para renderizar el mismo template muchas veces, compilarlo una vez
+    con compilar_plantilla() y usar .render()
+    """
+    return compilar_plantilla(template).render(contacto)
+
+
+def _resultado_entrega(result: Dict[str, Any], dest: ComunicadoDestinatario) -> str:
+    """
+    Resultado de una entrega para los contadores: enviado, error (rebote,
+    número inválido o destinatario directo sin más intentos) o reintentos
+    (falla transitoria). La fila de un grupo la comparten todos sus
+    miembros y ambos canales: sus intentos no deciden por un contacto.
+    """
+    if result["status"] == "success":
+        return "enviado"
+    if result.get("supresion") or (dest.contacto_id and dest.estado_envio == "error"):
+        return "error"
+    return "reintentos"
 
 
 async def send_to_contacto(
     contacto: Contacto,
     comunicado: Comunicado,
     tipo_envio: str,
-    db: Session
+    db: Session,
+    plantilla: Optional[PlantillaCompilada] = None,
+    adjuntos: Optional[List[Message]] = None
 ) -> Dict[str, Any]:
     """
     Envía un comunicado a un contacto específico
@@ -64,12 +89,16 @@ async def send_to_contacto(
         comunicado: Comunicado a enviar
         tipo_envio: 'whatsapp' o 'email'
         db: Sesión de base de datos
+        plantilla: Contenido ya compilado (se compila si no se pasa)
+        adjuntos: Partes MIME de los adjuntos (se cargan si no se pasan)
         
     Returns:
         Dict con resultado del envío
     """
     # Reemplazar variables
-    mensaje_final = replace_variables(comunicado.contenido, contacto)
+    if plantilla is None:
+        plantilla = compilar_plantilla(comunicado.contenido)
+    mensaje_final = plantilla.render(contacto)
     
     try:
         if tipo_envio == "whatsapp":
@@ -80,7 +109,9 @@ async def send_to_contacto(
                 raise ValueError("WhatsApp no está habilitado")
             
             provider = get_whatsapp_provider()
+            inicio = time.perf_counter()
             result = await provider.send_message(contacto.whatsapp, mensaje_final)
+            ENVIO_LATENCIA.labels(tipo_envio, settings.WHATSAPP_PROVIDER).observe(time.perf_counter() - inicio)
             
         elif tipo_envio == "email":
             if not contacto.email:
@@ -89,22 +120,30 @@ async def send_to_contacto(
             if not settings.EMAIL_ENABLED:
                 raise ValueError("Email no está habilitado")
             
+            if adjuntos is None:
+                adjuntos = partes_adjuntos(db, comunicado.id)
+            
             provider = get_email_provider()
+            inicio = time.perf_counter()
             result = await provider.send_email(
                 to=contacto.email,
                 subject=comunicado.titulo,
-                body=mensaje_final
+                body=mensaje_final,
+                adjuntos=adjuntos
             )
+            ENVIO_LATENCIA.labels(tipo_envio, settings.EMAIL_PROVIDER).observe(time.perf_counter() - inicio)
         else:
             raise ValueError(f"Tipo de envío inválido: {tipo_envio}")
         
         # Registrar en log
+        resultado = "exitoso" if result["status"] == "success" else "fallido"
+        ENTREGAS.labels(tipo_envio, resultado).inc()
         log = ComunicadoLog(
             comunicado_id=comunicado.id,
             contacto_id=contacto.id,
             tipo_comunicado=tipo_envio,
             contenido_enviado=mensaje_final,
-            resultado="exitoso" if result["status"] == "success" else "fallido",
+            resultado=resultado,
             motivo_error=result.get("error"),
             intento=1
         )
@@ -115,6 +154,7 @@ async def send_to_contacto(
         
     except Exception as e:
         # Registrar error en log
+        ENTREGAS.labels(tipo_envio, "fallido").inc()
         log = ComunicadoLog(
             comunicado_id=comunicado.id,
             contacto_id=contacto.id,
@@ -137,6 +177,9 @@ async def send_comunicado(comunicado_id: str, db: Session) -> Dict[str, Any]:
     """
     Procesa y envía un comunicado a todos sus destinatarios
     
+    Si el comunicado tiene `perfilar` y el perfilado está habilitado, el
+    envío se perfila (ver app/perfilador.py).
+    
     Args:
         comunicado_id: ID del comunicado
         db: Sesión de base de datos
@@ -146,6 +189,19 @@ async def send_comunicado(comunicado_id: str, db: Session) -> Dict[str, Any]:
     """
     from uuid import UUID
     
+    if perfilado_habilitado() and db.query(Comunicado.perfilar).filter(
+        Comunicado.id == UUID(comunicado_id)
+    ).scalar():
+        async with perfilar(f"comunicado-{comunicado_id}"):
+            return await _enviar_comunicado(comunicado_id, db)
+    
+    return await _enviar_comunicado(comunicado_id, db)
+
+
+async def _enviar_comunicado(comunicado_id: str, db: Session) -> Dict[str, Any]:
+    """Envío de send_comunicado, sin perfilado"""
+    from uuid import UUID
+    
     # Obtener comunicado
     comunicado = db.query(Comunicado).filter(
         Comunicado.id == UUID(comunicado_id)
@@ -154,60 +210,78 @@ async def send_comunicado(comunicado_id: str, db: Session) -> Dict[str, Any]:
     if not comunicado:
         return {"error": "Comunicado no encontrado"}
     
-    # Obtener destinatarios
-    destinatarios = db.query(ComunicadoDestinatario).filter(
-        ComunicadoDestinatario.comunicado_id == comunicado.id
-    ).all()
-    
     stats = {
         "total": 0,
         "exitosos": 0,
         "fallidos": 0,
+        "suprimidos": 0,
         "tipos": {}
     }
     
-    for dest in destinatarios:
-        # Obtener contacto (puede ser directo o de un grupo)
-        contactos_a_enviar = []
-        
-        if dest.contacto_id:
-            contacto = db.query(Contacto).filter(Contacto.id == dest.contacto_id).first()
-            if contacto and contacto.estado == "activo":
-                contactos_a_enviar.append(contacto)
-        
-        elif dest.grupo_id:
-            # Obtener todos los contactos del grupo
-            miembros = db.query(GrupoMiembro).filter(
-                GrupoMiembro.grupo_id == dest.grupo_id
-            ).all()
-            
-            for miembro in miembros:
-                contacto = db.query(Contacto).filter(
-                    Contacto.id == miembro.contacto_id,
-                    Contacto.estado == "activo"
-                ).first()
-                if contacto:
-                    contactos_a_enviar.append(contacto)
-        
-        # Enviar a cada contacto
-        for contacto in contactos_a_enviar:
+    # Expandir destinatarios a contactos (directos y de grupos), activos y
+    # sin repetir, en una consulta: la misma audiencia que la vista previa
+    entregas = entregas_audiencia(db, comunicado.id)
+    
+    # Determinar tipos de envío
+    if comunicado.tipo == "whatsapp":
+        tipos_envio = ["whatsapp"]
+    elif comunicado.tipo == "email":
+        tipos_envio = ["email"]
+    else:  # ambos
+        tipos_envio = ["whatsapp", "email"]
+    
+    # El contenido se compila una vez para todo el envío
+    plantilla = compilar_plantilla(comunicado.contenido)
+    
+    # Y los adjuntos se codifican una vez y se comparten entre todos los emails
+    adjuntos = partes_adjuntos(db, comunicado.id) if "email" in tipos_envio else None
+    
+    # Bajas, rebotes y números inválidos: se descartan en memoria, sin una
+    # consulta por mensaje (el set se pone al día con una sola lectura)
+    lista_supresion.refrescar(db)
+    suprimidos = {
+        tipo: {
+            contacto.id for _, contacto in entregas
+            if lista_supresion.suprimida(tipo, DIRECCION_POR_CANAL[tipo](contacto))
+        }
+        for tipo in tipos_envio
+    }
+    
+    # Todas las entregas arrancan como pendientes en los contadores
+    pendientes = {tipo: len(entregas) - len(suprimidos[tipo]) for tipo in tipos_envio}
+    iniciar_contadores(db, comunicado.id, pendientes)
+    db.commit()
+    en_cola = sum(pendientes.values())
+    COLA_ENVIO.labels("entregas_pendientes").inc(en_cola)
+    
+    # Enviar a cada contacto. Si el envío se corta, lo que quedaba sale
+    # igual de la cola: el gauge no queda desfasado para siempre
+    try:
+        for dest, contacto in entregas:
             stats["total"] += 1
             
-            # Determinar tipos de envío
-            tipos_envio = []
-            if comunicado.tipo == "whatsapp":
-                tipos_envio = ["whatsapp"]
-            elif comunicado.tipo == "email":
-                tipos_envio = ["email"]
-            else:  # ambos
-                tipos_envio = ["whatsapp", "email"]
-            
             # Enviar por cada tipo
             for tipo in tipos_envio:
+                if contacto.id in suprimidos[tipo]:
+                    stats["suprimidos"] += 1
+                    ENTREGAS.labels(tipo, "suprimido").inc()
+                    continue
+                
+                COLA_ENVIO.labels("entregas_pendientes").dec()
+                en_cola -= 1
+                
                 try:
-                    result = await send_to_contacto(contacto, comunicado, tipo, db)
+                    result = await send_to_contacto(contacto, comunicado, tipo, db, plantilla, adjuntos)
+                    
+                    # El provider informa rebotes permanentes y números inválidos
+                    if result.get("supresion"):
+                        registrar_supresion(
+                            db, tipo, DIRECCION_POR_CANAL[tipo](contacto),
+                            result["supresion"], result.get("error")
+                        )
                     
-                    if result["status"] == "success":
+                    exitosa = result["status"] == "success"
+                    if exitosa:
                         stats["exitosos"] += 1
                         dest.estado_envio = "enviado"
                     else:
@@ -221,12 +295,13 @@ async def send_comunicado(comunicado_id: str, db: Session) -> Dict[str, Any]:
                             dest.estado_envio = "reintentos"
                     
                     dest.fecha_envio = datetime.now()
+                    resultado = _resultado_entrega(result, dest)
                     
                     # Actualizar stats por tipo
                     if tipo not in stats["tipos"]:
                         stats["tipos"][tipo] = {"exitosos": 0, "fallidos": 0}
                     
-                    if result["status"] == "success":
+                    if exitosa:
                         stats["tipos"][tipo]["exitosos"] += 1
                     else:
                         stats["tipos"][tipo]["fallidos"] += 1
@@ -237,6 +312,12 @@ async def send_comunicado(comunicado_id: str, db: Session) -> Dict[str, Any]:
                     dest.intentos_fallidos += 1
                     dest.error_mensaje = str(e)
                     dest.estado_envio = "error"
+                    resultado = "error"
+                
+                # Se confirma junto con el log del próximo envío (o el commit final)
+                registrar_entrega(db, comunicado.id, tipo, resultado)
+    finally:
+        COLA_ENVIO.labels("entregas_pendientes").dec(en_cola)
     
     # Actualizar estado del comunicado
     if stats["fallidos"] == 0:
@@ -0,0 +1,194 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from uuid import UUID
+import time
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, replica_engine
+from app.models.tarea import Tarea
+from app.models.contacto import Contacto, Grupo, GrupoMiembro
+from app.services.cache import TTLCache
+from app.config import settings
+
+
+PRIORIDADES = ["baja", "media", "alta", "urgente"]
+ESTADOS_ACTIVOS = ["pendiente", "en_progreso"]
+
+class CacheEstadisticas(TTLCache):
+    """
+    TTLCache que recuerda cuándo se invalidó cada espacio. Hasta
+    REPLICA_MAX_LAG_SECONDS después de una invalidación, el recálculo lee
+    de la primaria: la réplica puede no tener todavía la escritura y el
+    valor viejo quedaría cacheado todo el TTL.
+
+    La invalidación es por proceso: con varios workers, los demás siguen
+    sirviendo su valor hasta que vence (STATS_CACHE_TTL).
+    """
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self._invalidado_en: Dict[Optional[Hashable], float] = {}
+
+    def invalidate(self, *prefijo: Hashable) -> None:
+        super().invalidate(*prefijo)
+        with self._lock:
+            self._invalidado_en[prefijo[0] if prefijo else None] = time.monotonic()
+
+    def _invalidado_hace_poco(self, espacio: Hashable) -> bool:
+        limite = time.monotonic() - settings.REPLICA_MAX_LAG_SECONDS
+        with self._lock:
+            return any(
+                self._invalidado_en.get(clave, 0.0) > limite for clave in (espacio, None)
+            )
+
+    def get_or_compute_db(
+        self,
+        key: Tuple[Hashable, ...],
+        db: Session,
+        compute: Callable[[Session], Any]
+    ) -> Any:
+        """get_or_compute para cálculos que leen de `db` (sesión de get_read_db)"""
+        def calcular():
+            if replica_engine is None or db.get_bind() is not replica_engine \
+                    or not self._invalidado_hace_poco(key[0]):
+                return compute(db)
+            primaria = SessionLocal()
+            try:
+                return compute(primaria)
+            finally:
+                primaria.close()
+        return self.get_or_compute(key, calcular)
+
+
+# Cache compartido por los endpoints de estadísticas. Las rutas que escriben
+# invalidan su espacio ("tareas", "contactos", "grupos") después del commit.
+cache_estadisticas = CacheEstadisticas(ttl=settings.STATS_CACHE_TTL)
+
+
+def calcular_dashboard_tareas(db: Session, hoy: date) -> Dict[str, Any]:
+    """
+    Estadísticas del dashboard en una sola pasada sobre tareas
+    usando COUNT(*) FILTER (...)
+    """
+    activa = Tarea.estado.in_(ESTADOS_ACTIVOS)
+
+    columnas = [
+        func.count().filter(Tarea.estado == "pendiente").label("pendientes"),
+        func.count().filter(
+            Tarea.fecha_completacion >= datetime.combine(hoy, datetime.min.time())
+        ).label("completadas_hoy"),
+        func.count().filter(
+            activa,
+            Tarea.fecha_termino <= hoy + timedelta(days=3)
+        ).label("proximas_vencer"),
+        func.count().filter(activa, Tarea.fecha_termino < hoy).label("vencidas"),
+    ] + [
+        func.count().filter(activa, Tarea.prioridad == prioridad).label(prioridad)
+        for prioridad in PRIORIDADES
+    ]
+
+    row = db.query(*columnas).one()
+
+    return {
+        "pendientes": row.pendientes,
+        "completadas_hoy": row.completadas_hoy,
+        "proximas_vencer": row.proximas_vencer,
+        "vencidas": row.vencidas,
+        "por_prioridad": {prioridad: getattr(row, prioridad) for prioridad in PRIORIDADES}
+    }
+
+
+def calcular_stats_contactos(db: Session) -> Dict[str, int]:
+    """Total, activos e inactivos en una sola consulta"""
+    row = db.query(
+        func.count().label("total"),
+        func.count().filter(Contacto.estado == "activo").label("activos"),
+        func.count().filter(Contacto.estado == "inactivo").label("inactivos")
+    ).one()
+
+    return {
+        "total": row.total,
+        "activos": row.activos,
+        "inactivos": row.inactivos
+    }
+
+
+def calcular_stats_grupo(db: Session, grupo_id: UUID) -> Optional[Dict[str, Any]]:
+    """
+    Miembros totales y activos del grupo en una sola consulta.
+    Devuelve None si el grupo no existe.
+    """
+    row = db.query(
+        Grupo.nombre,
+        func.count(GrupoMiembro.contacto_id).label("total_miembros"),
+        func.count(Contacto.id).filter(Contacto.estado == "activo").label("miembros_activos")
+    ).outerjoin(
+        GrupoMiembro, GrupoMiembro.grupo_id == Grupo.id
+    ).outerjoin(
+        Contacto, Contacto.id == GrupoMiembro.contacto_id
+    ).filter(
+        Grupo.id == grupo_id
+    ).group_by(Grupo.id).first()
+
+    if not row:
+        return None
+
+    return {
+        "grupo_id": str(grupo_id),
+        "nombre": row.nombre,
+        "total_miembros": row.total_miembros,
+        "miembros_activos": row.miembros_activos,
+        "miembros_inactivos": row.total_miembros - row.miembros_activos
+    }
+
+
+def calcular_agenda(
+    db: Session,
+    query,
+    desde: date,
+    hasta: date,
+    incluir_tareas: bool = True
+) -> Dict[str, Any]:
+    """
+    Tareas que vencen entre desde y hasta (inclusive) y, por cada día del
+    rango, cantidades por estado y por prioridad.
+
+    `query` es un query sobre Tarea con los filtros ya aplicados. Con
+    incluir_tareas las cantidades salen de las mismas filas (una consulta);
+    sin tareas se agrupa en la base sobre idx_tareas_agenda.
+    """
+    dias: Dict[date, Dict[str, Any]] = {}
+    dia = desde
+    while dia <= hasta:
+        dias[dia] = {"fecha": dia, "total": 0, "por_estado": {}, "por_prioridad": {}}
+        dia += timedelta(days=1)
+
+    def sumar(fecha: date, estado: str, prioridad: str, cantidad: int) -> None:
+        bucket = dias[fecha]
+        bucket["total"] += cantidad
+        bucket["por_estado"][estado] = bucket["por_estado"].get(estado, 0) + cantidad
+        bucket["por_prioridad"][prioridad] = bucket["por_prioridad"].get(prioridad, 0) + cantidad
+
+    en_rango = query.filter(Tarea.fecha_termino >= desde, Tarea.fecha_termino <= hasta)
+    tareas: List[Tarea] = []
+
+    if incluir_tareas:
+        tareas = en_rango.order_by(
+            Tarea.fecha_termino, Tarea.hora_termino.asc().nullslast(), Tarea.prioridad.desc(), Tarea.id
+        ).all()
+        for tarea in tareas:
+            sumar(tarea.fecha_termino, tarea.estado, tarea.prioridad, 1)
+    else:
+        filas = en_rango.with_entities(
+            Tarea.fecha_termino, Tarea.estado, Tarea.prioridad, func.count()
+        ).group_by(Tarea.fecha_termino, Tarea.estado, Tarea.prioridad).all()
+        for fecha, estado, prioridad, cantidad in filas:
+            sumar(fecha, estado, prioridad, cantidad)
+
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "dias": list(dias.values()),
+        "tareas": tareas
+    }
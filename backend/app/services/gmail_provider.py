@@ -1,7 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.message import Message
 
 from app.services.base_provider import EmailProvider
 from app.config import settings
@@ -35,7 +36,13 @@ class GmailProvider(EmailProvider):
                 "Gmail no configurado. Necesitas GMAIL_USER y GMAIL_APP_PASSWORD en .env"
             )
     
-    async def send_email(self, to: str, subject: str, body: str) -> Dict[str, Any]:
+    async def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        adjuntos: Optional[List[Message]] = None
+    ) -> Dict[str, Any]:
         """
         Envía email real usando Gmail SMTP
         """
@@ -49,6 +56,10 @@ class GmailProvider(EmailProvider):
             # Agregar cuerpo
             msg.attach(MIMEText(body, 'plain', 'utf-8'))
             
+            # Adjuntos: partes ya codificadas, se agregan sin recodificar
+            for parte in adjuntos or []:
+                msg.attach(parte)
+            
             # Conectar y enviar
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
                 server.starttls()
@@ -63,6 +74,18 @@ class GmailProvider(EmailProvider):
                 "provider": "gmail"
             }
             
+        except smtplib.SMTPRecipientsRefused as e:
+            # 5xx: la dirección no existe o no acepta correo (rebote permanente)
+            codigo, respuesta = next(iter(e.recipients.values()))
+            error_msg = f"Destinatario rechazado ({codigo}): {respuesta.decode(errors='replace')}"
+            print(f"❌ {error_msg}")
+            return {
+                "status": "error",
+                "error": error_msg,
+                "provider": "gmail",
+                "supresion": "rebote" if codigo >= 500 else None
+            }
+            
         except smtplib.SMTPAuthenticationError:
             error_msg = "Error de autenticación Gmail. Verifica GMAIL_USER y GMAIL_APP_PASSWORD"
             print(f"❌ {error_msg}")
@@ -0,0 +1,267 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import datetime
+from uuid import UUID
+import uuid
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import case, func, insert, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.tarea import Tarea, TareaLog, TareaSnapshot
+from app.config import settings
+
+
+# Campos de la tarea que se registran en el historial.
+# fecha_actualizacion no se incluye: cambia en cada edición y no aporta
+CAMPOS_AUDITADOS = [
+    "titulo",
+    "descripcion",
+    "fecha_creacion",
+    "hora_creacion",
+    "fecha_termino",
+    "hora_termino",
+    "prioridad",
+    "estado",
+    "etiquetas",
+    "fecha_completacion",
+]
+
+
+def serializar_tarea(tarea: Tarea) -> Dict[str, Any]:
+    """Valores auditables de la tarea en formato JSON"""
+    return jsonable_encoder({campo: getattr(tarea, campo) for campo in CAMPOS_AUDITADOS})
+
+
+def calcular_diff(
+    anterior: Dict[str, Any],
+    nuevo: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(valores anteriores, valores nuevos) solo de los campos que cambiaron"""
+    cambiados = [campo for campo in CAMPOS_AUDITADOS if anterior.get(campo) != nuevo.get(campo)]
+    return (
+        {campo: anterior.get(campo) for campo in cambiados},
+        {campo: nuevo.get(campo) for campo in cambiados}
+    )
+
+
+def registrar_creacion(db: Session, tarea: Tarea, usuario: str = "sistema") -> TareaLog:
+    """
+    Agrega a la sesión la entrada 'creada' con el estado completo de la tarea,
+    que es la base para reconstruir las versiones siguientes. No hace commit:
+    se guarda en la misma transacción que la tarea.
+    """
+    tarea.cambios_sin_snapshot = 1
+    log = TareaLog(
+        tarea_id=tarea.id,
+        accion="creada",
+        datos_nuevos=serializar_tarea(tarea),
+        usuario=usuario
+    )
+    db.add(log)
+    return log
+
+
+def registrar_cambio(
+    db: Session,
+    tarea: Tarea,
+    accion: str,
+    anterior: Dict[str, Any],
+    usuario: str = "sistema"
+) -> Optional[TareaLog]:
+    """
+    Agrega a la sesión una entrada con solo los campos modificados respecto
+    de `anterior` (resultado de serializar_tarea antes del cambio).
+    Si no cambió nada no se registra. No hace commit.
+    
+    Cada HISTORIAL_SNAPSHOT_CADA entradas guarda además el estado completo,
+    así reconstruir una versión nunca aplica más de N diffs. Las entradas
+    desde el último snapshot se cuentan en tareas.cambios_sin_snapshot, que
+    se escribe con el mismo UPDATE de la edición: no hay lecturas extra.
+    Dos ediciones simultáneas pueden perder un incremento; solo atrasa el
+    próximo snapshot.
+    """
+    actual = serializar_tarea(tarea)
+    datos_anteriores, datos_nuevos = calcular_diff(anterior, actual)
+    if not datos_nuevos:
+        return None
+
+    log = TareaLog(
+        id=uuid.uuid4(),
+        tarea_id=tarea.id,
+        accion=accion,
+        datos_anteriores=datos_anteriores,
+        datos_nuevos=datos_nuevos,
+        usuario=usuario
+    )
+    db.add(log)
+
+    tarea.cambios_sin_snapshot = (tarea.cambios_sin_snapshot or 0) + 1
+    if tarea.cambios_sin_snapshot >= settings.HISTORIAL_SNAPSHOT_CADA:
+        # fecha usa NOW() igual que fecha_cambio: misma transacción, mismo valor
+        db.add(TareaSnapshot(tarea_id=tarea.id, log_id=log.id, datos=actual))
+        tarea.cambios_sin_snapshot = 0
+
+    return log
+
+
+def registrar_cambios_lote(
+    db: Session,
+    cambios: List[Tuple[UUID, Dict[str, Any], Dict[str, Any]]],
+    accion: str,
+    con_snapshot: Set[UUID],
+    usuario: str = "sistema"
+) -> int:
+    """
+    Versión por lotes de registrar_cambio: recibe (tarea_id, anterior, actual)
+    ya serializados y escribe todas las entradas con un solo INSERT
+    multi-fila, y con otro el snapshot de las tareas de `con_snapshot`. El
+    UPDATE del lote ya avanzó cambios_sin_snapshot (ver
+    contador_snapshot). No hace commit. Devuelve la cantidad de entradas
+    registradas.
+    """
+    entradas = []
+    estados_actuales = {}
+    for tarea_id, anterior, actual in cambios:
+        datos_anteriores, datos_nuevos = calcular_diff(anterior, actual)
+        if not datos_nuevos:
+            continue
+        entradas.append({
+            "id": uuid.uuid4(),
+            "tarea_id": tarea_id,
+            "accion": accion,
+            "datos_anteriores": datos_anteriores,
+            "datos_nuevos": datos_nuevos,
+            "usuario": usuario
+        })
+        estados_actuales[tarea_id] = actual
+
+    if not entradas:
+        return 0
+
+    db.execute(insert(TareaLog), entradas)
+
+    snapshots = [
+        {"tarea_id": e["tarea_id"], "log_id": e["id"], "datos": estados_actuales[e["tarea_id"]]}
+        for e in entradas
+        if e["tarea_id"] in con_snapshot
+    ]
+    if snapshots:
+        db.execute(insert(TareaSnapshot), snapshots)
+
+    return len(entradas)
+
+
+def contador_snapshot():
+    """
+    Valor nuevo de tareas.cambios_sin_snapshot para un UPDATE que agrega
+    una entrada al historial: vuelve a 0 cuando toca snapshot.
+    """
+    siguiente = Tarea.cambios_sin_snapshot + 1
+    return case((siguiente >= settings.HISTORIAL_SNAPSHOT_CADA, 0), else_=siguiente)
+
+
+def _ultimo_snapshot(db: Session, tarea_id: UUID, hasta=None):
+    """Snapshot más reciente de la tarea (opcionalmente, no posterior a `hasta`)"""
+    query = db.query(TareaSnapshot).filter(TareaSnapshot.tarea_id == tarea_id)
+    if hasta is not None:
+        query = query.filter(hasta(TareaSnapshot.fecha, TareaSnapshot.log_id))
+    return query.order_by(
+        TareaSnapshot.fecha.desc(), TareaSnapshot.log_id.desc()
+    ).first()
+
+
+def _reconstruir(db: Session, tarea_id: UUID, hasta) -> Optional[Dict[str, Any]]:
+    """
+    Parte del último snapshot que cumple `hasta` y aplica los diffs
+    siguientes que también lo cumplen. `hasta(fecha, id)` es la condición
+    de posición en el log. None si no hay ninguna entrada hasta ese punto.
+    """
+    snapshot = _ultimo_snapshot(db, tarea_id, hasta)
+
+    query = db.query(TareaLog.datos_nuevos).filter(
+        TareaLog.tarea_id == tarea_id,
+        hasta(TareaLog.fecha_cambio, TareaLog.id)
+    )
+    estado: Dict[str, Any] = {}
+    if snapshot:
+        estado = dict(snapshot.datos)
+        query = query.filter(
+            tuple_(TareaLog.fecha_cambio, TareaLog.id) > (snapshot.fecha, snapshot.log_id)
+        )
+
+    entradas = query.order_by(TareaLog.fecha_cambio, TareaLog.id).all()
+    if not snapshot and not entradas:
+        return None
+
+    for (datos_nuevos,) in entradas:
+        # Las entradas anteriores a este formato traen la tarea completa;
+        # solo se toman los campos auditados
+        for campo, valor in (datos_nuevos or {}).items():
+            if campo in CAMPOS_AUDITADOS:
+                estado[campo] = valor
+
+    return estado
+
+
+def reconstruir_version(db: Session, tarea_id: UUID, log_id: UUID) -> Optional[Dict[str, Any]]:
+    """
+    Estado de la tarea inmediatamente después de la entrada `log_id`.
+    Devuelve None si la entrada no existe o no es de esa tarea.
+    """
+    objetivo = db.query(TareaLog).filter(
+        TareaLog.id == log_id,
+        TareaLog.tarea_id == tarea_id
+    ).first()
+    if not objetivo:
+        return None
+
+    posicion = (objetivo.fecha_cambio, objetivo.id)
+    return _reconstruir(db, tarea_id, lambda fecha, id_: tuple_(fecha, id_) <= posicion)
+
+
+def estado_en(db: Session, tarea_id: UUID, momento: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Estado de la tarea en un momento dado. None si la tarea todavía no
+    tenía historial en ese momento.
+    """
+    return _reconstruir(db, tarea_id, lambda fecha, id_: fecha <= momento)
+
+
+def tareas_cambiadas(
+    db: Session,
+    desde: datetime,
+    hasta: datetime,
+    limit: int
+) -> List[Dict[str, Any]]:
+    """
+    Tareas con cambios en [desde, hasta): cantidad, primer y último cambio
+    y acciones. Un solo GROUP BY sobre el rango de idx_tareas_log_fecha.
+    """
+    ultimo_cambio = func.max(TareaLog.fecha_cambio).label("ultimo_cambio")
+    cambios = db.query(
+        TareaLog.tarea_id,
+        func.count().label("cambios"),
+        func.min(TareaLog.fecha_cambio).label("primer_cambio"),
+        ultimo_cambio,
+        func.array_agg(func.distinct(TareaLog.accion)).label("acciones")
+    ).filter(
+        TareaLog.fecha_cambio >= desde,
+        TareaLog.fecha_cambio < hasta
+    ).group_by(TareaLog.tarea_id).subquery()
+
+    filas = db.query(cambios, Tarea.titulo).join(
+        Tarea, Tarea.id == cambios.c.tarea_id
+    ).order_by(
+        cambios.c.ultimo_cambio.desc(), cambios.c.tarea_id
+    ).limit(limit).all()
+
+    return [
+        {
+            "tarea_id": fila.tarea_id,
+            "titulo": fila.titulo,
+            "cambios": fila.cambios,
+            "primer_cambio": fila.primer_cambio,
+            "ultimo_cambio": fila.ultimo_cambio,
+            "acciones": fila.acciones
+        }
+        for fila in filas
+    ]
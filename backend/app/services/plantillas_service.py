@@ -0,0 +1,67 @@
+import re
+from typing import Callable, Dict, FrozenSet, List, Tuple, Union
+from uuid import UUID
+
+from app.config import settings
+from app.models.contacto import Contacto
+from app.models.modelo_comunicado import ModeloComunicado
+from app.services.cache import LRUCache
+
+
+# Variables disponibles y cómo se obtienen del contacto
+VARIABLES: Dict[str, Callable[[Contacto], str]] = {
+    "nombre": lambda contacto: contacto.nombre or "",
+    "email": lambda contacto: contacto.email or "",
+    "whatsapp": lambda contacto: contacto.whatsapp or "",
+}
+
+_PATRON_VARIABLE = re.compile(r"\{\{(" + "|".join(VARIABLES) + r")\}\}")
+
+
+class PlantillaCompilada:
+    """
+    Template dividido una sola vez en texto literal y variables.
+    Renderizar es solo concatenar, sin volver a buscar las variables.
+    """
+
+    def __init__(self, template: str):
+        partes: List[Union[str, Tuple[str]]] = []
+        posicion = 0
+        for match in _PATRON_VARIABLE.finditer(template):
+            if match.start() > posicion:
+                partes.append(template[posicion:match.start()])
+            # Las variables se guardan como tupla para distinguirlas del texto
+            partes.append((match.group(1),))
+            posicion = match.end()
+        if posicion < len(template):
+            partes.append(template[posicion:])
+
+        self.partes = partes
+        self.variables: FrozenSet[str] = frozenset(p[0] for p in partes if isinstance(p, tuple))
+
+    def render(self, contacto: Contacto) -> str:
+        return "".join(
+            VARIABLES[parte[0]](contacto) if isinstance(parte, tuple) else parte
+            for parte in self.partes
+        )
+
+
+def compilar_plantilla(template: str) -> PlantillaCompilada:
+    return PlantillaCompilada(template)
+
+
+# Modelos compilados, con clave (id, updated_at): una edición cambia la clave
+# aunque otro proceso no haya invalidado su copia
+cache_modelos = LRUCache(capacidad=settings.PLANTILLAS_CACHE_MAX)
+
+
+def plantilla_de_modelo(modelo: ModeloComunicado) -> PlantillaCompilada:
+    """Contenido del modelo compilado, reutilizado mientras no cambie"""
+    return cache_modelos.get_or_compute(
+        (modelo.id, modelo.updated_at),
+        lambda: compilar_plantilla(modelo.contenido)
+    )
+
+
+def invalidar_modelo(modelo_id: UUID) -> None:
+    cache_modelos.invalidate(modelo_id)
@@ -1,4 +1,5 @@
-from typing import Dict, Any
+from email.message import Message
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 import uuid
 
@@ -31,7 +32,13 @@ class SimulatedWhatsAppProvider(WhatsAppProvider):
 class SimulatedEmailProvider(EmailProvider):
     """Provider simulado de Email para MVP"""
     
-    async def send_email(self, to: str, subject: str, body: str) -> Dict[str, Any]:
+    async def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        adjuntos: Optional[List[Message]] = None
+    ) -> Dict[str, Any]:
         """
         Simula el envío de Email
         Solo imprime en consola y retorna éxito
@@ -42,6 +49,8 @@ class SimulatedEmailProvider(EmailProvider):
         print(f"Para: {to}")
         print(f"Asunto: {subject}")
         print(f"Cuerpo: {body[:200]}{'...' if len(body) > 200 else ''}")
+        if adjuntos:
+            print(f"Adjuntos: {', '.join(parte.get_filename() or '?' for parte in adjuntos)}")
         print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*60}\n")
         
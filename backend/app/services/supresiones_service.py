@@ -0,0 +1,94 @@
+"""
+Lista de supresión: direcciones a las que no se envía por un canal.
+
+El envío consulta un set en memoria por canal, sin ir a la base por cada
+mensaje. El set se refresca de forma incremental al empezar cada envío:
+solo se leen las filas con fecha_actualizacion posterior al último
+refresco (índice idx_supresiones_actualizacion), con el mismo margen de
+SYNC_VENTANA_SEGUNDOS que /changes para transacciones que confirman tarde.
+Releer ese margen no tiene efecto: agregar o quitar del set es idempotente.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from sqlalchemy import Text, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.supresion import Supresion
+from app.config import settings
+
+
+# Canal -> función SQL que normaliza la dirección (ver schema.sql)
+NORMALIZADORES = {
+    "whatsapp": func.normalizar_telefono,
+    "email": func.normalizar_email,
+}
+
+
+class ListaSupresion:
+    """Sets por canal de las direcciones suprimidas activas"""
+
+    def __init__(self):
+        self._direcciones: Dict[str, Set[str]] = {canal: set() for canal in NORMALIZADORES}
+        self._desde: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def suprimida(self, canal: str, direccion: Optional[str]) -> bool:
+        return direccion is not None and direccion in self._direcciones[canal]
+
+    def refrescar(self, db: Session) -> int:
+        """
+        Aplica los cambios desde el último refresco (todo la primera vez).
+        Devuelve cuántas filas leyó.
+        """
+        with self._lock:
+            query = select(
+                Supresion.canal, Supresion.direccion, Supresion.activa
+            ).order_by(Supresion.fecha_actualizacion, Supresion.id)
+            if self._desde is None:
+                # Carga inicial: las inactivas no hacen falta
+                query = query.where(Supresion.activa)
+            else:
+                query = query.where(Supresion.fecha_actualizacion >= self._desde)
+
+            ahora = db.execute(select(func.now())).scalar()
+            filas = db.execute(query).all()
+            for canal, direccion, activa in filas:
+                if activa:
+                    self._direcciones[canal].add(direccion)
+                else:
+                    self._direcciones[canal].discard(direccion)
+
+            self._desde = ahora - timedelta(seconds=settings.SYNC_VENTANA_SEGUNDOS)
+            return len(filas)
+
+
+lista_supresion = ListaSupresion()
+
+
+def registrar_supresion(
+    db: Session,
+    canal: str,
+    direccion: str,
+    motivo: str,
+    detalle: Optional[str] = None
+) -> Optional[Supresion]:
+    """
+    Agrega (o reactiva) la dirección en la lista del canal. La dirección se
+    normaliza en la base igual que en contactos. No hace commit. Devuelve
+    None si la dirección queda vacía al normalizarla.
+    """
+    normalizada = db.execute(select(NORMALIZADORES[canal](direccion, type_=Text))).scalar()
+    if not normalizada:
+        return None
+
+    valores = {"motivo": motivo, "detalle": detalle, "activa": True, "fecha_actualizacion": func.now()}
+    stmt = insert(Supresion).values(
+        canal=canal, direccion=normalizada, **valores
+    ).on_conflict_do_update(
+        index_elements=[Supresion.canal, Supresion.direccion],
+        set_=valores
+    ).returning(Supresion)
+    return db.execute(stmt).scalar_one()
@@ -0,0 +1,110 @@
+"""
+Sincronización incremental por recurso (/changes).
+
+El cliente guarda el cursor de la última respuesta y pide solo lo que
+cambió después: filas creadas o modificadas (fecha_actualizacion) y filas
+borradas (tabla eliminaciones, llenada por triggers). Las dos fuentes se
+recorren juntas ordenadas por (fecha, id), así un único cursor avanza sobre
+ambas y cada página sale del índice (fecha_actualizacion, id).
+
+fecha_actualizacion es NOW() de la transacción, no del commit: una
+transacción larga puede confirmar filas con fecha anterior a un cursor ya
+entregado. Por eso el cursor no avanza más allá de NOW() menos
+SYNC_VENTANA_SEGUNDOS; las filas más nuevas se devuelven igual y pueden
+repetirse en la próxima llamada (el cliente las aplica por id).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import delete, false, select, true, union_all
+from sqlalchemy.orm import Session
+
+from app.models.log import Eliminacion
+from app.pagination import SortKey, decode_cursor, encode_cursor, keyset_filter
+from app.config import settings
+
+UUID_MINIMO = UUID(int=0)
+
+
+def obtener_cambios(
+    db: Session,
+    modelo: Any,
+    recurso: str,
+    since: Optional[str],
+    limit: int
+) -> Dict[str, Any]:
+    """
+    Cambios de `modelo` posteriores al cursor `since` (desde el principio si
+    no se indica). Devuelve {"cambios", "eliminados", "cursor", "hay_mas"}.
+    """
+    vivos = select(
+        modelo.fecha_actualizacion.label("fecha"),
+        modelo.id.label("id"),
+        false().label("eliminado")
+    )
+    borrados = select(
+        Eliminacion.fecha.label("fecha"),
+        Eliminacion.registro_id.label("id"),
+        true().label("eliminado")
+    ).where(Eliminacion.recurso == recurso)
+    eventos = union_all(vivos, borrados).subquery("eventos")
+    keys = [SortKey(eventos.c.fecha), SortKey(eventos.c.id)]
+
+    ahora = datetime.now(timezone.utc)
+    query = select(eventos)
+    if since:
+        valores = decode_cursor(since, keys)
+        fecha, id_ = valores
+        # Los cursores propios siempre llevan zona horaria; uno armado a mano
+        # o de otra versión no debe terminar en un 500 al comparar
+        if not isinstance(fecha, datetime) or fecha.tzinfo is None or id_ is None:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        if fecha < ahora - timedelta(days=settings.SYNC_RETENCION_DIAS):
+            # Los tombstones de ese período ya se purgaron
+            raise HTTPException(
+                status_code=410,
+                detail="Cursor vencido: volver a descargar la lista completa"
+            )
+        query = query.where(keyset_filter(keys, valores))
+
+    filas = db.execute(
+        query.order_by(*[k.order_by() for k in keys]).limit(limit + 1)
+    ).all()
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+
+    # Filas completas de lo que sigue existiendo (una consulta por página)
+    ids_vivos = [f.id for f in filas if not f.eliminado]
+    por_id = {}
+    if ids_vivos:
+        por_id = {r.id: r for r in db.query(modelo).filter(modelo.id.in_(ids_vivos))}
+
+    # Cursor siguiente: la última fila, sin pasar el horizonte de la ventana.
+    # Si quedan más páginas se usa la última fila tal cual para no repetir la
+    # misma página indefinidamente.
+    horizonte = ahora - timedelta(seconds=settings.SYNC_VENTANA_SEGUNDOS)
+    if filas:
+        ultima = filas[-1]
+        if hay_mas or ultima.fecha <= horizonte:
+            cursor = encode_cursor([ultima.fecha, ultima.id])
+        else:
+            cursor = encode_cursor([horizonte, UUID_MINIMO])
+    else:
+        cursor = since or encode_cursor([horizonte, UUID_MINIMO])
+
+    return {
+        "cambios": [por_id[f.id] for f in filas if f.id in por_id],
+        "eliminados": [f.id for f in filas if f.eliminado],
+        "cursor": cursor,
+        "hay_mas": hay_mas
+    }
+
+
+def purgar_eliminaciones(db: Session) -> int:
+    """Borra los tombstones más viejos que SYNC_RETENCION_DIAS"""
+    limite = datetime.now(timezone.utc) - timedelta(days=settings.SYNC_RETENCION_DIAS)
+    resultado = db.execute(delete(Eliminacion).where(Eliminacion.fecha < limite))
+    db.commit()
+    return resultado.rowcount
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Text, all_, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from app.models.tarea import Tarea
+from app.services.historial_service import CAMPOS_AUDITADOS, contador_snapshot, registrar_cambios_lote
+
+
+# Campos que puede tocar una edición por lotes (y su valor anterior en el log)
+CAMPOS_LOTE = ["estado", "prioridad", "etiquetas", "fecha_completacion"]
+
+
+def _etiquetas_resultantes(agregar: List[str], quitar: List[str]):
+    """
+    Expresión SQL con las etiquetas de la fila más `agregar` y menos `quitar`,
+    sin repetidos y conservando el orden original.
+    """
+    etiquetas = func.array_cat(
+        func.coalesce(Tarea.etiquetas, literal([], ARRAY(Text))),
+        literal(agregar, ARRAY(Text))
+    )
+    elementos = func.unnest(etiquetas).table_valued("etiqueta", with_ordinality="orden").render_derived()
+    seleccion = select(elementos.c.etiqueta).where(
+        elementos.c.etiqueta != all_(literal(quitar, ARRAY(Text)))
+    ).group_by(elementos.c.etiqueta).order_by(func.min(elementos.c.orden))
+    return func.array(seleccion.scalar_subquery())
+
+
+def actualizar_lote(
+    db: Session,
+    ids: List[UUID],
+    estado: Optional[str] = None,
+    prioridad: Optional[str] = None,
+    etiquetas_agregar: Optional[List[str]] = None,
+    etiquetas_quitar: Optional[List[str]] = None,
+    usuario: str = "sistema"
+) -> List[Any]:
+    """
+    Cambia estado, prioridad y/o etiquetas de muchas tareas con un solo
+    UPDATE ... RETURNING. Los valores anteriores salen de un CTE que bloquea
+    las filas (FOR UPDATE), así el historial se arma sin releer la tabla y
+    se guarda con un único INSERT. Solo se escriben las filas que cambian.
+    No hace commit. Devuelve las filas actualizadas.
+    """
+    anteriores = select(
+        Tarea.id, *[getattr(Tarea, campo) for campo in CAMPOS_LOTE]
+    ).where(Tarea.id.in_(ids)).with_for_update().cte("anteriores")
+
+    valores: Dict[str, Any] = {}
+    if estado is not None:
+        valores["estado"] = estado
+        # Igual que change_estado: al completar se registra la fecha una sola vez
+        if estado == "completada":
+            valores["fecha_completacion"] = func.coalesce(Tarea.fecha_completacion, func.now())
+    if prioridad is not None:
+        valores["prioridad"] = prioridad
+    if etiquetas_agregar or etiquetas_quitar:
+        valores["etiquetas"] = _etiquetas_resultantes(etiquetas_agregar or [], etiquetas_quitar or [])
+
+    if not valores:
+        return []
+
+    # Saltear las filas donde ningún valor nuevo difiere del actual
+    distinto = or_(*[getattr(Tarea, campo).is_distinct_from(valor) for campo, valor in valores.items()])
+
+    # Cada fila que cambia suma una entrada al historial: el mismo UPDATE
+    # avanza su contador de snapshot (0 = toca snapshot)
+    filas = db.execute(
+        update(Tarea).where(
+            Tarea.id == anteriores.c.id,
+            distinto
+        ).values({**valores, "cambios_sin_snapshot": contador_snapshot()}).returning(
+            Tarea,
+            *[getattr(anteriores.c, campo).label(f"{campo}_anterior") for campo in CAMPOS_LOTE]
+        ),
+        execution_options={"synchronize_session": False}
+    ).all()
+
+    cambios = []
+    for fila in filas:
+        tarea = fila[0]
+        actual = jsonable_encoder({campo: getattr(tarea, campo) for campo in CAMPOS_AUDITADOS})
+        anterior = dict(actual)
+        anterior.update(jsonable_encoder({
+            campo: getattr(fila, f"{campo}_anterior") for campo in CAMPOS_LOTE
+        }))
+        cambios.append((tarea.id, anterior, actual))
+
+    accion = "estado_cambio" if set(valores) <= {"estado", "fecha_completacion"} else "actualizada"
+    con_snapshot = {fila[0].id for fila in filas if fila[0].cambios_sin_snapshot == 0}
+    registrar_cambios_lote(db, cambios, accion, con_snapshot, usuario)
+
+    return [fila[0] for fila in filas]
@@ -1,18 +1,24 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.events import EVENT_JOB_SUBMITTED
 from datetime import datetime, time as datetime_time
 import asyncio
 
 from app.database import SessionLocal
 from app.models.comunicado import Comunicado
 from app.services.envio_service import send_comunicado
+from app.services.sync_service import purgar_eliminaciones
+from app.services.archivos_service import purgar_archivos_huerfanos
 from app.config import settings
+from app.metrics import COLA_ENVIO, SCHEDULER_RETRASO
+from app.instrumentacion import medir_job
 
 
 # Scheduler global
 scheduler = BackgroundScheduler()
 
 
+@medir_job
 def check_scheduled_comunicados():
     """
     Verifica si hay comunicados programados para enviar
@@ -36,10 +42,15 @@ def check_scheduled_comunicados():
             Comunicado.fecha_programada == current_date
         ).all()
         
+        vencidos = [c for c in comunicados if c.hora_programada and c.hora_programada <= current_time]
+        COLA_ENVIO.labels("comunicados_vencidos").set(len(vencidos))
+        
         for comunicado in comunicados:
             # Verificar si ya es hora de enviar
             if comunicado.hora_programada and comunicado.hora_programada <= current_time:
                 print(f"📤 Enviando comunicado: {comunicado.titulo} (ID: {comunicado.id})")
+                programado = datetime.combine(comunicado.fecha_programada, comunicado.hora_programada)
+                SCHEDULER_RETRASO.labels("comunicado").set((datetime.now() - programado).total_seconds())
                 
                 # Enviar comunicado (asyncio para manejar async)
                 try:
@@ -56,6 +67,8 @@ def check_scheduled_comunicados():
                     print(f"❌ Error enviando comunicado {comunicado.id}: {e}")
                     comunicado.estado = "error"
                     db.commit()
+                
+                COLA_ENVIO.labels("comunicados_vencidos").dec()
         
         if not comunicados:
             print("   No hay comunicados programados para enviar ahora")
@@ -67,6 +80,43 @@ def check_scheduled_comunicados():
         db.close()
 
 
+@medir_job
+def purge_tombstones():
+    """Borra los registros de eliminaciones vencidos (una vez por día)"""
+    db = SessionLocal()
+    
+    try:
+        borrados = purgar_eliminaciones(db)
+        print(f"🧹 Eliminaciones purgadas: {borrados}")
+    except Exception as e:
+        print(f"❌ Error purgando eliminaciones: {e}")
+    finally:
+        db.close()
+
+
+@medir_job
+def purge_orphan_files():
+    """Borra los archivos adjuntos que ya no referencia ninguna tarea ni comunicado"""
+    db = SessionLocal()
+    
+    try:
+        borrados = purgar_archivos_huerfanos(db)
+        if borrados:
+            print(f"🧹 Archivos huérfanos borrados: {borrados}")
+    except Exception as e:
+        print(f"❌ Error purgando archivos: {e}")
+    finally:
+        db.close()
+
+
+def registrar_retraso(evento):
+    """Retraso de cada ejecución respecto de su hora prevista (métrica)"""
+    previsto = evento.scheduled_run_times[-1]
+    SCHEDULER_RETRASO.labels(evento.job_id).set(
+        (datetime.now(previsto.tzinfo) - previsto).total_seconds()
+    )
+
+
 def start_scheduler():
     """Inicia el scheduler de tareas programadas"""
     if not settings.SCHEDULER_ENABLED:
@@ -84,6 +134,24 @@ def start_scheduler():
         replace_existing=True
     )
     
+    scheduler.add_job(
+        purge_tombstones,
+        trigger=IntervalTrigger(days=1),
+        id="purge_tombstones",
+        name="Purgar eliminaciones vencidas",
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        purge_orphan_files,
+        trigger=IntervalTrigger(hours=1),
+        id="purge_orphan_files",
+        name="Purgar archivos sin referencias",
+        replace_existing=True
+    )
+    
+    scheduler.add_listener(registrar_retraso, EVENT_JOB_SUBMITTED)
+    
     scheduler.start()
     print("✅ Scheduler iniciado correctamente")
 
@@ -6,6 +6,35 @@
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
 
+-- Búsqueda difusa (trigramas) y sin acentos
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+CREATE EXTENSION IF NOT EXISTS "unaccent";
+
+-- unaccent() no es IMMUTABLE; esta envoltura fija el diccionario para poder
+-- usarla en columnas generadas e índices
+CREATE OR REPLACE FUNCTION normalizar_texto(texto TEXT)
+RETURNS TEXT AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, coalesce(texto, '')))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Identidad de un contacto: teléfono en E.164 (+ y dígitos; 00 inicial = +)
+-- y email en minúsculas. Se usan en columnas generadas con índice único
+CREATE OR REPLACE FUNCTION normalizar_telefono(telefono TEXT)
+RETURNS TEXT AS $$
+    SELECT nullif(regexp_replace(regexp_replace(btrim(coalesce(telefono, '')), '^00', '+'), '[^0-9+]', '', 'g'), '')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION normalizar_email(email TEXT)
+RETURNS TEXT AS $$
+    SELECT nullif(lower(btrim(coalesce(email, ''))), '')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Texto completo en español sin distinguir acentos: stemming de 'spanish'
+-- pasando antes cada palabra por unaccent
+CREATE TEXT SEARCH CONFIGURATION espanol_sin_acentos (COPY = spanish);
+ALTER TEXT SEARCH CONFIGURATION espanol_sin_acentos
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+
 -- ============================================
 -- CONTACTOS
 -- ============================================
@@ -19,6 +48,12 @@ CREATE TABLE contactos (
     estado VARCHAR(20) DEFAULT 'activo' CHECK (estado IN ('activo', 'inactivo')),
     etiquetas TEXT[] DEFAULT '{}',
     notas TEXT,
+    fecha_actualizacion TIMESTAMPTZ DEFAULT NOW(),
+    busqueda TEXT GENERATED ALWAYS AS (
+        normalizar_texto(nombre) || ' ' || normalizar_texto(email) || ' ' || coalesce(whatsapp, '')
+    ) STORED,
+    whatsapp_normalizado TEXT GENERATED ALWAYS AS (normalizar_telefono(whatsapp)) STORED,
+    email_normalizado TEXT GENERATED ALWAYS AS (normalizar_email(email)) STORED,
     CONSTRAINT valid_email CHECK (email IS NULL OR email ~ '^[^@]+@[^@]+\.[^@]+$'),
     CONSTRAINT valid_whatsapp CHECK (whatsapp IS NULL OR whatsapp ~ '^\+[0-9]{10,15}$')
 );
@@ -26,10 +61,25 @@ CREATE TABLE contactos (
 COMMENT ON TABLE contactos IS 'Contactos individuales del sistema';
 COMMENT ON COLUMN contactos.whatsapp IS 'Formato: +5491112345678 (código país + número)';
 COMMENT ON COLUMN contactos.etiquetas IS 'Array de etiquetas: cliente, proveedor, etc.';
+COMMENT ON COLUMN contactos.busqueda IS 'nombre, email y whatsapp normalizados (minúsculas, sin acentos) para búsqueda por trigramas';
+COMMENT ON COLUMN contactos.whatsapp_normalizado IS 'WhatsApp en E.164: identifica al contacto (único)';
+COMMENT ON COLUMN contactos.email_normalizado IS 'Email en minúsculas: identifica al contacto (único)';
 
 CREATE INDEX idx_contactos_estado ON contactos(estado);
-CREATE INDEX idx_contactos_nombre ON contactos(nombre);
+-- (nombre, id) es la clave de orden de la paginación por cursor
+CREATE INDEX idx_contactos_nombre_id ON contactos(nombre, id);
 CREATE INDEX idx_contactos_email ON contactos(email);
+-- Una persona = un contacto. En una base existente, agregar las columnas,
+-- fusionar duplicados (POST /api/contactos/duplicados/fusionar) y recién
+-- entonces crear estos índices
+CREATE UNIQUE INDEX idx_contactos_whatsapp_unico ON contactos(whatsapp_normalizado);
+CREATE UNIQUE INDEX idx_contactos_email_unico ON contactos(email_normalizado);
+-- Sirve LIKE '%texto%' y los operadores de similitud (%, <%)
+CREATE INDEX idx_contactos_busqueda_trgm ON contactos USING GIN (busqueda gin_trgm_ops);
+-- Sirve los filtros de etiquetas (@> todas, && alguna)
+CREATE INDEX idx_contactos_etiquetas ON contactos USING GIN (etiquetas);
+-- Sincronización incremental (/contactos/changes)
+CREATE INDEX idx_contactos_actualizacion ON contactos(fecha_actualizacion, id);
 
 -- ============================================
 -- GRUPOS
@@ -49,6 +99,7 @@ COMMENT ON COLUMN grupos.tipo IS 'Tipo de comunicación: email, whatsapp, ambos'
 
 CREATE INDEX idx_grupos_estado ON grupos(estado);
 CREATE INDEX idx_grupos_tipo ON grupos(tipo);
+CREATE INDEX idx_grupos_nombre_id ON grupos(nombre, id);
 
 -- ============================================
 -- GRUPO_MIEMBROS (Relación muchos a muchos)
@@ -83,17 +134,50 @@ CREATE TABLE tareas (
     etiquetas TEXT[] DEFAULT '{}',
     fecha_creacion_record TIMESTAMPTZ DEFAULT NOW(),
     fecha_actualizacion TIMESTAMPTZ DEFAULT NOW(),
-    fecha_completacion TIMESTAMPTZ
+    fecha_completacion TIMESTAMPTZ,
+    cambios_sin_snapshot INTEGER NOT NULL DEFAULT 0,
+    documento TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('espanol_sin_acentos', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('espanol_sin_acentos', coalesce(descripcion, '')), 'B')
+    ) STORED
 );
 
 COMMENT ON TABLE tareas IS 'Tareas del sistema';
 COMMENT ON COLUMN tareas.fecha_creacion IS 'Fecha de creación de la tarea (no del registro)';
 COMMENT ON COLUMN tareas.fecha_creacion_record IS 'Timestamp de cuando se creó el registro en BD';
+COMMENT ON COLUMN tareas.cambios_sin_snapshot IS 'Entradas de tareas_log desde el último snapshot; se actualiza junto con cada edición';
+COMMENT ON COLUMN tareas.documento IS 'Texto completo: título (peso A) y descripción (peso B)';
 
 CREATE INDEX idx_tareas_estado ON tareas(estado);
 CREATE INDEX idx_tareas_prioridad ON tareas(prioridad);
-CREATE INDEX idx_tareas_fecha_termino ON tareas(fecha_termino);
+-- Agenda por rango de fecha_termino; estado y prioridad permiten contar sin leer la tabla
+CREATE INDEX idx_tareas_agenda ON tareas(fecha_termino, estado, prioridad);
 CREATE INDEX idx_tareas_fecha_creacion ON tareas(fecha_creacion);
+-- Clave de orden de los listados (paginación por cursor)
+CREATE INDEX idx_tareas_orden ON tareas(fecha_termino ASC NULLS LAST, prioridad DESC, id);
+-- Sirve los filtros de etiquetas (@> todas, && alguna)
+CREATE INDEX idx_tareas_etiquetas ON tareas USING GIN (etiquetas);
+-- Sincronización incremental (/tareas/changes)
+CREATE INDEX idx_tareas_actualizacion ON tareas(fecha_actualizacion, id);
+-- Búsqueda de texto completo (/tareas/buscar)
+CREATE INDEX idx_tareas_documento ON tareas USING GIN (documento);
+
+-- ============================================
+-- ARCHIVOS (contenido de adjuntos, por hash)
+-- ============================================
+
+CREATE TABLE archivos (
+    hash CHAR(64) PRIMARY KEY,
+    tamano BIGINT NOT NULL,
+    tipo_mime VARCHAR(255),
+    referencias INT NOT NULL DEFAULT 0,
+    creado_en TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE archivos IS 'Contenido de los adjuntos, guardado una vez por SHA-256 en UPLOAD_DIR/objetos/ab/cd/<hash>';
+COMMENT ON COLUMN archivos.referencias IS 'Adjuntos que lo usan (triggers); en 0 lo borra la purga del scheduler';
+
+CREATE INDEX idx_archivos_sin_referencias ON archivos(hash) WHERE referencias <= 0;
 
 -- ============================================
 -- TAREA_ADJUNTOS
@@ -104,6 +188,7 @@ CREATE TABLE tarea_adjuntos (
     tarea_id UUID REFERENCES tareas(id) ON DELETE CASCADE,
     nombre_archivo VARCHAR(255) NOT NULL,
     ruta_archivo VARCHAR(500) NOT NULL,
+    archivo_hash CHAR(64) REFERENCES archivos(hash),
     fecha_agregado TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -126,15 +211,27 @@ CREATE TABLE comunicados (
     fecha_envio_real TIMESTAMPTZ,
     variables_disponibles TEXT[] DEFAULT ARRAY['{{nombre}}', '{{email}}', '{{whatsapp}}'],
     creado_en TIMESTAMPTZ DEFAULT NOW(),
-    creado_por VARCHAR(255)
+    creado_por VARCHAR(255),
+    perfilar BOOLEAN NOT NULL DEFAULT FALSE,
+    fecha_actualizacion TIMESTAMPTZ DEFAULT NOW(),
+    documento TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('espanol_sin_acentos', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('espanol_sin_acentos', coalesce(contenido, '')), 'B')
+    ) STORED
 );
 
 COMMENT ON TABLE comunicados IS 'Comunicados para enviar por WhatsApp/Email';
 COMMENT ON COLUMN comunicados.variables_disponibles IS 'Variables que se pueden usar en el contenido';
+COMMENT ON COLUMN comunicados.documento IS 'Texto completo: título (peso A) y contenido (peso B)';
 
 CREATE INDEX idx_comunicados_estado ON comunicados(estado);
 CREATE INDEX idx_comunicados_fecha_programada ON comunicados(fecha_programada, hora_programada);
 CREATE INDEX idx_comunicados_tipo ON comunicados(tipo);
+CREATE INDEX idx_comunicados_creado_en_id ON comunicados(creado_en DESC, id DESC);
+-- Sincronización incremental (/comunicados/changes)
+CREATE INDEX idx_comunicados_actualizacion ON comunicados(fecha_actualizacion, id);
+-- Búsqueda de texto completo (/comunicados/buscar)
+CREATE INDEX idx_comunicados_documento ON comunicados USING GIN (documento);
 
 -- ============================================
 -- COMUNICADO_ADJUNTOS
@@ -145,6 +242,7 @@ CREATE TABLE comunicado_adjuntos (
     comunicado_id UUID REFERENCES comunicados(id) ON DELETE CASCADE,
     nombre_archivo VARCHAR(255) NOT NULL,
     ruta_archivo VARCHAR(500) NOT NULL,
+    archivo_hash CHAR(64) REFERENCES archivos(hash),
     fecha_agregado TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -171,11 +269,32 @@ CREATE TABLE comunicado_destinatarios (
 COMMENT ON TABLE comunicado_destinatarios IS 'Destinatarios de cada comunicado (contactos o grupos)';
 COMMENT ON COLUMN comunicado_destinatarios.intentos_fallidos IS 'Contador de intentos fallidos (máximo 3)';
 
-CREATE INDEX idx_comunicado_destinatarios_comunicado ON comunicado_destinatarios(comunicado_id);
+-- (comunicado_id, id) y (comunicado_id, estado_envio, id): paginación de estado-envios
+CREATE INDEX idx_comunicado_destinatarios_comunicado ON comunicado_destinatarios(comunicado_id, id);
+CREATE INDEX idx_comunicado_destinatarios_comunicado_estado ON comunicado_destinatarios(comunicado_id, estado_envio, id);
 CREATE INDEX idx_comunicado_destinatarios_contacto ON comunicado_destinatarios(contacto_id);
 CREATE INDEX idx_comunicado_destinatarios_grupo ON comunicado_destinatarios(grupo_id);
 CREATE INDEX idx_comunicado_destinatarios_estado ON comunicado_destinatarios(estado_envio);
 
+-- ============================================
+-- COMUNICADO_CONTADORES
+-- ============================================
+
+CREATE TABLE comunicado_contadores (
+    comunicado_id UUID REFERENCES comunicados(id) ON DELETE CASCADE,
+    canal VARCHAR(20) CHECK (canal IN ('whatsapp', 'email')),
+    total INT NOT NULL DEFAULT 0,
+    enviados INT NOT NULL DEFAULT 0,
+    errores INT NOT NULL DEFAULT 0,
+    pendientes INT NOT NULL DEFAULT 0,
+    reintentos INT NOT NULL DEFAULT 0,
+    actualizado_en TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (comunicado_id, canal)
+);
+
+COMMENT ON TABLE comunicado_contadores IS 'Entregas por comunicado y canal, actualizadas incrementalmente durante el envío';
+COMMENT ON COLUMN comunicado_contadores.total IS 'Entregas previstas (contactos x canal) al iniciar el envío';
+
 -- ============================================
 -- COMUNICADOS_LOG
 -- ============================================
@@ -195,11 +314,34 @@ CREATE TABLE comunicados_log (
 COMMENT ON TABLE comunicados_log IS 'Log completo de todos los envíos realizados';
 COMMENT ON COLUMN comunicados_log.contenido_enviado IS 'Mensaje final con variables reemplazadas';
 
-CREATE INDEX idx_comunicados_log_comunicado ON comunicados_log(comunicado_id);
+CREATE INDEX idx_comunicados_log_comunicado ON comunicados_log(comunicado_id, fecha_envio DESC, id DESC);
 CREATE INDEX idx_comunicados_log_contacto ON comunicados_log(contacto_id);
 CREATE INDEX idx_comunicados_log_fecha ON comunicados_log(fecha_envio);
 CREATE INDEX idx_comunicados_log_resultado ON comunicados_log(resultado);
 
+-- ============================================
+-- SUPRESIONES
+-- ============================================
+
+CREATE TABLE supresiones (
+    id BIGSERIAL PRIMARY KEY,
+    canal VARCHAR(20) NOT NULL CHECK (canal IN ('whatsapp', 'email')),
+    direccion VARCHAR(255) NOT NULL,
+    motivo VARCHAR(20) NOT NULL CHECK (motivo IN ('baja', 'rebote', 'invalido')),
+    detalle TEXT,
+    activa BOOLEAN NOT NULL DEFAULT TRUE,
+    fecha_creacion TIMESTAMPTZ DEFAULT NOW(),
+    fecha_actualizacion TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (canal, direccion)
+);
+
+COMMENT ON TABLE supresiones IS 'Direcciones a las que no se envía por un canal: bajas, rebotes permanentes, números inválidos';
+COMMENT ON COLUMN supresiones.direccion IS 'Normalizada como contactos.whatsapp_normalizado / email_normalizado';
+COMMENT ON COLUMN supresiones.activa IS 'Se desactiva en lugar de borrar, para que el refresco incremental vea el cambio';
+
+-- Refresco incremental de la lista en memoria del envío
+CREATE INDEX idx_supresiones_actualizacion ON supresiones(fecha_actualizacion, id);
+
 -- ============================================
 -- TAREAS_LOG
 -- ============================================
@@ -215,13 +357,46 @@ CREATE TABLE tareas_log (
 );
 
 COMMENT ON TABLE tareas_log IS 'Historial de cambios en tareas';
-COMMENT ON COLUMN tareas_log.datos_anteriores IS 'Estado anterior de la tarea en formato JSON';
-COMMENT ON COLUMN tareas_log.datos_nuevos IS 'Estado nuevo de la tarea en formato JSON';
+COMMENT ON COLUMN tareas_log.datos_anteriores IS 'Valores anteriores de los campos modificados en formato JSON';
+COMMENT ON COLUMN tareas_log.datos_nuevos IS 'Valores nuevos de los campos modificados en formato JSON (la tarea completa en la entrada creada)';
 
-CREATE INDEX idx_tareas_log_tarea ON tareas_log(tarea_id);
+CREATE INDEX idx_tareas_log_tarea ON tareas_log(tarea_id, fecha_cambio DESC, id DESC);
 CREATE INDEX idx_tareas_log_fecha ON tareas_log(fecha_cambio);
 CREATE INDEX idx_tareas_log_accion ON tareas_log(accion);
 
+-- ============================================
+-- TAREAS_SNAPSHOTS
+-- ============================================
+
+CREATE TABLE tareas_snapshots (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    tarea_id UUID NOT NULL REFERENCES tareas(id) ON DELETE CASCADE,
+    log_id UUID NOT NULL,
+    fecha TIMESTAMPTZ DEFAULT NOW(),
+    datos JSONB NOT NULL
+);
+
+COMMENT ON TABLE tareas_snapshots IS 'Estado completo de una tarea cada N entradas de tareas_log, base para reconstruir versiones';
+COMMENT ON COLUMN tareas_snapshots.log_id IS 'Última entrada de tareas_log incluida en el snapshot';
+
+CREATE INDEX idx_tareas_snapshots_tarea ON tareas_snapshots(tarea_id, fecha DESC, log_id DESC);
+
+-- ============================================
+-- ELIMINACIONES (tombstones)
+-- ============================================
+
+CREATE TABLE eliminaciones (
+    id BIGSERIAL PRIMARY KEY,
+    recurso VARCHAR(50) NOT NULL,
+    registro_id UUID NOT NULL,
+    fecha TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE eliminaciones IS 'Filas borradas de tareas, contactos y comunicados, para que /changes informe los borrados';
+COMMENT ON COLUMN eliminaciones.recurso IS 'Tabla de origen: tareas, contactos, comunicados';
+
+CREATE INDEX idx_eliminaciones_recurso ON eliminaciones(recurso, fecha, registro_id);
+
 -- ============================================
 -- TRIGGERS
 -- ============================================
@@ -241,6 +416,124 @@ BEFORE UPDATE ON tareas
 FOR EACH ROW
 EXECUTE FUNCTION update_timestamp();
 
+-- Trigger para contactos
+CREATE TRIGGER update_contacto_timestamp
+BEFORE UPDATE ON contactos
+FOR EACH ROW
+EXECUTE FUNCTION update_timestamp();
+
+-- Trigger para comunicados
+CREATE TRIGGER update_comunicado_timestamp
+BEFORE UPDATE ON comunicados
+FOR EACH ROW
+EXECUTE FUNCTION update_timestamp();
+
+-- Trigger para supresiones
+CREATE TRIGGER update_supresion_timestamp
+BEFORE UPDATE ON supresiones
+FOR EACH ROW
+EXECUTE FUNCTION update_timestamp();
+
+-- Función para registrar borrados (el recurso se pasa como argumento)
+CREATE OR REPLACE FUNCTION registrar_eliminacion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO eliminaciones (recurso, registro_id) VALUES (TG_ARGV[0], OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER registrar_eliminacion_tarea
+AFTER DELETE ON tareas
+FOR EACH ROW
+EXECUTE FUNCTION registrar_eliminacion('tareas');
+
+CREATE TRIGGER registrar_eliminacion_contacto
+AFTER DELETE ON contactos
+FOR EACH ROW
+EXECUTE FUNCTION registrar_eliminacion('contactos');
+
+CREATE TRIGGER registrar_eliminacion_comunicado
+AFTER DELETE ON comunicados
+FOR EACH ROW
+EXECUTE FUNCTION registrar_eliminacion('comunicados');
+
+-- Referencias a archivos: cada adjunto suma una al insertarse y la resta al
+-- borrarse (también en los borrados en cascada de tareas y comunicados)
+CREATE OR REPLACE FUNCTION actualizar_referencias_archivo()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.archivo_hash IS NOT NULL THEN
+        UPDATE archivos SET referencias = referencias + 1 WHERE hash = NEW.archivo_hash;
+    ELSIF TG_OP = 'DELETE' AND OLD.archivo_hash IS NOT NULL THEN
+        UPDATE archivos SET referencias = referencias - 1 WHERE hash = OLD.archivo_hash;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER referencias_tarea_adjunto
+AFTER INSERT OR DELETE ON tarea_adjuntos
+FOR EACH ROW
+EXECUTE FUNCTION actualizar_referencias_archivo();
+
+CREATE TRIGGER referencias_comunicado_adjunto
+AFTER INSERT OR DELETE ON comunicado_adjuntos
+FOR EACH ROW
+EXECUTE FUNCTION actualizar_referencias_archivo();
+
+-- Eventos en tiempo real: NOTIFY en el canal 'cambios' (el backend hace
+-- LISTEN y los reenvía por WebSocket). Se envían al confirmar la transacción.
+CREATE OR REPLACE FUNCTION notificar_cambio()
+RETURNS TRIGGER AS $$
+DECLARE
+    fila RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        fila := OLD;
+    ELSE
+        fila := NEW;
+    END IF;
+    PERFORM pg_notify('cambios', json_build_object(
+        'recurso', TG_ARGV[0],
+        'accion', lower(TG_OP),
+        'id', fila.id
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notificar_cambio_tarea
+AFTER INSERT OR UPDATE OR DELETE ON tareas
+FOR EACH ROW
+EXECUTE FUNCTION notificar_cambio('tareas');
+
+CREATE TRIGGER notificar_cambio_comunicado
+AFTER INSERT OR UPDATE OR DELETE ON comunicados
+FOR EACH ROW
+EXECUTE FUNCTION notificar_cambio('comunicados');
+
+-- Entregas: solo cuando cambia el estado de envío de un destinatario
+CREATE OR REPLACE FUNCTION notificar_entrega()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('cambios', json_build_object(
+        'recurso', 'entregas',
+        'accion', 'update',
+        'id', NEW.id,
+        'comunicado_id', NEW.comunicado_id,
+        'estado_envio', NEW.estado_envio
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notificar_entrega_destinatario
+AFTER UPDATE OF estado_envio ON comunicado_destinatarios
+FOR EACH ROW
+WHEN (OLD.estado_envio IS DISTINCT FROM NEW.estado_envio)
+EXECUTE FUNCTION notificar_entrega();
+
 -- ============================================
 -- VISTAS ÚTILES
 -- ============================================
@@ -0,0 +1,3 @@
+# Importar la aplicación registra todos los modelos: sin eso SQLAlchemy no
+# puede configurar las relaciones entre mappers
+import app.main  # noqa: F401
@@ -0,0 +1,54 @@
+import pytest
+
+from app.descargas import _etag_coincide, _parsear_rango
+
+
+@pytest.mark.parametrize("encabezado, esperado", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),  # sufijo más largo que el archivo: todo
+    ("bytes=990-5000", (990, 999)),  # fin recortado al tamaño
+    (" bytes=5-5 ", (5, 5)),
+])
+def test_rangos_validos(encabezado, esperado):
+    assert _parsear_rango(encabezado, 1000) == esperado
+
+
+@pytest.mark.parametrize("encabezado", [
+    "bytes=0-10,20-30",  # varios rangos: archivo completo
+    "bytes=-",
+    "items=0-10",
+    "bytes=a-b",
+])
+def test_rangos_ignorados(encabezado):
+    assert _parsear_rango(encabezado, 1000) is None
+
+
+@pytest.mark.parametrize("encabezado, tamano", [
+    ("bytes=1000-", 1000),
+    ("bytes=20-10", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-", 0),
+    ("bytes=-5", 0),  # archivo vacío: ningún sufijo es satisfacible
+])
+def test_rangos_no_satisfacibles(encabezado, tamano):
+    with pytest.raises(ValueError):
+        _parsear_rango(encabezado, tamano)
+
+
+ETAG = '"3a7bd3e2360a3d29eea436fcfb7e44c735d117c4"'
+
+
+@pytest.mark.parametrize("encabezado, esperado", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"otro", {ETAG}', True),
+    ('"otro"', False),
+    (ETAG.strip('"'), False),  # sin comillas no es el mismo ETag
+])
+def test_etag_coincide(encabezado, esperado):
+    assert _etag_coincide(encabezado, ETAG) is esperado
@@ -0,0 +1,117 @@
+"""
+Reconstrucción de versiones de tareas desde snapshots y diffs.
+
+Las tablas del historial se crean en SQLite con tipos equivalentes (los
+modelos usan tipos de Postgres que SQLite no sabe crear); los queries son
+los de historial_service.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.models.tarea import TareaLog, TareaSnapshot
+from app.services.historial_service import estado_en, reconstruir_version
+
+T0 = datetime(2024, 3, 1, 9, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE tareas_log (
+                id CHAR(32) PRIMARY KEY, tarea_id CHAR(32) NOT NULL,
+                accion VARCHAR(50) NOT NULL, datos_anteriores JSON,
+                datos_nuevos JSON, fecha_cambio DATETIME, usuario VARCHAR(255)
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE tareas_snapshots (
+                id CHAR(32) PRIMARY KEY, tarea_id CHAR(32) NOT NULL,
+                log_id CHAR(32) NOT NULL, fecha DATETIME, datos JSON NOT NULL
+            )
+        """))
+    with Session(engine) as session:
+        yield session
+
+
+def _log(db, tarea_id, horas, datos_nuevos, accion="actualizada"):
+    log = TareaLog(
+        id=uuid.uuid4(),
+        tarea_id=tarea_id,
+        accion=accion,
+        datos_nuevos=datos_nuevos,
+        fecha_cambio=T0 + timedelta(hours=horas)
+    )
+    db.add(log)
+    db.flush()
+    return log
+
+
+def _snapshot(db, log, datos):
+    db.add(TareaSnapshot(tarea_id=log.tarea_id, log_id=log.id, fecha=log.fecha_cambio, datos=datos))
+    db.flush()
+
+
+def test_estado_en_aplica_los_diffs_hasta_el_momento(db):
+    tarea_id = uuid.uuid4()
+    _log(db, tarea_id, 0, {"titulo": "Informe", "estado": "pendiente", "prioridad": "media"}, "creada")
+    _log(db, tarea_id, 1, {"prioridad": "alta"})
+    _log(db, tarea_id, 2, {"estado": "completada"})
+
+    assert estado_en(db, tarea_id, T0 - timedelta(minutes=1)) is None
+    assert estado_en(db, tarea_id, T0 + timedelta(minutes=90)) == {
+        "titulo": "Informe", "estado": "pendiente", "prioridad": "alta"
+    }
+    assert estado_en(db, tarea_id, T0 + timedelta(hours=3)) == {
+        "titulo": "Informe", "estado": "completada", "prioridad": "alta"
+    }
+
+
+def test_parte_del_ultimo_snapshot_anterior(db):
+    tarea_id = uuid.uuid4()
+    _log(db, tarea_id, 0, {"titulo": "Informe", "estado": "pendiente"}, "creada")
+    segunda = _log(db, tarea_id, 1, {"titulo": "Informe final"})
+    # El snapshot manda: lo que no esté en él no se toma de entradas anteriores
+    _snapshot(db, segunda, {"titulo": "Informe final", "estado": "en_progreso"})
+    _log(db, tarea_id, 2, {"estado": "completada"})
+
+    assert estado_en(db, tarea_id, T0 + timedelta(minutes=30)) == {
+        "titulo": "Informe", "estado": "pendiente"
+    }
+    assert estado_en(db, tarea_id, T0 + timedelta(minutes=90)) == {
+        "titulo": "Informe final", "estado": "en_progreso"
+    }
+    assert estado_en(db, tarea_id, T0 + timedelta(hours=2)) == {
+        "titulo": "Informe final", "estado": "completada"
+    }
+
+
+def test_reconstruir_version_respeta_el_orden_por_id_en_la_misma_fecha(db):
+    tarea_id = uuid.uuid4()
+    primera = _log(db, tarea_id, 0, {"titulo": "A"}, "creada")
+    segunda = _log(db, tarea_id, 0, {"titulo": "B"})
+    anterior, posterior = sorted([primera, segunda], key=lambda log: log.id)
+
+    assert reconstruir_version(db, tarea_id, anterior.id) == {"titulo": anterior.datos_nuevos["titulo"]}
+    assert reconstruir_version(db, tarea_id, posterior.id) == {"titulo": posterior.datos_nuevos["titulo"]}
+    assert reconstruir_version(db, uuid.uuid4(), posterior.id) is None
+
+
+def test_ignora_campos_no_auditados_de_entradas_viejas(db):
+    tarea_id = uuid.uuid4()
+    _log(db, tarea_id, 0, {"titulo": "A", "id": str(tarea_id), "fecha_actualizacion": "2024-03-01"}, "creada")
+
+    assert estado_en(db, tarea_id, T0) == {"titulo": "A"}
+
+
+def test_no_mezcla_tareas(db):
+    una, otra = uuid.uuid4(), uuid.uuid4()
+    _log(db, una, 0, {"titulo": "Una"}, "creada")
+    _snapshot(db, _log(db, otra, 1, {"titulo": "Otra"}, "creada"), {"titulo": "Otra"})
+
+    assert estado_en(db, una, T0 + timedelta(hours=2)) == {"titulo": "Una"}
@@ -0,0 +1,74 @@
+"""
+keyset_filter contra el orden de Postgres: para cada fila usada como
+cursor, el filtro tiene que devolver exactamente las filas que siguen.
+SQLite evalúa las condiciones (mismas reglas de NULL que Postgres); el
+orden esperado se arma en Python, porque SQLite ordena los nulos al
+revés que Postgres.
+"""
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, false, select
+
+from app.pagination import SortKey, _despues, decode_cursor, encode_cursor, keyset_filter
+
+metadata = MetaData()
+filas = Table(
+    "filas", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("valor", Integer, nullable=True),
+)
+
+VALORES = [3, None, 1, 3, None, 2, 1, None, 5]
+
+
+@pytest.fixture(scope="module")
+def conexion():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(filas.insert(), [{"id": i, "valor": v} for i, v in enumerate(VALORES, 1)])
+        yield conn
+
+
+def _orden_postgres(desc: bool, nulls_last: bool):
+    """(id, valor) en el orden de ORDER BY valor [DESC] [NULLS LAST], id"""
+    # Postgres: DESC sin NULLS LAST deja los nulos al principio
+    nulos_al_final = nulls_last or not desc
+    con_valor = sorted(
+        ((i, v) for i, v in enumerate(VALORES, 1) if v is not None),
+        key=lambda fila: (-fila[1] if desc else fila[1], fila[0])
+    )
+    nulos = [(i, v) for i, v in enumerate(VALORES, 1) if v is None]
+    return con_valor + nulos if nulos_al_final else nulos + con_valor
+
+
+# Una columna nullable ascendente siempre lleva nulls_last (ver SortKey)
+@pytest.mark.parametrize("desc, nulls_last", [
+    (False, True),
+    (True, False),  # nulos primero
+    (True, True),
+])
+def test_keyset_filter_devuelve_las_filas_siguientes(conexion, desc, nulls_last):
+    keys = [SortKey(filas.c.valor, desc=desc, nulls_last=nulls_last), SortKey(filas.c.id)]
+    orden = _orden_postgres(desc, nulls_last)
+
+    for posicion, (id_, valor) in enumerate(orden):
+        ids = conexion.execute(
+            select(filas.c.id).where(keyset_filter(keys, [valor, id_]))
+        ).scalars().all()
+        assert sorted(ids) == sorted(i for i, _ in orden[posicion + 1:]), (id_, valor)
+
+
+def test_despues_de_nulo_con_nulos_primero():
+    key = SortKey(filas.c.valor, desc=True)
+    assert key.nulls_first
+    assert str(_despues(key, None)) == "filas.valor IS NOT NULL"
+
+
+def test_despues_de_nulo_con_nulos_al_final():
+    key = SortKey(filas.c.valor, nulls_last=True)
+    assert _despues(key, None).compare(false())
+
+
+def test_cursor_ida_y_vuelta():
+    keys = [SortKey(filas.c.valor, desc=True), SortKey(filas.c.id)]
+    assert decode_cursor(encode_cursor([None, 7]), keys) == [None, 7]
@@ -0,0 +1,126 @@
+"""
+Presupuesto de consultas de vista-previa con ENVIRONMENT=test.
+
+Se llama a la aplicación ASGI completa (con MedicionSQLHTTP) sobre una
+sesión SQLite. Los conteos de audiencia usan SQL de Postgres, así que se
+reemplazan por funciones que hacen la cantidad de consultas indicada: lo
+que se prueba es que el middleware cuente y haga cumplir el presupuesto.
+"""
+import asyncio
+import json
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import get_db
+from app.instrumentacion import HEADER_CONSULTAS
+from app.main import app
+from app.routes import comunicados
+
+COMUNICADO_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE comunicados (
+                id CHAR(32) PRIMARY KEY, titulo VARCHAR(255) NOT NULL,
+                tipo VARCHAR(20) NOT NULL, contenido TEXT NOT NULL,
+                estado VARCHAR(30), fecha_programada DATE, hora_programada TIME,
+                fecha_envio_real DATETIME, variables_disponibles TEXT,
+                creado_en DATETIME, creado_por VARCHAR(255),
+                perfilar BOOLEAN NOT NULL DEFAULT 0, fecha_actualizacion DATETIME
+            )
+        """))
+        conn.execute(
+            text("INSERT INTO comunicados (id, titulo, tipo, contenido) VALUES (:id, 'Aviso', 'email', 'Hola {{nombre}}')"),
+            {"id": COMUNICADO_ID.hex}
+        )
+
+    session = Session(engine)
+
+    def get_db_sqlite():
+        yield session
+
+    monkeypatch.setattr(settings, "ENVIRONMENT", "test")
+    monkeypatch.setitem(app.dependency_overrides, get_db, get_db_sqlite)
+    yield session
+    session.close()
+
+
+def _audiencia_con_consultas(monkeypatch, consultas_conteo: int, consultas_muestra: int):
+    def contar_audiencia(db, comunicado_id, canales, variables):
+        for _ in range(consultas_conteo):
+            db.execute(text("SELECT 1"))
+        return {"total": 0, "por_canal": {}, "sin_email": 0, "sin_whatsapp": 0, "variables_faltantes": {}}
+
+    def muestra_audiencia(db, comunicado_id, cantidad, estratificada=False):
+        for _ in range(consultas_muestra):
+            db.execute(text("SELECT 1"))
+        return []
+
+    monkeypatch.setattr(comunicados, "contar_audiencia", contar_audiencia)
+    monkeypatch.setattr(comunicados, "muestra_audiencia", muestra_audiencia)
+
+
+def _post(path: str):
+    """POST sin cuerpo contra la app ASGI; devuelve (status, headers, json)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    mensajes = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+
+    asyncio.run(app(scope, receive, send))
+    inicio = next(m for m in mensajes if m["type"] == "http.response.start")
+    cuerpo = b"".join(m.get("body", b"") for m in mensajes if m["type"] == "http.response.body")
+    headers = {k.decode(): v.decode() for k, v in inicio["headers"]}
+    return inicio["status"], headers, json.loads(cuerpo)
+
+
+def test_vista_previa_dentro_del_presupuesto(db, monkeypatch):
+    _audiencia_con_consultas(monkeypatch, consultas_conteo=1, consultas_muestra=1)
+
+    status, headers, cuerpo = _post(f"/api/comunicados/{COMUNICADO_ID}/vista-previa")
+
+    assert status == 200
+    assert cuerpo["titulo"] == "Aviso"
+    assert headers[HEADER_CONSULTAS.lower()] == "3"
+
+
+def test_vista_previa_fuera_del_presupuesto_falla(db, monkeypatch):
+    _audiencia_con_consultas(monkeypatch, consultas_conteo=1, consultas_muestra=2)
+
+    with pytest.raises(AssertionError, match=r"hizo 4 consultas \(presupuesto: 3\)"):
+        _post(f"/api/comunicados/{COMUNICADO_ID}/vista-previa")
+
+
+def test_fuera_de_test_solo_avisa(db, monkeypatch, capsys):
+    _audiencia_con_consultas(monkeypatch, consultas_conteo=2, consultas_muestra=2)
+    monkeypatch.setattr(settings, "ENVIRONMENT", "production")
+
+    status, _, _ = _post(f"/api/comunicados/{COMUNICADO_ID}/vista-previa")
+
+    assert status == 200
+    assert "hizo 5 consultas (presupuesto: 3)" in capsys.readouterr().out